@@ -0,0 +1,281 @@
+"""End-to-end load benchmark for the Emergent Deploy API.
+
+Starts the local Vercel stand-in (tools/fake_vercel.py), points the backend
+at it in live mode and drives the FastAPI app in-process with N concurrent
+deployments while dashboard pollers hammer the read endpoints. Reports, per
+/api endpoint, p50/p95/p99 latency and Mongo commands per request, plus
+resident memory growth. Results can be saved as a baseline and compared on
+later runs so regressions are visible.
+
+Needs a reachable MongoDB (MONGO_URL); a separate database is used and
+dropped afterwards. Run from the backend directory:
+
+    python -m benchmarks.load_test --deployments 200 --pollers 20 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --deployments 200 --pollers 20 --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts every command the Mongo driver sends"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(quantile * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+
+READ_ENDPOINTS = [
+    ("GET /api/dashboard", "/api/dashboard"),
+    ("GET /api/deployments", "/api/deployments?limit=50"),
+    ("GET /api/stats", "/api/stats"),
+    ("GET /api/activity", "/api/activity?limit=20"),
+]
+
+
+async def run(args) -> dict:
+    # Configure the backend before it is imported
+    from tools.fake_vercel import FakeVercel, FakeVercelConfig
+
+    fake = FakeVercel(FakeVercelConfig(
+        latency_ms=args.vercel_latency_ms,
+        latency_jitter_ms=args.vercel_latency_ms / 2,
+        error_rate=args.vercel_error_rate,
+        build_seconds=args.build_seconds,
+        rate_limit=args.vercel_rate_limit,
+    ))
+    base_url = await fake.start()
+    os.environ["VERCEL_API_MODE"] = "live"
+    os.environ["VERCEL_API_BASE_URL"] = base_url
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("POLLER_TICK_INTERVAL", "0.25")
+    os.environ.setdefault("POLLER_INITIAL_DELAY", "0.5")
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+
+    import httpx
+    import database as db
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    rss_start = rss_mb()
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=server.app)
+
+    async with server.lifespan(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            await recorder.call(client, "PUT /api/settings", "PUT", "/api/settings", json={"vercelApiToken": "bench-token"})
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            stop_polling = asyncio.Event()
+
+            async def deploy(index: int):
+                async with semaphore:
+                    await recorder.call(client, "POST /api/deployments", "POST", "/api/deployments", json={
+                        "projectName": f"bench-project-{index % args.projects}",
+                        "emergentUrl": f"https://app.emergent.sh/chat/{index}",
+                        "framework": "react"
+                    })
+
+            async def poll():
+                while not stop_polling.is_set():
+                    for name, url in READ_ENDPOINTS:
+                        await recorder.call(client, name, "GET", url)
+                    await asyncio.sleep(args.poll_interval)
+
+            started = time.perf_counter()
+            pollers = [asyncio.create_task(poll()) for _ in range(args.pollers)]
+            await asyncio.gather(*(deploy(index) for index in range(args.deployments)))
+
+            # Keep polling while the status poller drives deployments to completion
+            deadline = time.monotonic() + args.settle_seconds
+            while time.monotonic() < deadline:
+                queue_depth, _ = await db.count_monitor_jobs(datetime.utcnow())
+                if queue_depth == 0:
+                    break
+                await asyncio.sleep(0.5)
+            stop_polling.set()
+            await asyncio.gather(*pollers)
+            load_seconds = time.perf_counter() - started
+            rss_end = rss_mb()
+
+            # Serial probe: Mongo commands per request for each read endpoint, with the poller idle
+            await server.status_poller.stop()
+            ops_per_request = {}
+            for name, url in READ_ENDPOINTS:
+                before = counter.count
+                for _ in range(args.probe_requests):
+                    await client.get(url)
+                ops_per_request[name] = (counter.count - before) / args.probe_requests
+
+        await db.client.drop_database(args.db_name)
+    await fake.stop()
+
+    endpoints = {}
+    for name, values in sorted(recorder.latencies.items()):
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "p50_ms": round(percentile(values, 0.50), 3),
+            "p95_ms": round(percentile(values, 0.95), 3),
+            "p99_ms": round(percentile(values, 0.99), 3),
+            "mongo_ops_per_request": ops_per_request.get(name),
+        }
+
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "config": {
+            "deployments": args.deployments,
+            "pollers": args.pollers,
+            "concurrency": args.concurrency,
+            "vercel_latency_ms": args.vercel_latency_ms,
+        },
+        "duration_seconds": round(load_seconds, 3),
+        "throughput_rps": round(total_requests / load_seconds, 1) if load_seconds else 0.0,
+        "vercel_requests": fake.requests,
+        "vercel_throttled": fake.throttled,
+        "mongo_commands": counter.count,
+        "rss_start_mb": round(rss_start, 1),
+        "rss_end_mb": round(rss_end, 1),
+        "rss_growth_mb": round(rss_end - rss_start, 1),
+        "endpoints": endpoints,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """List metrics that regressed by more than `tolerance` (a fraction) against the baseline"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "p99_ms", "mongo_ops_per_request"):
+            old, new = previous.get(metric), current.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+    old_growth = baseline.get("rss_growth_mb")
+    if old_growth is not None and results["rss_growth_mb"] > max(old_growth, 1.0) * (1 + tolerance):
+        regressions.append(f"rss_growth_mb: {old_growth} -> {results['rss_growth_mb']}")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"{'endpoint':<26}{'reqs':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mongo/req':>11}")
+    for name, endpoint in results["endpoints"].items():
+        ops = endpoint["mongo_ops_per_request"]
+        print(
+            f"{name:<26}{endpoint['requests']:>7}{endpoint['errors']:>5}"
+            f"{endpoint['p50_ms']:>10.2f}{endpoint['p95_ms']:>10.2f}{endpoint['p99_ms']:>10.2f}"
+            f"{(f'{ops:.1f}' if ops is not None else '-'):>11}"
+        )
+    print(
+        f"\n{results['duration_seconds']}s, {results['throughput_rps']} req/s, "
+        f"{results['vercel_requests']} Vercel calls ({results['vercel_throttled']} throttled), "
+        f"{results['mongo_commands']} Mongo commands, RSS {results['rss_start_mb']} -> {results['rss_end_mb']} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emergent Deploy end-to-end load benchmark")
+    parser.add_argument("--deployments", type=int, default=100)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pollers", type=int, default=10)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--settle-seconds", type=float, default=30.0)
+    parser.add_argument("--probe-requests", type=int, default=20)
+    parser.add_argument("--build-seconds", type=float, default=2.0)
+    parser.add_argument("--vercel-latency-ms", type=float, default=30.0)
+    parser.add_argument("--vercel-error-rate", type=float, default=0.0)
+    parser.add_argument("--vercel-rate-limit", type=int, default=0)
+    parser.add_argument("--db-name", default="emergent_deploy_bench")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression as a fraction")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Rows-per-second benchmark for the list endpoint serialization path.
+
+Compares, for GET /api/deployments and /api/activity pages:
+
+    before  full documents with `_id` -> str(_id) loop -> Model(**row) ->
+            FastAPI response_model validation -> JSONResponse
+    after   projected rows -> server._trusted_rows (plain dicts in model
+            field order, no validation) -> ORJSONResponse (JSONResponse
+            with jsonable_encoder when orjson is missing)
+
+Mongo I/O is left out: rows are generated in memory so only the Python
+work is measured. Both paths must produce the same JSON, which is checked
+before timing. Run from the backend directory:
+
+    python -m benchmarks.serialization --rows 100 --iterations 2000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Deployment, Activity, DeploymentPage, ActivityPage  # noqa: E402
+from server import FastJSONResponse, _trusted_rows  # noqa: E402
+
+
+def deployment_rows(count: int) -> list:
+    now = datetime.utcnow().replace(microsecond=0)
+    return [{
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "projectName": f"project-{index % 50}",
+        "emergentUrl": f"https://app.emergent.sh/chat/{index}",
+        "vercelUrl": f"https://project-{index}.vercel.app",
+        "vercelDeploymentId": f"dpl_{uuid.uuid4().hex[:24]}",
+        "status": "deployed" if index % 5 else "failed",
+        "framework": "react",
+        "deployTime": "1m 12s",
+        "deployDurationSeconds": 72.0,
+        "error": None if index % 5 else "Build failed",
+        "createdAt": now - timedelta(minutes=index),
+        "updatedAt": now - timedelta(minutes=index) + timedelta(seconds=72),
+    } for index in range(count)]
+
+
+def activity_rows(count: int) -> list:
+    now = datetime.utcnow().replace(microsecond=0)
+    return [{
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "type": "deployment",
+        "message": f"Deployment {index} completed successfully in 1m 12s",
+        "status": "success",
+        "deploymentId": str(uuid.uuid4()),
+        "timestamp": now - timedelta(minutes=index),
+    } for index in range(count)]
+
+
+def project(rows: list, model) -> list:
+    """What the Mongo projection returns: the model's fields and no `_id`"""
+    return [{field: row[field] for field in model.model_fields if field in row} for row in rows]
+
+
+async def before(rows: list, model, page_model, field) -> bytes:
+    docs = [dict(row) for row in rows]
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    page = page_model(items=[model(**doc) for doc in docs], next_cursor="cursor")
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+def after(rows: list, model) -> bytes:
+    return FastJSONResponse({"items": _trusted_rows(model, rows), "next_cursor": "cursor"}).body
+
+
+async def measure(name: str, rows: list, model, page_model, iterations: int):
+    field = create_response_field(name="response", type_=page_model)
+    projected = project(rows, model)
+
+    if json.loads(await before(rows, model, page_model, field)) != json.loads(after(projected, model)):
+        raise SystemExit(f"{name}: serialization paths disagree")
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await before(rows, model, page_model, field)
+    before_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        after(projected, model)
+    after_seconds = time.perf_counter() - started
+
+    total_rows = len(rows) * iterations
+    before_rate = total_rows / before_seconds
+    after_rate = total_rows / after_seconds
+    print(f"{name:<12}{before_rate:>14,.0f}{after_rate:>14,.0f}{after_rate / before_rate:>9.1f}x")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--rows", type=int, default=100, help="rows per page")
+    parser.add_argument("--iterations", type=int, default=1000, help="pages serialized per path")
+    args = parser.parse_args()
+
+    print(f"response class: {FastJSONResponse.__name__}, {args.rows} rows x {args.iterations} pages")
+    print(f"{'endpoint':<12}{'before rows/s':>14}{'after rows/s':>14}{'speedup':>9}")
+    await measure("deployments", deployment_rows(args.rows), Deployment, DeploymentPage, args.iterations)
+    await measure("activity", activity_rows(args.rows), Activity, ActivityPage, args.iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,13 @@
+"""Process configuration loaded once, before any module reads the environment.
+
+Import this first in entry points (`import config  # noqa: F401`); services
+read their settings from os.environ at import time, so `.env` must be loaded
+before them.
+"""
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+load_dotenv(ROOT_DIR / '.env')
@@ -1,141 +1,1801 @@
+import config  # noqa: F401  (loads .env before any service reads the environment)
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, IndexModel, UpdateOne, ReplaceOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import asyncio
+import base64
+import json
+import logging
 import os
-from typing import Optional
-from dotenv import load_dotenv
-from pathlib import Path
-from datetime import datetime
+import re
+import time
+import uuid
+from typing import Optional, Dict, List, Tuple
+from datetime import datetime, timedelta
 
-# Load environment variables
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from services.crypto_service import crypto_service
+from services.vercel_service import format_duration
+from services.event_broadcaster import event_broadcaster
+from services.activity_writer import activity_writer_from_env
+from services.tenancy import DEFAULT_TENANT
+from services.metrics import metrics, instrument
+from models import Deployment, Activity
+
+logger = logging.getLogger(__name__)
 
 # Database connection
+#
+# The client is opened by connect() from the application lifespan and closed by
+# close(); until then the module-level handles below are None.
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017') 
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'emergent_deploy')]
+DB_NAME = os.environ.get('DB_NAME', 'emergent_deploy')
+
+# Connection pool and timeouts
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+# Retention: activity entries expire through a TTL index, terminal deployments
+# are archived into daily per-project rollups; 0 keeps them forever
+ACTIVITY_RETENTION_DAYS = float(os.environ.get('ACTIVITY_RETENTION_DAYS', '30'))
+DEPLOYMENT_RETENTION_DAYS = float(os.environ.get('DEPLOYMENT_RETENTION_DAYS', '90'))
+
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+# Operation timings for every database function, exported on /metrics
+mongo_operation_duration = metrics.histogram(
+    "mongo_operation_duration_seconds",
+    "Latency of database.py operations",
+    ("operation",)
+)
+mongo_operation_errors = metrics.counter(
+    "mongo_operation_errors_total",
+    "database.py operations that raised",
+    ("operation",)
+)
+_timed = instrument(mongo_operation_duration, mongo_operation_errors)
+
+deployment_status_updates = metrics.counter(
+    "deployment_status_updates_total",
+    "Deployment status updates by result: applied, skipped before Mongo, or lost a compare-and-set",
+    ("result",)
+)
+
+# Collections, bound by connect()
+settings_collection = None
+deployments_collection = None
+activity_collection = None
+stats_collection = None
+project_stats_collection = None
+monitor_jobs_collection = None
+rollups_collection = None
+timeseries_collection = None
+schema_collection = None
+
+def connect():
+    """Create the Mongo client with the configured pool and bind the collection handles"""
+    global client
+    if client is not None:
+        return
+    
+    client = AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS
+    )
+    bind_database(client[DB_NAME])
+
+def bind_database(database):
+    """Point the collection handles at `database`; tests bind a throwaway one"""
+    global db, settings_collection, deployments_collection, activity_collection
+    global stats_collection, project_stats_collection, monitor_jobs_collection, rollups_collection, timeseries_collection
+    global schema_collection, _counters_backfilled, _counters_checked_at
+    db = database
+    settings_collection = db.settings
+    deployments_collection = db.deployments
+    activity_collection = db.activity
+    stats_collection = db.deployment_stats
+    project_stats_collection = db.project_stats
+    monitor_jobs_collection = db.monitor_jobs
+    rollups_collection = db.deployment_rollups
+    timeseries_collection = db.deployment_timeseries
+    schema_collection = db.schema_state
+    _counters_backfilled = False
+    _counters_checked_at = None
+
+def close():
+    """Close the Mongo client and its pooled connections"""
+    global client, db
+    if client is not None:
+        client.close()
+        client = None
+        db = None
+
+@_timed
+async def ping() -> float:
+    """Round-trip a ping to the server; returns the latency in seconds"""
+    started = time.perf_counter()
+    await client.admin.command("ping")
+    return time.perf_counter() - started
+
+class SchemaError(Exception):
+    """Raised by warmup() when the indexes this module relies on could not be created"""
+
+@_timed
+async def warmup():
+    """Open pooled connections ahead of traffic, make sure indexes exist and apply pending migrations.
+    
+    Raises SchemaError if index creation fails, after the migrations have
+    still run: serving without the unique and tenant indexes is not safe.
+    """
+    latency = await ping()
+    # Concurrent pings each check out their own connection, filling the pool to minPoolSize
+    if MONGO_MIN_POOL_SIZE > 1:
+        await asyncio.gather(*(ping() for _ in range(MONGO_MIN_POOL_SIZE)))
+    logger.info(f"MongoDB reachable in {latency * 1000:.1f}ms, warmed {MONGO_MIN_POOL_SIZE} pooled connections")
+    
+    index_error = None
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        index_error = e
+        logger.error(f"Index creation failed: {str(e)}")
+    await migrate_schema()
+    if index_error is not None:
+        raise SchemaError(f"Index creation failed: {str(index_error)}") from index_error
+
+# Index definitions, one entry per query shape served by this module. The
+# activity TTL index is managed separately since its options are configurable.
+ACTIVITY_TTL_INDEX = "timestamp_ttl"
+INDEXES = {
+    "deployments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("tenantId", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)], name="tenantId_createdAt_id"),
+        IndexModel([("tenantId", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)], name="tenantId_status_createdAt_id"),
+        IndexModel([("tenantId", ASCENDING), ("framework", ASCENDING), ("createdAt", DESCENDING), ("id", DESCENDING)], name="tenantId_framework_createdAt_id"),
+        IndexModel([("tenantId", ASCENDING), ("projectNameLower", ASCENDING)], name="tenantId_projectNameLower"),
+        IndexModel([("tenantId", ASCENDING), ("emergentUrlLower", ASCENDING)], name="tenantId_emergentUrlLower"),
+        IndexModel([("tenantId", ASCENDING), ("searchTrigrams", ASCENDING)], name="tenantId_searchTrigrams"),
+        IndexModel([("vercelDeploymentId", ASCENDING)], name="vercelDeploymentId", sparse=True),
+        IndexModel([("status", ASCENDING), ("createdAt", ASCENDING)], name="status_createdAt"),
+        IndexModel([("archiveBatch", ASCENDING)], name="archiveBatch", sparse=True),
+    ],
+    "activity": [
+        IndexModel([("tenantId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="tenantId_timestamp_id"),
+    ],
+    "settings": [
+        IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+    ],
+    "project_stats": [
+        IndexModel([("tenantId", ASCENDING), ("total", DESCENDING)], name="tenantId_total_desc"),
+    ],
+    "deployment_rollups": [
+        IndexModel([("tenantId", ASCENDING), ("day", ASCENDING)], name="tenantId_day"),
+    ],
+    "deployment_timeseries": [
+        IndexModel([("tenantId", ASCENDING), ("hour", ASCENDING)], name="tenantId_hour"),
+    ],
+    "monitor_jobs": [
+        IndexModel([("dueAt", ASCENDING)], name="dueAt"),
+        IndexModel([("claimId", ASCENDING)], name="claimId", sparse=True),
+    ],
+}
+
+# Representative queries checked by the index report: (name, collection, filter, sort);
+# the deployment list shapes are added next to deployment_filter_query
+QUERY_SHAPES = [
+    ("deployments.by_id", "deployments", {"id": ""}, None),
+    ("deployments.by_vercel_id", "deployments", {"vercelDeploymentId": ""}, None),
+    ("activity.recent", "activity", {"tenantId": DEFAULT_TENANT}, [("timestamp", -1), ("id", -1)]),
+    ("settings.by_user", "settings", {"userId": DEFAULT_TENANT}, None),
+    ("project_stats.most_deployed", "project_stats", {"tenantId": DEFAULT_TENANT}, [("total", -1)]),
+    ("deployments.archivable", "deployments", {"status": {"$in": ["deployed", "failed"]}, "createdAt": {"$lt": datetime(1970, 1, 1)}}, [("createdAt", 1)]),
+    ("deployment_rollups.by_tenant", "deployment_rollups", {"tenantId": DEFAULT_TENANT}, None),
+    ("deployment_timeseries.range", "deployment_timeseries", {"tenantId": DEFAULT_TENANT, "hour": {"$gte": datetime(1970, 1, 1), "$lte": datetime(1970, 1, 1)}}, None),
+    ("monitor_jobs.due", "monitor_jobs", {"dueAt": {"$lte": datetime(1970, 1, 1)}}, [("dueAt", 1)]),
+]
+
+@_timed
+async def ensure_indexes():
+    """Create any missing indexes (idempotent)"""
+    for collection_name, indexes in INDEXES.items():
+        created = await db[collection_name].create_indexes(indexes)
+        logger.info(f"Ensured indexes on {collection_name}: {', '.join(created)}")
+    await _sync_activity_ttl()
+
+@_timed
+async def _sync_activity_ttl():
+    """Create, retune or drop the activity TTL index to match ACTIVITY_RETENTION_DAYS"""
+    expire_after = int(ACTIVITY_RETENTION_DAYS * 86400)
+    existing = (await activity_collection.index_information()).get(ACTIVITY_TTL_INDEX)
+    if expire_after <= 0:
+        if existing is not None:
+            await activity_collection.drop_index(ACTIVITY_TTL_INDEX)
+            logger.info("Dropped the activity TTL index; activity is kept forever")
+    elif existing is None:
+        await activity_collection.create_index([("timestamp", ASCENDING)], name=ACTIVITY_TTL_INDEX, expireAfterSeconds=expire_after)
+        logger.info(f"Activity entries expire after {ACTIVITY_RETENTION_DAYS:g} days")
+    elif existing.get("expireAfterSeconds") != expire_after:
+        # collMod changes the expiry in place instead of rebuilding the index
+        await db.command("collMod", activity_collection.name, index={"name": ACTIVITY_TTL_INDEX, "expireAfterSeconds": expire_after})
+        logger.info(f"Activity retention changed to {ACTIVITY_RETENTION_DAYS:g} days")
+
+@_timed
+async def migrate_tenant_ids():
+    """Assign pre-tenancy documents to the default tenant (idempotent)"""
+    untagged = {"tenantId": {"$exists": False}}
+    for collection in (deployments_collection, activity_collection, monitor_jobs_collection):
+        result = await collection.update_many(untagged, {"$set": {"tenantId": DEFAULT_TENANT}})
+        if result.modified_count:
+            logger.info(f"Assigned {result.modified_count} {collection.name} documents to the default tenant")
+    
+    # Pre-tenancy stats counters are keyed differently; they are derived data,
+    # rebuilt per tenant by backfill_deployment_stats
+    legacy_projects = await project_stats_collection.delete_many(untagged)
+    legacy_totals = await stats_collection.delete_many(untagged)
+    if legacy_projects.deleted_count or legacy_totals.deleted_count:
+        logger.info("Dropped pre-tenancy stats counters")
+
+@_timed
+async def migrate_search_fields(batch_size: int = 1000):
+    """Add the normalized search fields to deployments saved before search existed (idempotent)"""
+    migrated = 0
+    while True:
+        deployments = await deployments_collection.find(
+            {"searchTrigrams": {"$exists": False}},
+            {"_id": 1, "projectName": 1, "emergentUrl": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not deployments:
+            break
+        await deployments_collection.bulk_write([
+            UpdateOne(
+                {"_id": deployment["_id"]},
+                {"$set": search_fields(deployment.get("projectName"), deployment.get("emergentUrl"))}
+            )
+            for deployment in deployments
+        ], ordered=False)
+        migrated += len(deployments)
+    if migrated:
+        logger.info(f"Added search fields to {migrated} deployments")
+
+@_timed
+async def migrate_duration_histograms(batch_size: int = 1000):
+    """Convert histograms written with LEGACY_DURATION_BUCKETS to the current buckets (idempotent).
+    
+    Stats, project stats and live time series are derived data, rebuilt by
+    backfill_deployment_stats. Rollups and the time series of archived deployments are all
+    that is left of their deployments, so their counts are moved into the
+    bucket with the same upper bound; counts from the old 0-5s bucket land
+    in the 3-5s one. Their extremes are set to the bounds of the lowest and
+    highest non-empty old buckets (the sum for the open one), which contain
+    the true extremes, so clamping percentiles to them stays safe.
+    """
+    legacy = {"durationBuckets": {"$exists": True}}
+    
+    def bucket_for(legacy_index: int) -> int:
+        if legacy_index < len(LEGACY_DURATION_BUCKETS):
+            return duration_bucket(LEGACY_DURATION_BUCKETS[legacy_index])
+        return len(DURATION_BUCKETS)
+    
+    for collection in (rollups_collection, timeseries_collection):
+        converted = 0
+        while True:
+            documents = await collection.find(legacy, {"durationBuckets": 1, "durationSum": 1}).limit(batch_size).to_list(length=batch_size)
+            if not documents:
+                break
+            updates = []
+            for document in documents:
+                increments = {}
+                used = sorted(int(legacy_index) for legacy_index, count in (document.get("durationBuckets") or {}).items() if count)
+                for legacy_index in used:
+                    field = f"durationHistogram.{bucket_for(legacy_index)}"
+                    increments[field] = increments.get(field, 0) + document["durationBuckets"][str(legacy_index)]
+                if used:
+                    increments["durationMin"] = float(LEGACY_DURATION_BUCKETS[used[0] - 1]) if used[0] > 0 else 0.0
+                    increments["durationMax"] = float(
+                        LEGACY_DURATION_BUCKETS[used[-1]] if used[-1] < len(LEGACY_DURATION_BUCKETS) else document.get("durationSum", 0)
+                    )
+                # $inc/$min/$max merge with concurrent writes to the new fields
+                update = {"$unset": {"durationBuckets": ""}, **_counter_update(increments)}
+                updates.append(UpdateOne({"_id": document["_id"], **legacy}, update))
+            await collection.bulk_write(updates, ordered=False)
+            converted += len(documents)
+        if converted:
+            logger.info(f"Converted {converted} {collection.name} duration histograms to the current buckets")
+
+@_timed
+async def backfill_deployment_stats():
+    """Rebuild every tenant's counters from its deployments and rollups.
+    
+    Counters written before this ran only describe the deployments since the
+    upgrade; until it has, the write path only updates counters that exist.
+    """
+    await rebuild_deployment_stats()
+
+@_timed
+async def backfill_timeseries():
+    """Rebuild the hour buckets of every tenant with live deployments"""
+    for tenant_id in await deployments_collection.distinct("tenantId"):
+        await rebuild_timeseries(tenant_id)
+
+# Schema migrations
+#
+# One-shot data migrations run in order, once per database; schema_state
+# holds the number applied so far. They scan whole collections, so a worker
+# claims the schema document with a lease before running them and every
+# other worker starts serving without waiting. Each migration is idempotent,
+# so one interrupted by a crash is rerun once the lease expires. Only ever
+# append to SCHEMA_MIGRATIONS.
+SCHEMA_MIGRATIONS = [
+    migrate_tenant_ids,
+    migrate_search_fields,
+    migrate_duration_histograms,
+    backfill_deployment_stats,
+    backfill_timeseries,
+]
+SCHEMA_LOCK_TIMEOUT = 600
+# Workers that did not run the migrations re-read the version this often until the counters are backfilled
+SCHEMA_RECHECK_INTERVAL = 5.0
+STATS_BACKFILL_VERSION = SCHEMA_MIGRATIONS.index(backfill_deployment_stats) + 1
+
+_counters_backfilled = False
+_counters_checked_at: Optional[float] = None
+
+async def get_schema_version() -> int:
+    state = await schema_collection.find_one({"_id": "schema"}, {"version": 1})
+    return (state or {}).get("version", 0)
 
-# Collections
-settings_collection = db.settings
-deployments_collection = db.deployments  
-activity_collection = db.activity
+@_timed
+async def migrate_schema() -> int:
+    """Apply the pending migrations unless another worker already is; returns the schema version"""
+    version = await get_schema_version()
+    if version >= len(SCHEMA_MIGRATIONS):
+        return version
+    
+    owner = uuid.uuid4().hex
+    now = datetime.utcnow()
+    try:
+        state = await schema_collection.find_one_and_update(
+            {"_id": "schema", "$or": [{"lockedUntil": {"$exists": False}}, {"lockedUntil": {"$lt": now}}]},
+            {"$set": {"lockedBy": owner, "lockedUntil": now + timedelta(seconds=SCHEMA_LOCK_TIMEOUT)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists and is locked, so the upsert tried to insert a second one
+        logger.info("Another worker is applying schema migrations")
+        return version
+    
+    version = state.get("version", 0)
+    try:
+        for migration in SCHEMA_MIGRATIONS[version:]:
+            await migration()
+            version += 1
+            await schema_collection.update_one(
+                {"_id": "schema", "lockedBy": owner},
+                {"$set": {"version": version, "lockedUntil": datetime.utcnow() + timedelta(seconds=SCHEMA_LOCK_TIMEOUT)}}
+            )
+            logger.info(f"Applied schema migration {version} ({migration.__name__})")
+    finally:
+        await schema_collection.update_one({"_id": "schema", "lockedBy": owner}, {"$unset": {"lockedBy": "", "lockedUntil": ""}})
+    return version
+
+async def counters_backfilled() -> bool:
+    """Whether backfill_deployment_stats has run, so counters may be created by upsert"""
+    global _counters_backfilled, _counters_checked_at
+    if _counters_backfilled:
+        return True
+    now = time.monotonic()
+    if _counters_checked_at is None or now - _counters_checked_at >= SCHEMA_RECHECK_INTERVAL:
+        _counters_checked_at = now
+        _counters_backfilled = await get_schema_version() >= STATS_BACKFILL_VERSION
+    return _counters_backfilled
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        stages.extend(_plan_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+@_timed
+async def explain_query(collection_name: str, query: dict, sort: Optional[list] = None, limit: int = 50) -> dict:
+    """Explain a find and report whether its winning plan falls back to COLLSCAN"""
+    cursor = db[collection_name].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = await cursor.limit(limit).explain()
+    winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+    stages = _plan_stages(winning_plan)
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages
+    }
 
-async def get_settings(user_id: str = "default") -> Optional[dict]:
+@_timed
+async def get_index_report() -> dict:
+    """Report per-index usage via $indexStats and flag query shapes that COLLSCAN"""
+    collections = {}
+    for collection_name in INDEXES:
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        collections[collection_name] = [
+            {
+                "name": index["name"],
+                "key": dict(index["key"]),
+                "ops": index.get("accesses", {}).get("ops", 0),
+                "since": index.get("accesses", {}).get("since")
+            }
+            for index in stats
+        ]
+    
+    query_shapes = []
+    for name, collection_name, query, sort in QUERY_SHAPES:
+        plan = await explain_query(collection_name, query, sort)
+        query_shapes.append({"name": name, "collection": collection_name, **plan})
+    
+    return {
+        "collections": collections,
+        "queryShapes": query_shapes,
+        "collscans": [shape["name"] for shape in query_shapes if shape["collscan"]]
+    }
+
+@_timed
+async def get_settings(user_id: str = DEFAULT_TENANT) -> Optional[dict]:
     """Get user settings from database"""
     return await settings_collection.find_one({"userId": user_id})
 
+@_timed
 async def save_settings(settings_data: dict) -> dict:
     """Save or update user settings"""
-    user_id = settings_data.get("userId", "default")
+    user_id = settings_data.get("userId", DEFAULT_TENANT)
     
-    # Check if settings exist
-    existing = await settings_collection.find_one({"userId": user_id})
+    # Upsert and bump the version stamp so other workers notice the change
+    saved = await settings_collection.find_one_and_update(
+        {"userId": user_id},
+        {"$set": settings_data, "$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     
-    if existing:
-        # Update existing settings
-        await settings_collection.update_one(
-            {"userId": user_id},
-            {"$set": settings_data}
-        )
+    invalidate_settings_cache(user_id)
+    return saved
+
+# Decrypted settings cache
+#
+# Coherence modes across workers:
+#   local        - entries live until SETTINGS_CACHE_TTL or a local save_settings
+#   version      - additionally re-check the stored version stamp at most every
+#                  SETTINGS_VERSION_CHECK_INTERVAL seconds (default)
+#   changestream - invalidate from a settings change stream (needs a replica set)
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '300'))
+SETTINGS_CACHE_COHERENCE = os.environ.get('SETTINGS_CACHE_COHERENCE', 'version')
+SETTINGS_VERSION_CHECK_INTERVAL = float(os.environ.get('SETTINGS_VERSION_CHECK_INTERVAL', '5'))
+
+_settings_cache: Dict[str, dict] = {}
+_settings_watch_task: Optional[asyncio.Task] = None
+
+def invalidate_settings_cache(user_id: Optional[str] = None):
+    """Drop cached settings for one user, or for everyone"""
+    if user_id is None:
+        _settings_cache.clear()
     else:
-        # Insert new settings
-        await settings_collection.insert_one(settings_data)
+        _settings_cache.pop(user_id, None)
+
+@_timed
+async def _settings_entry_is_fresh(user_id: str, entry: dict) -> bool:
+    now = time.monotonic()
+    if now - entry["loadedAt"] >= SETTINGS_CACHE_TTL:
+        return False
     
-    return await settings_collection.find_one({"userId": user_id})
+    if SETTINGS_CACHE_COHERENCE != "version" or now - entry["checkedAt"] < SETTINGS_VERSION_CHECK_INTERVAL:
+        return True
+    
+    # Cheap projected read of the version stamp instead of a full reload + decrypt
+    stamp = await settings_collection.find_one({"userId": user_id}, {"_id": 0, "version": 1})
+    if not stamp or stamp.get("version") != entry["version"]:
+        return False
+    entry["checkedAt"] = now
+    return True
 
-async def save_deployment(deployment_data: dict) -> dict:
+@_timed
+async def get_decrypted_settings(user_id: str = DEFAULT_TENANT) -> Optional[dict]:
+    """Get user settings with the Vercel API token already decrypted.
+    
+    Served from an in-process cache; raises if the stored token cannot be decrypted.
+    """
+    entry = _settings_cache.get(user_id)
+    if entry is not None and await _settings_entry_is_fresh(user_id, entry):
+        return dict(entry["settings"])
+    
+    settings = await settings_collection.find_one({"userId": user_id})
+    if not settings:
+        _settings_cache.pop(user_id, None)
+        return None
+    
+    if settings.get("vercelApiToken"):
+        settings["vercelApiToken"] = crypto_service.decrypt(settings["vercelApiToken"])
+    
+    now = time.monotonic()
+    _settings_cache[user_id] = {
+        "settings": settings,
+        "version": settings.get("version"),
+        "loadedAt": now,
+        "checkedAt": now
+    }
+    return dict(settings)
+
+async def _watch_settings_changes():
+    try:
+        async with settings_collection.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                document = change.get("fullDocument") or {}
+                invalidate_settings_cache(document.get("userId"))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        global SETTINGS_CACHE_COHERENCE
+        logger.warning(f"Settings change stream unavailable, falling back to version checks: {str(e)}")
+        SETTINGS_CACHE_COHERENCE = "version"
+
+def start_settings_watch():
+    """Start the settings change-stream watcher when that coherence mode is enabled"""
+    global _settings_watch_task
+    if SETTINGS_CACHE_COHERENCE == "changestream" and _settings_watch_task is None:
+        _settings_watch_task = asyncio.get_running_loop().create_task(_watch_settings_changes())
+
+@_timed
+async def stop_settings_watch():
+    """Stop the settings change-stream watcher"""
+    global _settings_watch_task
+    if _settings_watch_task is not None:
+        _settings_watch_task.cancel()
+        try:
+            await _settings_watch_task
+        except asyncio.CancelledError:
+            pass
+        _settings_watch_task = None
+
+def _event_data(document: dict) -> dict:
+    return {k: v for k, v in document.items() if k not in ("_id", "tenantId", *SEARCH_FIELDS)}
+
+@_timed
+async def save_deployment(deployment_data: dict, tenant_id: str = DEFAULT_TENANT) -> dict:
     """Save deployment to database"""
+    deployment_data["tenantId"] = tenant_id
+    deployment_data.update(search_fields(deployment_data.get("projectName"), deployment_data.get("emergentUrl")))
     result = await deployments_collection.insert_one(deployment_data)
     deployment_data["_id"] = result.inserted_id
+    await _record_deployments_created([deployment_data])
+    event_broadcaster.publish("deployment", _event_data(deployment_data), tenant_id)
     return deployment_data
 
-async def get_deployments(limit: int = 50, status_filter: Optional[str] = None) -> list:
-    """Get deployments from database"""
-    query = {}
-    if status_filter:
-        query["status"] = status_filter
+@_timed
+async def save_deployments(deployments_data: List[dict], tenant_id: str = DEFAULT_TENANT) -> List[dict]:
+    """Save many deployments with a single insert_many"""
+    if not deployments_data:
+        return []
     
-    cursor = deployments_collection.find(query).sort("createdAt", -1).limit(limit)
-    deployments = await cursor.to_list(length=limit)
+    for deployment_data in deployments_data:
+        deployment_data["tenantId"] = tenant_id
+        deployment_data.update(search_fields(deployment_data.get("projectName"), deployment_data.get("emergentUrl")))
+    result = await deployments_collection.insert_many(deployments_data)
+    for deployment_data, inserted_id in zip(deployments_data, result.inserted_ids):
+        deployment_data["_id"] = inserted_id
     
-    # Convert ObjectId to string for each deployment
-    for deployment in deployments:
-        deployment["_id"] = str(deployment["_id"])
+    await _record_deployments_created(deployments_data)
+    for deployment_data in deployments_data:
+        event_broadcaster.publish("deployment", _event_data(deployment_data), tenant_id)
+    return deployments_data
+
+# Keyset pagination
+#
+# Cursors are opaque tokens holding the (sort value, id) of the last row of a
+# page. The next page starts strictly after that pair, so every page is an
+# index range scan no matter how deep it is.
+MAX_DEPLOYMENTS_PAGE_SIZE = int(os.environ.get('MAX_DEPLOYMENTS_PAGE_SIZE', '100'))
+MAX_ACTIVITY_PAGE_SIZE = int(os.environ.get('MAX_ACTIVITY_PAGE_SIZE', '100'))
+
+def encode_cursor(sort_value: datetime, item_id: str) -> str:
+    """Build an opaque page cursor from the last row of a page"""
+    raw = json.dumps([sort_value.isoformat(), item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Parse a page cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, item_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), str(item_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+def _after_cursor(field: str, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return {}
+    sort_value, item_id = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": sort_value}},
+        {field: sort_value, "id": {"$lt": item_id}}
+    ]}
+
+# List projections: fetch exactly the response model fields and never `_id`
+DEPLOYMENT_PROJECTION = {"_id": 0, **{field: 1 for field in Deployment.model_fields}}
+ACTIVITY_PROJECTION = {"_id": 0, **{field: 1 for field in Activity.model_fields}}
+
+@_timed
+async def _find_page(collection, query: dict, field: str, limit: int, cursor: Optional[str], projection: dict) -> Tuple[list, Optional[str]]:
+    page_query = {**query, **_after_cursor(field, cursor)}
+    
+    # Fetch one extra row to learn whether another page exists
+    docs = await collection.find(page_query, projection).sort([(field, -1), ("id", -1)]).limit(limit + 1).to_list(length=limit + 1)
     
-    return deployments
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1][field], docs[-1]["id"])
+    
+    return docs, next_cursor
+
+# Deployment search
+#
+# Every deployment carries lowercased copies of its project name and Emergent
+# URL (scheme and www. stripped) and the trigrams of both. Prefix searches are
+# anchored regexes on the lowercased fields, which become index range scans.
+# Substring searches look up the term's trigrams in the multikey trigram index
+# and confirm the hits with an unanchored regex; terms shorter than a trigram
+# scan the lowercased-field indexes within the tenant instead. Every filter
+# combination is bounded by an index that starts with tenantId.
+SEARCH_FIELDS = ("projectNameLower", "emergentUrlLower", "searchTrigrams")
+SEARCH_MATCH_MODES = ("prefix", "contains")
+TRIGRAM_LENGTH = 3
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Lowercase a name, URL or search term and strip a URL scheme and www."""
+    text = (value or "").strip().lower()
+    text = re.sub(r"^[a-z][a-z0-9+.-]*://", "", text)
+    return text[4:] if text.startswith("www.") else text
 
-async def update_deployment_status(deployment_id: str, status: str, vercel_url: Optional[str] = None, error: Optional[str] = None) -> bool:
-    """Update deployment status"""
-    update_data = {
-        "status": status,
-        "updatedAt": datetime.utcnow()
+def trigrams(text: str) -> List[str]:
+    return sorted({text[index:index + TRIGRAM_LENGTH] for index in range(len(text) - TRIGRAM_LENGTH + 1)})
+
+def search_fields(project_name: Optional[str], emergent_url: Optional[str]) -> dict:
+    """The normalized search fields stored on a deployment"""
+    project_name_lower = normalize_search_text(project_name)
+    emergent_url_lower = normalize_search_text(emergent_url)
+    return {
+        "projectNameLower": project_name_lower,
+        "emergentUrlLower": emergent_url_lower,
+        "searchTrigrams": sorted(set(trigrams(project_name_lower)) | set(trigrams(emergent_url_lower)))
     }
+
+def deployment_filter_query(
+    tenant_id: str = DEFAULT_TENANT,
+    statuses: Optional[List[str]] = None,
+    frameworks: Optional[List[str]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    search: Optional[str] = None,
+    match: str = "contains"
+) -> dict:
+    """Build the deployments filter for a tenant's filters and search term.
+    
+    Substring terms shorter than a trigram could only be answered by scanning
+    every deployment of the tenant, so they are rejected with a ValueError.
+    """
+    if match not in SEARCH_MATCH_MODES:
+        raise ValueError(f"Unsupported match mode {match!r}")
+    query = {"tenantId": tenant_id}
+    if statuses:
+        query["status"] = statuses[0] if len(statuses) == 1 else {"$in": list(statuses)}
+    if frameworks:
+        query["framework"] = frameworks[0] if len(frameworks) == 1 else {"$in": list(frameworks)}
+    if created_from or created_to:
+        query["createdAt"] = {}
+        if created_from:
+            query["createdAt"]["$gte"] = created_from
+        if created_to:
+            query["createdAt"]["$lt"] = created_to
+    
+    term = normalize_search_text(search)
+    if term:
+        pattern = re.escape(term)
+        if match == "prefix":
+            pattern = f"^{pattern}"
+        elif len(term) < TRIGRAM_LENGTH:
+            raise ValueError(f"Substring search needs at least {TRIGRAM_LENGTH} characters; use match=prefix for shorter terms")
+        else:
+            query["searchTrigrams"] = {"$all": trigrams(term)}
+        # Kept in $and so the pagination cursor can add its own $or
+        query["$and"] = [{"$or": [
+            {"projectNameLower": {"$regex": pattern}},
+            {"emergentUrlLower": {"$regex": pattern}}
+        ]}]
+    return query
+
+# The list, filter and search shapes are built by deployment_filter_query so
+# the index report checks exactly the queries it sends
+DEPLOYMENT_FILTER_SHAPES = {
+    "recent": {},
+    "by_status_recent": {"statuses": ["building"]},
+    "by_statuses_recent": {"statuses": ["building", "failed"]},
+    "by_framework_recent": {"frameworks": ["react"]},
+    "created_range": {"created_from": datetime(1970, 1, 1), "created_to": datetime(1970, 1, 2)},
+    "search_prefix": {"search": "a", "match": "prefix"},
+    "search_contains": {"search": "abc"},
+}
+QUERY_SHAPES += [
+    (f"deployments.{name}", "deployments", deployment_filter_query(DEFAULT_TENANT, **options), [("createdAt", -1), ("id", -1)])
+    for name, options in DEPLOYMENT_FILTER_SHAPES.items()
+]
+
+@_timed
+async def get_deployments(
+    limit: int = 50,
+    statuses: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    tenant_id: str = DEFAULT_TENANT,
+    frameworks: Optional[List[str]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    search: Optional[str] = None,
+    match: str = "contains"
+) -> Tuple[list, Optional[str]]:
+    """Get a page of a tenant's deployments matching the filters, newest first, and the cursor of the next page"""
+    query = deployment_filter_query(tenant_id, statuses, frameworks, created_from, created_to, search, match)
     
+    limit = min(limit, MAX_DEPLOYMENTS_PAGE_SIZE)
+    return await _find_page(deployments_collection, query, "createdAt", limit, cursor, DEPLOYMENT_PROJECTION)
+
+# Deployment status state machine
+#
+# Deployments start out building and end deployed or failed. Terminal
+# statuses have no outgoing transitions, so a late poll or a redelivered
+# webhook cannot overwrite them; a non-terminal status may be re-set to
+# attach fields (e.g. the Vercel deployment id). Every applied update bumps
+# `version`. The allowed source statuses, and the version when the caller
+# knows it, are part of the update filter, so each write is a compare-and-set.
+STATUS_TRANSITIONS = {
+    "building": ("deployed", "failed"),
+    "deployed": (),
+    "failed": (),
+}
+
+def _source_statuses(status: str, has_fields: bool) -> List[str]:
+    """Statuses a deployment may be in for an update to `status` to apply"""
+    sources = [previous for previous, targets in STATUS_TRANSITIONS.items() if status in targets]
+    if has_fields and STATUS_TRANSITIONS.get(status):
+        sources.append(status)
+    return sources
+
+def _status_fields(vercel_url: Optional[str], error: Optional[str], vercel_deployment_id: Optional[str]) -> dict:
+    fields = {}
     if vercel_url:
-        update_data["vercelUrl"] = vercel_url
+        fields["vercelUrl"] = vercel_url
+    if vercel_deployment_id:
+        fields["vercelDeploymentId"] = vercel_deployment_id
     if error:
-        update_data["error"] = error
+        fields["error"] = error
+    return fields
+
+def is_status_update_needed(current: Optional[dict], status: str, fields: dict) -> bool:
+    """Whether an update can change anything, judged without a round trip.
+
+    `current` is the deployment state the caller already holds (at least its
+    status), or None when unknown.
+    """
+    if current is None or current.get("status") is None:
+        return bool(_source_statuses(status, bool(fields)))
+    if current["status"] == status:
+        return bool(STATUS_TRANSITIONS.get(status)) and any(current.get(field) != value for field, value in fields.items())
+    return status in STATUS_TRANSITIONS.get(current["status"], ())
+
+def _duration_fields(created_at: datetime, now: datetime) -> dict:
+    duration = max((now - created_at).total_seconds(), 0.0)
+    return {"deployDurationSeconds": duration, "deployTime": format_duration(duration)}
+
+@_timed
+async def update_deployment_status(deployment_id: str, status: str, vercel_url: Optional[str] = None, error: Optional[str] = None, vercel_deployment_id: Optional[str] = None, current: Optional[dict] = None) -> bool:
+    """Apply a status transition the state machine allows and keep the materialized stats in step.
     
-    result = await deployments_collection.update_one(
-        {"id": deployment_id},
-        {"$set": update_data}
+    Pass `current` (status, and optionally version and createdAt) when the
+    deployment's state is already known: disallowed and no-op updates are
+    then skipped before reaching Mongo, and a known version makes the write
+    fail if someone else updated the deployment first. Returns True when the
+    update was applied.
+    """
+    fields = _status_fields(vercel_url, error, vercel_deployment_id)
+    if not is_status_update_needed(current, status, fields):
+        deployment_status_updates.labels("skipped").inc()
+        return False
+    
+    now = datetime.utcnow()
+    update_data = {"status": status, "updatedAt": now, **fields}
+    created_at = current.get("createdAt") if current else None
+    if status in TERMINAL_STATUSES and created_at:
+        update_data.update(_duration_fields(created_at, now))
+    
+    query = {"id": deployment_id, "status": {"$in": _source_statuses(status, bool(fields))}}
+    if current and current.get("version") is not None:
+        query["version"] = current["version"]
+    previous = await deployments_collection.find_one_and_update(
+        query,
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection={"_id": 0, "tenantId": 1, "status": 1, "projectName": 1, "framework": 1, "createdAt": 1, "version": 1},
+        return_document=ReturnDocument.BEFORE
     )
+    if previous is None:
+        # Missing, already past this status, or changed since `current` was read
+        deployment_status_updates.labels("conflict").inc()
+        return False
+    deployment_status_updates.labels("applied").inc()
+    tenant_id = previous.get("tenantId", DEFAULT_TENANT)
+    
+    if previous.get("status") != status:
+        if status in TERMINAL_STATUSES and not created_at and previous.get("createdAt"):
+            duration_fields = _duration_fields(previous["createdAt"], now)
+            update_data.update(duration_fields)
+            # Guarded on the version this update produced, so it cannot land on a newer write
+            await deployments_collection.update_one(
+                {"id": deployment_id, "version": previous.get("version", 0) + 1},
+                {"$set": duration_fields}
+            )
+        await _record_status_transitions([{
+            "tenantId": tenant_id,
+            "projectName": previous.get("projectName"),
+            "framework": previous.get("framework"),
+            "previousStatus": previous.get("status"),
+            "status": status,
+            "duration": update_data.get("deployDurationSeconds"),
+            "at": now
+        }])
+    
+    event_broadcaster.publish("deployment", {
+        "id": deployment_id,
+        "previousStatus": previous.get("status"),
+        "version": previous.get("version", 0) + 1,
+        **update_data
+    }, tenant_id)
+    return True
+
+@_timed
+async def update_deployment_statuses(updates: List[dict]) -> List[dict]:
+    """Apply many terminal status results with one bulk_write; returns the updates that were applied.
+    
+    Each update is {"id", "status", "vercelUrl"?, "error"?} and may carry
+    the deployment's "tenantId", "projectName", "framework" and "createdAt";
+    any that are missing are read in one query. Terminal statuses are only reachable from
+    building, so the previous status of every applied update is known without
+    reading it back.
+    """
+    if not updates:
+        return []
+    for update in updates:
+        if update["status"] not in TERMINAL_STATUSES:
+            raise ValueError(f"Bulk status updates only support terminal statuses, got {update['status']!r}")
     
-    return result.modified_count > 0
+    # framework may legitimately be None, so only its absence calls for a lookup
+    incomplete = [
+        update["id"] for update in updates
+        if "framework" not in update or not all(update.get(field) for field in ("tenantId", "projectName", "createdAt"))
+    ]
+    if incomplete:
+        known = {
+            document["id"]: document
+            async for document in deployments_collection.find(
+                {"id": {"$in": incomplete}},
+                {"_id": 0, "id": 1, "tenantId": 1, "projectName": 1, "framework": 1, "createdAt": 1}
+            )
+        }
+        updates = [
+            {**known.get(update["id"], {}), **{field: value for field, value in update.items() if value is not None}}
+            for update in updates
+        ]
+    
+    now = datetime.utcnow()
+    # Marks the documents this call changed, to tell them apart when some updates lose a race.
+    # It is left in place rather than cleaned up with a second write: the next transition
+    # overwrites it, and only this call ever looks for this value.
+    transition_id = uuid.uuid4().hex
+    operations = []
+    for update in updates:
+        update_data = {
+            "status": update["status"],
+            "updatedAt": now,
+            "transitionId": transition_id,
+            **_status_fields(update.get("vercelUrl"), update.get("error"), None)
+        }
+        if update.get("createdAt"):
+            update_data.update(_duration_fields(update["createdAt"], now))
+        update["update"] = update_data
+        operations.append(UpdateOne(
+            {"id": update["id"], "status": {"$in": _source_statuses(update["status"], False)}},
+            {"$set": update_data, "$inc": {"version": 1}}
+        ))
+    result = await deployments_collection.bulk_write(operations, ordered=False)
+    
+    if result.modified_count == len(updates):
+        applied = updates
+    else:
+        # Some updates lost a race; a second round trip finds the ones that won, through the id index
+        applied_ids = {
+            document["id"]
+            async for document in deployments_collection.find(
+                {
+                    "id": {"$in": [update["id"] for update in updates]},
+                    "tenantId": {"$in": list({update.get("tenantId", DEFAULT_TENANT) for update in updates})},
+                    "transitionId": transition_id
+                },
+                {"_id": 0, "id": 1}
+            )
+        }
+        applied = [update for update in updates if update["id"] in applied_ids]
+    deployment_status_updates.labels("applied").inc(len(applied))
+    deployment_status_updates.labels("conflict").inc(len(updates) - len(applied))
+    
+    await _record_status_transitions([
+        {
+            "tenantId": update.get("tenantId", DEFAULT_TENANT),
+            "projectName": update.get("projectName"),
+            "framework": update.get("framework"),
+            "previousStatus": "building",
+            "status": update["status"],
+            "duration": update["update"].get("deployDurationSeconds"),
+            "at": now
+        }
+        for update in applied
+    ])
+    for update in applied:
+        event_data = {key: value for key, value in update["update"].items() if key != "transitionId"}
+        event_broadcaster.publish("deployment", {
+            "id": update["id"],
+            "previousStatus": "building",
+            **event_data
+        }, update.get("tenantId", DEFAULT_TENANT))
+    return [{key: value for key, value in update.items() if key != "update"} for update in applied]
+
+@_timed
+async def get_deployment_by_vercel_id(vercel_deployment_id: str) -> Optional[dict]:
+    """Find the deployment a Vercel deployment id belongs to, in any tenant"""
+    return await deployments_collection.find_one(
+        {"vercelDeploymentId": vercel_deployment_id},
+        {"_id": 0, "id": 1, "tenantId": 1, "status": 1, "projectName": 1, "createdAt": 1, "version": 1}
+    )
 
-async def save_activity(activity_data: dict) -> dict:
-    """Save activity log to database"""
-    result = await activity_collection.insert_one(activity_data)
-    activity_data["_id"] = result.inserted_id
+DUPLICATE_KEY_ERROR = 11000
+
+@_timed
+async def _insert_activities(activities_data: List[dict]):
+    """Insert a batch of activity entries; safe to retry after a partial failure.
+    
+    insert_many stamps each entry with its _id before sending, and a retried
+    batch reuses them, so entries that made it in the first time come back as
+    duplicate-key errors and are skipped instead of being written twice.
+    """
+    try:
+        await activity_collection.insert_many(activities_data, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])) or e.details.get("writeConcernErrors"):
+            raise
+
+# Buffered activity writer: coalesces save_activity calls into insert_many batches
+activity_writer = activity_writer_from_env(_insert_activities)
+
+@_timed
+async def save_activity(activity_data: dict, tenant_id: str = DEFAULT_TENANT) -> dict:
+    """Queue an activity log entry for the buffered bulk writer"""
+    activity_data["tenantId"] = tenant_id
+    await activity_writer.write(activity_data)
+    event_broadcaster.publish("activity", _event_data(activity_data), tenant_id)
     return activity_data
 
-async def get_recent_activity(limit: int = 10) -> list:
-    """Get recent activity logs"""
-    cursor = activity_collection.find().sort("timestamp", -1).limit(limit)
-    activities = await cursor.to_list(length=limit)
+@_timed
+async def save_activities(activities_data: List[dict], tenant_id: str = DEFAULT_TENANT) -> List[dict]:
+    """Queue many activity log entries for the buffered bulk writer"""
+    for activity_data in activities_data:
+        await save_activity(activity_data, tenant_id)
+    return activities_data
+
+@_timed
+async def get_recent_activity(limit: int = 10, cursor: Optional[str] = None, tenant_id: str = DEFAULT_TENANT) -> Tuple[list, Optional[str]]:
+    """Get a page of a tenant's activity logs, newest first, and the cursor of the next page"""
+    limit = min(limit, MAX_ACTIVITY_PAGE_SIZE)
+    return await _find_page(activity_collection, {"tenantId": tenant_id}, "timestamp", limit, cursor, ACTIVITY_PROJECTION)
+
+# Materialized deployment statistics
+#
+# One document per tenant in deployment_stats (keyed by tenant id) plus one
+# document per tenant and project in project_stats hold running counters that
+# are updated atomically with $inc on every insert and status transition, so
+# reading stats is O(1). Deploy durations are tracked as a running sum/count,
+# the smallest and largest duration seen ($min/$max), and a fixed-bucket
+# histogram from which percentiles are estimated and clamped to that range.
+TERMINAL_STATUSES = ("deployed", "failed")
+STATUS_COUNTERS = {"building": "building", "deployed": "successful", "failed": "failed"}
+
+# Upper bounds (seconds) of the deploy-duration histogram buckets; the last bucket is open
+DURATION_BUCKETS = [0.5, 1, 2, 3, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, 3600]
+# Bounds of the durationBuckets histograms written before the finer low buckets;
+# migrate_duration_histograms() converts them into durationHistogram
+LEGACY_DURATION_BUCKETS = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, 3600]
+# Counters kept with $min/$max instead of $inc
+DURATION_EXTREMES = {"durationMin": "$min", "durationMax": "$max"}
+
+def duration_bucket(seconds: float) -> int:
+    """Index of the histogram bucket a duration falls into"""
+    for index, upper_bound in enumerate(DURATION_BUCKETS):
+        if seconds <= upper_bound:
+            return index
+    return len(DURATION_BUCKETS)
+
+def duration_percentile(buckets: dict, quantile: float, minimum: Optional[float] = None, maximum: Optional[float] = None) -> Optional[float]:
+    """Estimate a duration percentile from histogram counts by linear interpolation.
     
-    # Convert ObjectId to string for each activity
-    for activity in activities:
-        activity["_id"] = str(activity["_id"])
+    With the smallest and largest observed durations the estimate is kept
+    within them, so it never contradicts the data (e.g. a p50 above the only
+    duration seen).
+    """
+    counts = [int(buckets.get(str(index), 0)) for index in range(len(DURATION_BUCKETS) + 1)]
+    total = sum(counts)
+    if total == 0:
+        return None
     
-    return activities
+    target = quantile * total
+    cumulative = 0
+    value = float(maximum if maximum is not None else DURATION_BUCKETS[-1])
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= target:
+            lower = DURATION_BUCKETS[index - 1] if index > 0 else 0
+            upper = DURATION_BUCKETS[index] if index < len(DURATION_BUCKETS) else max(maximum or 0, DURATION_BUCKETS[-1])
+            # Narrow the bucket to the observed range before interpolating in it
+            if minimum is not None:
+                lower = min(max(lower, minimum), upper)
+            if maximum is not None:
+                upper = max(min(upper, maximum), lower)
+            value = lower + (upper - lower) * (target - cumulative) / count
+            break
+        cumulative += count
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+def _duration_increments(duration: float) -> dict:
+    return {
+        "durationCount": 1,
+        "durationSum": duration,
+        "durationMin": duration,
+        "durationMax": duration,
+        f"durationHistogram.{duration_bucket(duration)}": 1
+    }
+
+def _transition_increments(previous_status: Optional[str], status: str, duration: Optional[float]) -> dict:
+    increments = {}
+    if previous_status in STATUS_COUNTERS:
+        increments[STATUS_COUNTERS[previous_status]] = -1
+    if status in STATUS_COUNTERS:
+        increments[STATUS_COUNTERS[status]] = increments.get(STATUS_COUNTERS[status], 0) + 1
+    if duration is not None:
+        increments.update(_duration_increments(duration))
+    return increments
+
+def _merge_increments(target: dict, increments: dict):
+    """Merge flat increments into `target`, keeping the extremes as min/max rather than sums"""
+    for field, amount in increments.items():
+        if field == "durationMin":
+            target[field] = min(target.get(field, amount), amount)
+        elif field == "durationMax":
+            target[field] = max(target.get(field, amount), amount)
+        else:
+            target[field] = target.get(field, 0) + amount
+
+def _counter_update(increments: dict) -> dict:
+    """Turn merged increments into an update: $inc for counters, $min/$max for the extremes"""
+    update = {}
+    counters = {field: amount for field, amount in increments.items() if field not in DURATION_EXTREMES}
+    if counters:
+        update["$inc"] = counters
+    for field, operator in DURATION_EXTREMES.items():
+        if field in increments:
+            update.setdefault(operator, {})[field] = increments[field]
+    return update
+
+def _project_stats_id(tenant_id: str, project_name: Optional[str]) -> dict:
+    return {"tenantId": tenant_id, "projectName": project_name}
+
+@_timed
+async def _record_deployments_created(deployments: List[dict]):
+    # Merge per-project increments so a batch costs one bulk write plus one update per tenant
+    per_project: Dict[Tuple[str, Optional[str]], dict] = {}
+    first_seen: Dict[Tuple[str, Optional[str]], datetime] = {}
+    totals: Dict[str, dict] = {}
+    for deployment in deployments:
+        tenant_id = deployment.get("tenantId", DEFAULT_TENANT)
+        increments = {"total": 1, **_transition_increments(None, deployment.get("status"), None)}
+        key = (tenant_id, deployment.get("projectName"))
+        project_increments = per_project.setdefault(key, {})
+        tenant_totals = totals.setdefault(tenant_id, {})
+        first_seen.setdefault(key, deployment.get("createdAt"))
+        _merge_increments(project_increments, increments)
+        _merge_increments(tenant_totals, increments)
+    
+    # Before the backfill, a created counter would only count deployments from now on
+    upsert = await counters_backfilled()
+    result = await project_stats_collection.bulk_write([
+        UpdateOne(
+            {"_id": _project_stats_id(tenant_id, project_name)},
+            {
+                **_counter_update(increments),
+                "$setOnInsert": {"tenantId": tenant_id, "projectName": project_name, "firstSeen": first_seen[(tenant_id, project_name)]}
+            },
+            upsert=upsert
+        )
+        for (tenant_id, project_name), increments in per_project.items()
+    ], ordered=False)
+    for upserted_id in result.upserted_ids.values():
+        tenant_totals = totals[upserted_id["tenantId"]]
+        tenant_totals["projects"] = tenant_totals.get("projects", 0) + 1
+    
+    for tenant_id, tenant_totals in totals.items():
+        await stats_collection.update_one(
+            {"_id": tenant_id},
+            {**_counter_update(tenant_totals), "$setOnInsert": {"tenantId": tenant_id}},
+            upsert=upsert
+        )
+    
+    await _record_timeseries([
+        (deployment.get("tenantId", DEFAULT_TENANT), deployment.get("createdAt") or datetime.utcnow(), deployment.get("projectName"), deployment.get("framework"), {"started": 1})
+        for deployment in deployments
+    ])
+
+@_timed
+async def _record_status_transitions(transitions: List[dict]):
+    """Apply transitions to the counters.
+    
+    Each transition is {"tenantId", "projectName", "framework",
+    "previousStatus", "status", "duration", "at"}.
+    """
+    # Merge increments per tenant and per project so a batch costs two bulk writes (three with time series)
+    totals: Dict[str, dict] = {}
+    per_project: Dict[Tuple[str, Optional[str]], dict] = {}
+    for transition in transitions:
+        tenant_id, project_name = transition["tenantId"], transition["projectName"]
+        increments = _transition_increments(transition["previousStatus"], transition["status"], transition["duration"])
+        _merge_increments(totals.setdefault(tenant_id, {}), increments)
+        _merge_increments(per_project.setdefault((tenant_id, project_name), {}), increments)
+    
+    await _record_timeseries([
+        (transition["tenantId"], transition["at"], transition["projectName"], transition["framework"], _timeseries_increments(transition["status"], transition["duration"]))
+        for transition in transitions
+    ])
+    
+    totals = {tenant_id: increments for tenant_id, increments in totals.items() if increments}
+    if not totals:
+        return
+    upsert = await counters_backfilled()
+    await stats_collection.bulk_write([
+        UpdateOne({"_id": tenant_id}, {**_counter_update(increments), "$setOnInsert": {"tenantId": tenant_id}}, upsert=upsert)
+        for tenant_id, increments in totals.items()
+    ], ordered=False)
+    await project_stats_collection.bulk_write([
+        UpdateOne(
+            {"_id": _project_stats_id(tenant_id, project_name)},
+            {**_counter_update(increments), "$setOnInsert": {"tenantId": tenant_id, "projectName": project_name}},
+            upsert=upsert
+        )
+        for (tenant_id, project_name), increments in per_project.items() if increments
+    ], ordered=False)
 
-async def get_deployment_stats() -> dict:
-    """Get deployment statistics"""
-    # First, let's get the basic stats without trying to average string times
+def _format_stats(counters: dict) -> dict:
+    duration_count = counters.get("durationCount", 0)
+    buckets = counters.get("durationHistogram", {})
+    average = counters.get("durationSum", 0) / duration_count if duration_count else None
+    
+    def percentile(quantile: float) -> Optional[str]:
+        value = duration_percentile(buckets, quantile, counters.get("durationMin"), counters.get("durationMax"))
+        return format_duration(value) if value is not None else None
+    
+    return {
+        "totalDeployments": counters.get("total", 0),
+        "successfulDeployments": counters.get("successful", 0),
+        "failedDeployments": counters.get("failed", 0),
+        "averageDeployTime": format_duration(average) if average is not None else "0s",
+        "totalProjects": counters.get("projects", 0),
+        "averageDeployTimeSeconds": round(average, 3) if average is not None else None,
+        "deployTimeP50": percentile(0.50),
+        "deployTimeP95": percentile(0.95),
+        "deployTimeP99": percentile(0.99)
+    }
+
+def _add_counters(counters: dict, increments: dict):
+    """Add increments (with dotted durationHistogram keys) to a nested counters document"""
+    for field, amount in increments.items():
+        if field.startswith("durationHistogram."):
+            buckets = counters.setdefault("durationHistogram", {})
+            bucket = field.split(".", 1)[1]
+            buckets[bucket] = buckets.get(bucket, 0) + amount
+        else:
+            _merge_increments(counters, {field: amount})
+
+@_timed
+async def rebuild_deployment_stats(tenant_id: Optional[str] = None) -> dict:
+    """Recompute the materialized stats of one tenant (or all) from live deployments plus archived rollups.
+    
+    Time series buckets are rebuilt separately, by rebuild_timeseries. Returns the rebuilt totals of `tenant_id`, or totals summed over every tenant.
+    Runs from the schema migrations and the admin endpoint, never from reads.
+    """
+    started = datetime.utcnow()
     pipeline = [
         {
-            "$group": {
-                "_id": None,
-                "total": {"$sum": 1},
-                "successful": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "deployed"]}, 1, 0]}
-                },
-                "failed": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}
-                },
-                "uniqueProjects": {"$addToSet": "$projectName"}
+            "$project": {
+                "tenantId": 1,
+                "projectName": 1,
+                "status": 1,
+                "createdAt": 1,
+                "duration": {
+                    "$ifNull": [
+                        "$deployDurationSeconds",
+                        {"$cond": [
+                            {"$in": ["$status", list(TERMINAL_STATUSES)]},
+                            {"$divide": [{"$subtract": ["$updatedAt", "$createdAt"]}, 1000]},
+                            None
+                        ]}
+                    ]
+                }
             }
         }
     ]
+    if tenant_id is not None:
+        pipeline.insert(0, {"$match": {"tenantId": tenant_id}})
+    
+    projects: Dict[Tuple[str, Optional[str]], dict] = {}
+    tenants: Dict[str, dict] = {}
+    if tenant_id is not None:
+        # Write a zeroed document even for a tenant without deployments so reads stop rebuilding
+        tenants[tenant_id] = {"total": 0, "projects": 0}
+    
+    def counters_for(counter_tenant: str, project_name: Optional[str], first_seen: Optional[datetime]) -> Tuple[dict, dict]:
+        totals = tenants.setdefault(counter_tenant, {"total": 0, "projects": 0})
+        key = (counter_tenant, project_name)
+        if key not in projects:
+            projects[key] = {"total": 0, "firstSeen": first_seen}
+            totals["projects"] += 1
+        elif first_seen and (projects[key]["firstSeen"] is None or first_seen < projects[key]["firstSeen"]):
+            projects[key]["firstSeen"] = first_seen
+        return totals, projects[key]
+    
+    async for deployment in deployments_collection.aggregate(pipeline):
+        increments = {"total": 1, **_transition_increments(None, deployment.get("status"), deployment.get("duration"))}
+        for counters in counters_for(deployment.get("tenantId", DEFAULT_TENANT), deployment.get("projectName"), deployment.get("createdAt")):
+            _add_counters(counters, increments)
+    
+    # Archived deployments only survive as daily per-project rollups
+    async for rollup in rollups_collection.find({} if tenant_id is None else {"tenantId": tenant_id}, {"batches": 0}):
+        increments = {field: rollup[field] for field in (*ROLLUP_COUNTERS, *DURATION_EXTREMES) if rollup.get(field) is not None}
+        for bucket, amount in (rollup.get("durationHistogram") or {}).items():
+            increments[f"durationHistogram.{bucket}"] = amount
+        for counters in counters_for(rollup["tenantId"], rollup.get("projectName"), rollup.get("firstSeen")):
+            _add_counters(counters, increments)
+    
+    # Upserting replacements converge when rebuilds overlap each other or a live
+    # $inc, where delete-then-insert would fail on the fixed _ids. An increment
+    # landing between the read above and these writes is still overwritten.
+    if tenants:
+        await stats_collection.bulk_write([
+            ReplaceOne({"_id": stats_tenant}, {"tenantId": stats_tenant, "rebuiltAt": started, **totals}, upsert=True)
+            for stats_tenant, totals in tenants.items()
+        ], ordered=False)
+    if projects:
+        await project_stats_collection.bulk_write([
+            ReplaceOne(
+                {"_id": _project_stats_id(project_tenant, project_name)},
+                {"tenantId": project_tenant, "projectName": project_name, "rebuiltAt": started, **counters},
+                upsert=True
+            )
+            for (project_tenant, project_name), counters in projects.items()
+        ], ordered=False)
+    # Counters an earlier rebuild wrote that this one found nothing for
+    stale = {"rebuiltAt": {"$lt": started}}
+    if tenant_id is not None:
+        stale["tenantId"] = tenant_id
+    await stats_collection.delete_many(stale)
+    await project_stats_collection.delete_many(stale)
+    
+    total = sum(totals["total"] for totals in tenants.values())
+    logger.info(f"Rebuilt deployment stats for {total} deployments across {len(projects)} projects and {len(tenants)} tenants")
+    if tenant_id is not None:
+        return tenants[tenant_id]
+    return {"total": total, "projects": len(projects), "tenants": len(tenants)}
+
+@_timed
+async def get_deployment_stats(tenant_id: str = DEFAULT_TENANT) -> dict:
+    """Get a tenant's deployment statistics from the materialized counters"""
+    counters = await stats_collection.find_one({"_id": tenant_id})
+    # A tenant without counters has no deployments yet (or is still waiting for backfill_deployment_stats)
+    return _format_stats(counters or {})
+
+@_timed
+async def get_project_stats(limit: int = 50, tenant_id: str = DEFAULT_TENANT) -> list:
+    """Get a tenant's per-project deployment counters, most deployed first"""
+    cursor = project_stats_collection.find({"tenantId": tenant_id}).sort("total", -1).limit(limit)
+    projects = await cursor.to_list(length=limit)
+    
+    project_stats = []
+    for project in projects:
+        formatted = _format_stats(project)
+        formatted.pop("totalProjects")
+        project_stats.append({"projectName": project.get("projectName"), **formatted})
+    return project_stats
+
+# Deployment time series
+#
+# deployment_timeseries holds one document per tenant, project, framework and
+# UTC hour with the deployments started in that hour and the ones that
+# finished in it, plus their durations as a sum/count and the same histogram
+# the stats documents keep. Buckets are $inc'ed alongside the stats counters
+# on every insert and status transition, so a chart is an index range scan
+# over at most a few thousand small documents, whatever the deployment volume.
+# Archival leaves them alone; they are the only per-hour history of archived
+# deployments, so rebuilds only recompute the hours after the last archived one.
+TIMESERIES_COUNTERS = ("started", "successful", "failed", "durationCount", "durationSum")
+TIMESERIES_GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+TIMESERIES_GROUP_FIELDS = {"project": "projectName", "framework": "framework"}
+MAX_TIMESERIES_POINTS = int(os.environ.get('MAX_TIMESERIES_POINTS', '2400'))
+
+def _timeseries_hour(at: datetime) -> datetime:
+    return datetime(at.year, at.month, at.day, at.hour)
+
+def _timeseries_increments(status: str, duration: Optional[float]) -> dict:
+    """Hour-bucket increments for a deployment reaching `status`"""
+    if status not in TERMINAL_STATUSES:
+        return {}
+    increments = {STATUS_COUNTERS[status]: 1}
+    if duration is not None:
+        increments.update(_duration_increments(duration))
+    return increments
+
+def _timeseries_id(tenant_id: str, hour: datetime, project_name: Optional[str], framework: Optional[str]) -> dict:
+    return {"tenantId": tenant_id, "hour": hour, "projectName": project_name, "framework": framework}
+
+def _timeseries_documents(events: List[Tuple[str, datetime, Optional[str], Optional[str], dict]]) -> Dict[tuple, dict]:
+    """Merge (tenant, time, project, framework, increments) events into per-bucket increments"""
+    buckets: Dict[tuple, dict] = {}
+    for tenant_id, at, project_name, framework, increments in events:
+        if not increments:
+            continue
+        _merge_increments(buckets.setdefault((tenant_id, _timeseries_hour(at), project_name, framework), {}), increments)
+    return buckets
+
+async def _write_timeseries(buckets: Dict[tuple, dict]):
+    """$inc per-bucket increments keyed by (tenant, hour, project, framework)"""
+    if not buckets:
+        return
+    await timeseries_collection.bulk_write([
+        UpdateOne(
+            {"_id": _timeseries_id(*key)},
+            {
+                **_counter_update(increments),
+                "$setOnInsert": {"tenantId": key[0], "hour": key[1], "day": _rollup_day(key[1]), "projectName": key[2], "framework": key[3]}
+            },
+            upsert=True
+        )
+        for key, increments in buckets.items()
+    ], ordered=False)
+
+@_timed
+async def _record_timeseries(events: List[Tuple[str, datetime, Optional[str], Optional[str], dict]]):
+    await _write_timeseries(_timeseries_documents(events))
+
+def _hour_expression(field: str) -> dict:
+    """Aggregation expression truncating a date to its UTC hour"""
+    return {"$dateFromParts": {
+        "year": {"$year": field},
+        "month": {"$month": field},
+        "day": {"$dayOfMonth": field},
+        "hour": {"$hour": field}
+    }}
+
+async def _timeseries_horizon(tenant_id: str) -> Optional[datetime]:
+    """First hour no archived deployment of the tenant counts towards, or None if nothing was archived.
+    
+    Rollups written before they tracked lastSeen only bound it by their day,
+    which misses archived deployments that finished after that day ended.
+    """
+    async for row in rollups_collection.aggregate([
+        {"$match": {"tenantId": tenant_id}},
+        {"$group": {"_id": None, "day": {"$max": "$day"}, "lastSeen": {"$max": "$lastSeen"}}}
+    ]):
+        if row.get("day") is None:
+            break
+        horizon = row["day"] + timedelta(days=1)
+        if row.get("lastSeen"):
+            horizon = max(horizon, _timeseries_hour(row["lastSeen"]) + timedelta(hours=1))
+        return horizon
+    return None
+
+@_timed
+async def rebuild_timeseries(tenant_id: str) -> int:
+    """Recompute a tenant's hour buckets from its live deployments; returns the number of buckets rebuilt.
+    
+    Buckets before the archival horizon also count archived deployments,
+    which only survive as daily rollups, so they are kept as they are and
+    only hours from the horizon on are recomputed. Deployments are grouped
+    by hour in Mongo, so only the buckets themselves are held in memory.
+    """
+    since = await _timeseries_horizon(tenant_id)
+    if since is not None and await timeseries_collection.find_one({"tenantId": tenant_id, "hour": {"$lt": since}}, {"_id": 1}) is None:
+        # Nothing recorded before the horizon, so there is nothing to preserve
+        since = None
+    
+    started_match = {"tenantId": tenant_id, "createdAt": {"$ne": None}}
+    if since is not None:
+        started_match["createdAt"] = {"$gte": since}
+    started_pipeline = [
+        {"$match": started_match},
+        {"$group": {
+            "_id": {"hour": _hour_expression("$createdAt"), "projectName": "$projectName", "framework": "$framework"},
+            "started": {"$sum": 1}
+        }}
+    ]
+    
+    finished_pipeline = [
+        {"$match": {"tenantId": tenant_id, "status": {"$in": list(TERMINAL_STATUSES)}, "createdAt": {"$ne": None}}},
+        {"$project": {
+            "projectName": 1,
+            "framework": 1,
+            "status": 1,
+            "createdAt": 1,
+            "deployDurationSeconds": 1,
+            "finishedAt": {"$ifNull": ["$updatedAt", "$createdAt"]}
+        }},
+        {"$project": {
+            "projectName": 1,
+            "framework": 1,
+            "status": 1,
+            "finishedAt": 1,
+            "duration": {"$ifNull": [
+                "$deployDurationSeconds",
+                {"$max": [{"$divide": [{"$subtract": ["$finishedAt", "$createdAt"]}, 1000]}, 0]}
+            ]}
+        }},
+        {"$group": {
+            "_id": {
+                "hour": _hour_expression("$finishedAt"),
+                "projectName": "$projectName",
+                "framework": "$framework",
+                "status": "$status",
+                # Histogram bucket index, as duration_bucket() computes it
+                "bucket": {"$size": {"$filter": {"input": DURATION_BUCKETS, "cond": {"$lt": ["$$this", "$duration"]}}}}
+            },
+            "count": {"$sum": 1},
+            "durationSum": {"$sum": "$duration"},
+            "durationMin": {"$min": "$duration"},
+            "durationMax": {"$max": "$duration"}
+        }}
+    ]
+    if since is not None:
+        finished_pipeline.insert(3, {"$match": {"finishedAt": {"$gte": since}}})
+    
+    buckets: Dict[tuple, dict] = {}
+    async for row in deployments_collection.aggregate(started_pipeline):
+        key = (tenant_id, row["_id"]["hour"], row["_id"].get("projectName"), row["_id"].get("framework"))
+        _merge_increments(buckets.setdefault(key, {}), {"started": row["started"]})
+    async for row in deployments_collection.aggregate(finished_pipeline):
+        key = (tenant_id, row["_id"]["hour"], row["_id"].get("projectName"), row["_id"].get("framework"))
+        _merge_increments(buckets.setdefault(key, {}), {
+            STATUS_COUNTERS[row["_id"]["status"]]: row["count"],
+            "durationCount": row["count"],
+            "durationSum": row["durationSum"],
+            "durationMin": row["durationMin"],
+            "durationMax": row["durationMax"],
+            f"durationHistogram.{row['_id']['bucket']}": row["count"]
+        })
+    
+    await timeseries_collection.delete_many({"tenantId": tenant_id} if since is None else {"tenantId": tenant_id, "hour": {"$gte": since}})
+    await _write_timeseries(buckets)
+    logger.info(f"Rebuilt {len(buckets)} time series buckets for tenant {tenant_id}")
+    return len(buckets)
+
+def _timeseries_start(at: datetime, granularity: str) -> datetime:
+    hour = _timeseries_hour(at)
+    return _rollup_day(hour) if granularity == "day" else hour
+
+@_timed
+async def get_deployment_timeseries(
+    start: datetime,
+    end: datetime,
+    granularity: str = "hour",
+    group_by: Optional[str] = None,
+    max_groups: int = 10,
+    tenant_id: str = DEFAULT_TENANT
+) -> dict:
+    """Columnar deployment counts and durations per hour or day between `start` and `end` (naive UTC).
+    
+    Every series has one value per timestamp, zero-filled where nothing
+    happened. With `group_by` there is one series per project or framework,
+    the `max_groups` with the most started deployments first.
+    """
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity {granularity!r}")
+    if group_by is not None and group_by not in TIMESERIES_GROUP_FIELDS:
+        raise ValueError(f"Unsupported groupBy {group_by!r}")
+    step = TIMESERIES_GRANULARITIES[granularity]
+    first, last = _timeseries_start(start, granularity), _timeseries_start(end, granularity)
+    if last < first:
+        raise ValueError("'from' must not be after 'to'")
+    points = int((last - first) / step) + 1
+    if points > MAX_TIMESERIES_POINTS:
+        raise ValueError(f"Range covers {points} {granularity}s; at most {MAX_TIMESERIES_POINTS} points are allowed")
+    
+    # Buckets of deployments saved before time series existed come from the backfill_timeseries migration
+    query = {"tenantId": tenant_id, "hour": {"$gte": first, "$lt": last + step}}
+    
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"t": "$day" if granularity == "day" else "$hour", "g": f"${TIMESERIES_GROUP_FIELDS[group_by]}" if group_by else None},
+            **{field: {"$sum": f"${field}"} for field in TIMESERIES_COUNTERS},
+            **{field: {operator: f"${field}"} for field, operator in DURATION_EXTREMES.items()},
+            **{f"b{index}": {"$sum": f"$durationHistogram.{index}"} for index in range(len(DURATION_BUCKETS) + 1)}
+        }}
+    ]
+    groups: Dict[Optional[str], Dict[int, dict]] = {}
+    async for row in timeseries_collection.aggregate(pipeline):
+        groups.setdefault(row["_id"]["g"], {})[int((row["_id"]["t"] - first) / step)] = row
+    
+    started = {group: sum(row["started"] for row in rows.values()) for group, rows in groups.items()}
+    ranked = sorted(groups, key=lambda group: (-started[group], str(group)))
+    if group_by is None:
+        ranked = [None]
+    
+    series = []
+    for group in ranked[:max_groups]:
+        rows = groups.get(group, {})
+        columns = {
+            "started": [0] * points,
+            "successful": [0] * points,
+            "failed": [0] * points,
+            "avgDurationSeconds": [None] * points,
+            "durationP50": [None] * points,
+            "durationP95": [None] * points
+        }
+        for index, row in rows.items():
+            for field in ("started", "successful", "failed"):
+                columns[field][index] = row[field]
+            if row["durationCount"]:
+                buckets = {str(bucket): row[f"b{bucket}"] for bucket in range(len(DURATION_BUCKETS) + 1)}
+                columns["avgDurationSeconds"][index] = round(row["durationSum"] / row["durationCount"], 3)
+                extremes = (row.get("durationMin"), row.get("durationMax"))
+                columns["durationP50"][index] = round(duration_percentile(buckets, 0.50, *extremes), 3)
+                columns["durationP95"][index] = round(duration_percentile(buckets, 0.95, *extremes), 3)
+        series.append({"group": group, **columns})
+    
+    return {
+        "granularity": granularity,
+        "groupBy": group_by,
+        "from": first,
+        "to": last,
+        "stepSeconds": int(step.total_seconds()),
+        "timestamps": [int((first + step * index - datetime(1970, 1, 1)).total_seconds()) for index in range(points)],
+        "series": series,
+        "groupsTruncated": len(ranked) > max_groups
+    }
+
+# Deployment retention
+#
+# Terminal deployments older than DEPLOYMENT_RETENTION_DAYS are folded into
+# deployment_rollups, one document per tenant, project and UTC day holding the
+# same counters as the stats documents, and then deleted. The materialized
+# stats already count them, so they are left alone; rebuilds add the rollups
+# back in. A batch is claimed by stamping its deployments with a batch id, so
+# concurrent sweeps never archive the same deployment, and each rollup keeps
+# the ids of the recent batches it absorbed, so a batch interrupted by a crash
+# is replayed without counting anything twice.
+ROLLUP_COUNTERS = ("total", "successful", "failed", "durationCount", "durationSum")
+ROLLUP_BATCH_HISTORY = 50
+# Claimed batches untouched for this long are assumed abandoned and replayed
+ARCHIVE_CLAIM_TIMEOUT = 600
+
+def _rollup_day(created_at: datetime) -> datetime:
+    return datetime(created_at.year, created_at.month, created_at.day)
+
+@_timed
+async def _archive_batch(batch_id: str) -> int:
+    """Fold the deployments claimed by `batch_id` into the rollups and delete them (idempotent)"""
+    deployments = await deployments_collection.find(
+        {"archiveBatch": batch_id},
+        {"_id": 0, "tenantId": 1, "projectName": 1, "status": 1, "createdAt": 1, "updatedAt": 1, "deployDurationSeconds": 1}
+    ).to_list(length=None)
+    if not deployments:
+        return 0
+    
+    rollups: Dict[Tuple[str, Optional[str], datetime], dict] = {}
+    for deployment in deployments:
+        created_at = deployment["createdAt"]
+        duration = deployment.get("deployDurationSeconds")
+        if duration is None and deployment.get("updatedAt"):
+            duration = max((deployment["updatedAt"] - created_at).total_seconds(), 0.0)
+        key = (deployment.get("tenantId", DEFAULT_TENANT), deployment.get("projectName"), _rollup_day(created_at))
+        rollup = rollups.setdefault(key, {"increments": {}, "firstSeen": created_at, "lastSeen": created_at})
+        rollup["firstSeen"] = min(rollup["firstSeen"], created_at)
+        rollup["lastSeen"] = max(rollup["lastSeen"], deployment.get("updatedAt") or created_at)
+        _merge_increments(rollup["increments"], {"total": 1, **_transition_increments(None, deployment.get("status"), duration)})
     
-    result = await deployments_collection.aggregate(pipeline).to_list(length=1)
+    def rollup_id(key: tuple) -> dict:
+        return {"tenantId": key[0], "projectName": key[1], "day": key[2]}
     
-    if result:
-        stats = result[0]
-        unique_projects = stats.get("uniqueProjects", [])
+    # Create missing rollups first so the guarded $inc below never needs an upsert
+    await rollups_collection.bulk_write([
+        UpdateOne(
+            {"_id": rollup_id(key)},
+            {"$setOnInsert": {"tenantId": key[0], "projectName": key[1], "day": key[2], "batches": []}},
+            upsert=True
+        )
+        for key in rollups
+    ], ordered=False)
+    def rollup_update(rollup: dict) -> dict:
+        update = _counter_update(rollup["increments"])
+        update.setdefault("$min", {})["firstSeen"] = rollup["firstSeen"]
+        # Latest time an archived deployment touched; rebuild_timeseries keeps the buckets before it
+        update.setdefault("$max", {})["lastSeen"] = rollup["lastSeen"]
+        update["$push"] = {"batches": {"$each": [batch_id], "$slice": -ROLLUP_BATCH_HISTORY}}
+        return update
+    
+    await rollups_collection.bulk_write([
+        UpdateOne({"_id": rollup_id(key), "batches": {"$ne": batch_id}}, rollup_update(rollup))
+        for key, rollup in rollups.items()
+    ], ordered=False)
+    
+    result = await deployments_collection.delete_many({"archiveBatch": batch_id})
+    return result.deleted_count
+
+@_timed
+async def archive_deployments(older_than: datetime, batch_size: int = 1000, max_batches: int = 100) -> dict:
+    """Archive terminal deployments created before `older_than`, `batch_size` at a time"""
+    now = datetime.utcnow()
+    replayed = 0
+    stale_batches = await deployments_collection.distinct("archiveBatch", {
+        "archiveBatch": {"$exists": True},
+        "archiveClaimedAt": {"$lt": now - timedelta(seconds=ARCHIVE_CLAIM_TIMEOUT)}
+    })
+    for batch_id in stale_batches:
+        replayed += await _archive_batch(batch_id)
+    
+    archived = 0
+    batches = 0
+    while batches < max_batches:
+        candidates = await deployments_collection.find(
+            {"status": {"$in": list(TERMINAL_STATUSES)}, "createdAt": {"$lt": older_than}, "archiveBatch": {"$exists": False}},
+            {"_id": 1}
+        ).sort("createdAt", 1).limit(batch_size).to_list(length=batch_size)
+        if not candidates:
+            break
         
-        return {
-            "totalDeployments": stats.get("total", 0),
-            "successfulDeployments": stats.get("successful", 0),
-            "failedDeployments": stats.get("failed", 0),
-            "averageDeployTime": "35s",  # Default average time
-            "totalProjects": len(unique_projects)
+        batch_id = uuid.uuid4().hex
+        await deployments_collection.update_many(
+            {"_id": {"$in": [candidate["_id"] for candidate in candidates]}, "archiveBatch": {"$exists": False}},
+            {"$set": {"archiveBatch": batch_id, "archiveClaimedAt": now}}
+        )
+        archived += await _archive_batch(batch_id)
+        batches += 1
+        if len(candidates) < batch_size:
+            break
+    
+    if archived or replayed:
+        logger.info(f"Archived {archived} deployments older than {older_than.isoformat()} into daily rollups ({replayed} replayed)")
+    return {"archived": archived, "replayed": replayed, "batches": batches}
+
+# Deployment monitoring job queue
+#
+# One document per in-flight deployment, keyed by deployment id. A worker
+# claims due jobs by stamping them with its id and a lease expiry; while it
+# works it extends the lease with heartbeats. Jobs whose lease has expired
+# (e.g. the worker crashed) are due again and can be claimed by any worker.
+def _claimable(now: datetime) -> dict:
+    return {"dueAt": {"$lte": now}, "leaseExpiresAt": {"$not": {"$gt": now}}}
+
+@_timed
+async def enqueue_monitor_job(deployment_id: str, vercel_deployment_id: str, started_at: datetime, due_at: datetime, tenant_id: str = DEFAULT_TENANT, project_name: Optional[str] = None, framework: Optional[str] = None):
+    """Add (or reset) the monitoring job for a deployment"""
+    await monitor_jobs_collection.update_one(
+        {"_id": deployment_id},
+        {"$set": {
+            "tenantId": tenant_id,
+            "projectName": project_name,
+            "framework": framework,
+            "vercelDeploymentId": vercel_deployment_id,
+            "startedAt": started_at,
+            "dueAt": due_at,
+            "attempts": 0,
+            "retries": 0,
+            "leaseOwner": None,
+            "leaseExpiresAt": None
+        }},
+        upsert=True
+    )
+
+@_timed
+async def claim_monitor_jobs(worker_id: str, now: datetime, lease_until: datetime, limit: int) -> List[dict]:
+    """Lease up to `limit` due jobs for this worker in three round trips"""
+    candidates = await monitor_jobs_collection.find(_claimable(now), {"_id": 1}).sort("dueAt", 1).limit(limit).to_list(length=limit)
+    if not candidates:
+        return []
+    
+    # Re-check the claim conditions so jobs taken by another worker in between are skipped
+    claim_id = uuid.uuid4().hex
+    await monitor_jobs_collection.update_many(
+        {"_id": {"$in": [job["_id"] for job in candidates]}, **_claimable(now)},
+        {"$set": {"leaseOwner": worker_id, "leaseExpiresAt": lease_until, "claimId": claim_id}}
+    )
+    return await monitor_jobs_collection.find({"claimId": claim_id}).to_list(length=limit)
+
+@_timed
+async def extend_monitor_job_leases(worker_id: str, job_ids: List[str], lease_until: datetime):
+    """Heartbeat: extend the leases this worker still holds"""
+    await monitor_jobs_collection.update_many(
+        {"_id": {"$in": job_ids}, "leaseOwner": worker_id},
+        {"$set": {"leaseExpiresAt": lease_until}}
+    )
+
+@_timed
+async def complete_monitor_jobs(worker_id: str, job_ids: List[str]):
+    """Remove many finished jobs this worker still holds in one round trip"""
+    if job_ids:
+        await monitor_jobs_collection.delete_many({"_id": {"$in": job_ids}, "leaseOwner": worker_id})
+
+@_timed
+async def delete_monitor_job(job_id: str) -> bool:
+    """Remove a job whatever its lease, e.g. once a webhook reported the outcome"""
+    result = await monitor_jobs_collection.delete_one({"_id": job_id})
+    return result.deleted_count > 0
+
+@_timed
+async def postpone_monitor_job(job_id: str, due_at: datetime):
+    """Push a job's next check back to at least `due_at`"""
+    await monitor_jobs_collection.update_one({"_id": job_id}, {"$max": {"dueAt": due_at}})
+
+@_timed
+async def reschedule_monitor_job(worker_id: str, job_id: str, due_at: datetime, attempts: int, retries: int):
+    """Release a job back to the queue with its next due time.
+    
+    `$max` keeps a later due time set meanwhile by postpone_monitor_job.
+    """
+    await monitor_jobs_collection.update_one(
+        {"_id": job_id, "leaseOwner": worker_id},
+        {
+            "$set": {"attempts": attempts, "retries": retries, "leaseOwner": None, "leaseExpiresAt": None},
+            "$max": {"dueAt": due_at},
+            "$unset": {"claimId": ""}
         }
-    else:
-        return {
-            "totalDeployments": 0,
-            "successfulDeployments": 0, 
-            "failedDeployments": 0,
-            "averageDeployTime": "0s",
-            "totalProjects": 0
-        }
\ No newline at end of file
+    )
+
+@_timed
+async def release_monitor_jobs(worker_id: str) -> int:
+    """Give up every lease held by this worker so other workers can pick the jobs up immediately"""
+    result = await monitor_jobs_collection.update_many(
+        {"leaseOwner": worker_id},
+        {"$set": {"leaseOwner": None, "leaseExpiresAt": None}, "$unset": {"claimId": ""}}
+    )
+    return result.modified_count
+
+@_timed
+async def count_monitor_jobs(now: datetime) -> Tuple[int, int]:
+    """Total queued jobs and how many are currently claimable"""
+    total = await monitor_jobs_collection.count_documents({})
+    due = await monitor_jobs_collection.count_documents(_claimable(now))
+    return total, due
@@ -10,7 +10,7 @@ class NotificationSettings(BaseModel):
     building: bool = False
 
 class SettingsCreate(BaseModel):
-    vercelApiToken: str
+    vercelApiToken: Optional[str] = None  # Omitted keeps the stored token, "" clears it
     autoDeployEnabled: bool = True
     defaultTeam: str = "personal"
     deploymentRegion: str = "us-east-1"
@@ -19,7 +19,7 @@ class SettingsCreate(BaseModel):
 class Settings(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     userId: str = "default"  # For future multi-user support
-    vercelApiToken: str
+    hasToken: bool = False  # The Vercel API token itself is write-only
     autoDeployEnabled: bool
     defaultTeam: str
     deploymentRegion: str
@@ -42,9 +42,21 @@ class Deployment(BaseModel):
     status: str = "building"  # 'building', 'deployed', 'failed'
     framework: str
     deployTime: Optional[str] = None
+    deployDurationSeconds: Optional[float] = None
     error: Optional[str] = None
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
+    version: int = 0  # bumped on every status update, for compare-and-set writes
+
+class BatchDeploymentResult(BaseModel):
+    index: int
+    success: bool
+    deployment: Deployment
+
+class BatchDeploymentResponse(BaseModel):
+    results: List[BatchDeploymentResult]
+    succeeded: int
+    failed: int
 
 # Activity Models
 class Activity(BaseModel):
@@ -55,6 +67,15 @@ class Activity(BaseModel):
     deploymentId: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+# Pagination Models
+class DeploymentPage(BaseModel):
+    items: List[Deployment]
+    next_cursor: Optional[str] = None
+
+class ActivityPage(BaseModel):
+    items: List[Activity]
+    next_cursor: Optional[str] = None
+
 # Stats Models
 class Stats(BaseModel):
     totalDeployments: int
@@ -62,6 +83,46 @@ class Stats(BaseModel):
     failedDeployments: int
     averageDeployTime: str
     totalProjects: int
+    averageDeployTimeSeconds: Optional[float] = None
+    deployTimeP50: Optional[str] = None
+    deployTimeP95: Optional[str] = None
+    deployTimeP99: Optional[str] = None
+
+class ProjectStats(BaseModel):
+    projectName: Optional[str] = None
+    totalDeployments: int
+    successfulDeployments: int
+    failedDeployments: int
+    averageDeployTime: str
+    averageDeployTimeSeconds: Optional[float] = None
+    deployTimeP50: Optional[str] = None
+    deployTimeP95: Optional[str] = None
+    deployTimeP99: Optional[str] = None
+
+class TimeSeries(BaseModel):
+    group: Optional[str] = None
+    started: List[int]
+    successful: List[int]
+    failed: List[int]
+    avgDurationSeconds: List[Optional[float]]
+    durationP50: List[Optional[float]]
+    durationP95: List[Optional[float]]
+
+class DeploymentTimeSeries(BaseModel):
+    granularity: str
+    groupBy: Optional[str] = None
+    from_: datetime = Field(alias="from")
+    to: datetime
+    stepSeconds: int
+    timestamps: List[int]
+    series: List[TimeSeries]
+    groupsTruncated: bool = False
+
+# Dashboard Models
+class Dashboard(BaseModel):
+    stats: Optional[Stats] = None
+    deployments: Optional[List[Deployment]] = None
+    activity: Optional[List[Activity]] = None
 
 # Vercel API Models
 class VercelDeploymentRequest(BaseModel):
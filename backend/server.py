@@ -1,31 +1,86 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
-from dotenv import load_dotenv
+import config  # noqa: F401  (loads .env before any service reads the environment)
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Header, Request, Depends
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 import os
 import logging
-from pathlib import Path
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import asyncio
 
 # Import models and services
 from models import (
     Settings, SettingsCreate, Deployment, DeploymentCreate, 
-    Activity, Stats, NotificationSettings
+    Activity, Stats, ProjectStats, NotificationSettings, DeploymentPage, ActivityPage,
+    Dashboard, BatchDeploymentResult, BatchDeploymentResponse, DeploymentTimeSeries
 )
-from services.vercel_service import VercelService, status_vercel_to_internal, calculate_deploy_time
-from services.crypto_service import crypto_service
+from services.vercel_service import VERCEL_API_MODE, VercelService, vercel_services
+from services.crypto_service import crypto_service, DecryptionError
+from services.status_poller import status_poller
+from services.vercel_webhook import vercel_webhooks, WebhookError
+from services.retention import retention_sweeper
+from services.http_client import http_client
+from services.token_cache import token_validation_cache
+from services.event_broadcaster import event_broadcaster
+from services.metrics import metrics, TimedRoute
+from services.tenancy import tenant_resolver, TenantError
 import database as db
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+
+# Cleared during shutdown so /api/ready fails while work drains
+_accepting_traffic = False
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    global _accepting_traffic
+    if VERCEL_API_MODE == "live":
+        # Simulated mode never calls out; the pool opens lazily if something does
+        await http_client.start()
+    db.connect()
+    try:
+        # Open pooled connections and build indexes before the first request
+        await db.warmup()
+    except db.SchemaError:
+        # Missing indexes (e.g. duplicate legacy ids) need an operator; don't serve without them
+        raise
+    except Exception as e:
+        logger.error(f"Database warmup failed: {str(e)}")
+    db.start_settings_watch()
+    # Resume monitoring jobs left behind by previous or crashed workers
+    status_poller.start()
+    retention_sweeper.start()
+    _accepting_traffic = True
+    try:
+        yield
+    finally:
+        # Fail readiness first so the load balancer stops routing here, then drain
+        _accepting_traffic = False
+        await status_poller.stop()
+        await retention_sweeper.stop()
+        # Drain buffered activity entries before the process exits
+        await db.activity_writer.stop()
+        await db.stop_settings_watch()
+        await http_client.close()
+        db.close()
+
+# Serialize responses with orjson when it is installed, falling back to the stdlib encoder
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    class FastJSONResponse(JSONResponse):
+        def render(self, content) -> bytes:
+            return super().render(jsonable_encoder(content))
 
 # Create the main app
-app = FastAPI(title="Emergent Deploy API", version="1.0.0")
+app = FastAPI(title="Emergent Deploy API", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Create a router with the /api prefix; every route records latency and status codes
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
 
 # Configure logging
 logging.basicConfig(
@@ -34,133 +89,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Background task to update deployment status
-async def update_deployment_status_task(deployment_id: str, vercel_deployment_id: str):
-    """Background task to monitor deployment status with improved error handling"""
+# Tenant resolution
+async def get_tenant_id(
+    x_tenant_id: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+) -> str:
+    """Resolve the request's tenant from its API key or X-Tenant-ID header (no database access)"""
     try:
-        # Get settings to retrieve Vercel API token
-        settings = await db.get_settings()
-        if not settings:
-            logger.error("No settings found for deployment status update")
-            return
-        
-        try:
-            # Decrypt Vercel API token
-            vercel_token = crypto_service.decrypt(settings["vercelApiToken"])
-        except Exception as decrypt_error:
-            logger.error(f"Failed to decrypt Vercel token in background task: {str(decrypt_error)}")
-            await db.update_deployment_status(
-                deployment_id,
-                "failed",
-                error="Invalid Vercel API token configuration"
-            )
-            return
-        
-        vercel_service = VercelService(vercel_token)
-        
-        # Poll deployment status
-        max_attempts = 30  # 5 minutes with 10-second intervals
-        for attempt in range(max_attempts):
-            await asyncio.sleep(10)  # Wait 10 seconds between checks
-            
-            try:
-                deployment_status = await vercel_service.get_deployment_status(vercel_deployment_id)
-                vercel_status = deployment_status["status"]
-                internal_status = status_vercel_to_internal(vercel_status)
-                
-                if internal_status == "deployed":
-                    # Calculate deploy time
-                    deploy_time = calculate_deploy_time(datetime.utcnow() - timedelta(seconds=(attempt + 1) * 10))
-                    
-                    # Deployment successful
-                    await db.update_deployment_status(
-                        deployment_id, 
-                        "deployed", 
-                        vercel_url=deployment_status.get("url")
-                    )
-                    
-                    # Log activity
-                    await db.save_activity({
-                        "id": f"act_{int(datetime.now().timestamp())}",
-                        "type": "deployment",
-                        "message": f"Deployment {deployment_id} completed successfully in {deploy_time}",
-                        "status": "success",
-                        "deploymentId": deployment_id,
-                        "timestamp": datetime.utcnow()
-                    })
-                    break
-                    
-                elif internal_status == "failed":
-                    # Get error details if available
-                    error_info = deployment_status.get("error", {})
-                    error_message = error_info.get("message", "Deployment failed on Vercel")
-                    
-                    # Deployment failed
-                    await db.update_deployment_status(
-                        deployment_id,
-                        "failed",
-                        error=error_message
-                    )
-                    
-                    # Log activity
-                    await db.save_activity({
-                        "id": f"act_{int(datetime.now().timestamp())}",
-                        "type": "error", 
-                        "message": f"Deployment {deployment_id} failed: {error_message}",
-                        "status": "error",
-                        "deploymentId": deployment_id,
-                        "timestamp": datetime.utcnow()
-                    })
-                    break
-                    
-            except Exception as e:
-                logger.error(f"Error checking deployment status (attempt {attempt + 1}): {str(e)}")
-                # Continue to next attempt unless it's the last one
-                if attempt == max_attempts - 1:
-                    await db.update_deployment_status(
-                        deployment_id,
-                        "failed", 
-                        error=f"Failed to check deployment status: {str(e)}"
-                    )
-                
-        else:
-            # Max attempts reached, mark as failed
-            await db.update_deployment_status(
-                deployment_id,
-                "failed", 
-                error="Deployment timeout - status check exceeded maximum attempts"
-            )
-            
-            await db.save_activity({
-                "id": f"act_{int(datetime.now().timestamp())}",
-                "type": "error",
-                "message": f"Deployment {deployment_id} timed out",
-                "status": "error", 
-                "deploymentId": deployment_id,
-                "timestamp": datetime.utcnow()
-            })
-            
-    except Exception as e:
-        logger.error(f"Critical error in deployment status update task: {str(e)}")
-        try:
-            await db.update_deployment_status(
-                deployment_id,
-                "failed",
-                error=f"Background task failed: {str(e)}"
-            )
-        except Exception as db_error:
-            logger.error(f"Failed to update deployment status after task error: {str(db_error)}")
+        return tenant_resolver.resolve(x_tenant_id, x_api_key)
+    except TenantError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+async def get_event_stream_tenant_id(
+    api_key: Optional[str] = Query(None, alias="apiKey"),
+    x_tenant_id: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+) -> str:
+    """Like get_tenant_id, but also takes the API key from the query string.
+    
+    Browser EventSource cannot set headers. Query strings end up in access
+    logs, so clients that can send X-API-Key should do so instead.
+    """
+    return await get_tenant_id(x_tenant_id, x_api_key or api_key)
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Guard the cross-tenant admin and monitoring endpoints with ADMIN_API_KEY"""
+    try:
+        tenant_resolver.authorize_admin(x_admin_key)
+    except TenantError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 # Settings endpoints
 @api_router.get("/settings", response_model=Settings)
-async def get_settings():
-    """Get user settings"""
+async def get_settings(tenant_id: str = Depends(get_tenant_id)):
+    """Get user settings; the Vercel API token is never returned, only whether one is set"""
     try:
-        settings_data = await db.get_settings()
+        settings_data = await db.get_settings(tenant_id)
+        
         if not settings_data:
             # Return default settings if none exist
             default_settings = Settings(
-                vercelApiToken="",
+                userId=tenant_id,
                 autoDeployEnabled=True,
                 defaultTeam="personal",
                 deploymentRegion="us-east-1",
@@ -168,30 +137,17 @@ async def get_settings():
             )
             return default_settings
         
-        # Decrypt API token for response
-        if settings_data.get("vercelApiToken"):
-            try:
-                settings_data["vercelApiToken"] = crypto_service.decrypt(settings_data["vercelApiToken"])
-            except:
-                settings_data["vercelApiToken"] = ""
-        
-        return Settings(**settings_data)
+        return Settings(**settings_data, hasToken=bool(settings_data.get("vercelApiToken")))
     except Exception as e:
         logger.error(f"Error getting settings: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve settings")
 
 @api_router.put("/settings", response_model=Settings)
-async def update_settings(settings: SettingsCreate):
-    """Update user settings"""
+async def update_settings(settings: SettingsCreate, tenant_id: str = Depends(get_tenant_id)):
+    """Update user settings; omit vercelApiToken to keep the stored one"""
     try:
-        # Encrypt API token before saving
-        encrypted_token = ""
-        if settings.vercelApiToken:
-            encrypted_token = crypto_service.encrypt(settings.vercelApiToken)
-        
         settings_data = {
-            "userId": "default",
-            "vercelApiToken": encrypted_token,
+            "userId": tenant_id,
             "autoDeployEnabled": settings.autoDeployEnabled,
             "defaultTeam": settings.defaultTeam,
             "deploymentRegion": settings.deploymentRegion,
@@ -199,43 +155,185 @@ async def update_settings(settings: SettingsCreate):
             "updatedAt": datetime.utcnow()
         }
         
+        previous_settings = None
+        if settings.vercelApiToken is not None:
+            # Encrypt API token before saving
+            settings_data["vercelApiToken"] = crypto_service.encrypt(settings.vercelApiToken) if settings.vercelApiToken else ""
+            try:
+                previous_settings = await db.get_decrypted_settings(tenant_id)
+            except Exception as e:
+                logger.error(f"Failed to decrypt previous Vercel token: {str(e)}")
+        
         saved_settings = await db.save_settings(settings_data)
         
-        # Return decrypted token in response
-        if saved_settings.get("vercelApiToken"):
-            saved_settings["vercelApiToken"] = settings.vercelApiToken
+        if settings.vercelApiToken is not None:
+            # The token may have changed, so forget the old token's validation result and the client
+            if previous_settings and previous_settings.get("vercelApiToken"):
+                token_validation_cache.invalidate(previous_settings["vercelApiToken"])
+            vercel_services.invalidate(tenant_id)
         
-        return Settings(**saved_settings)
+        return Settings(**saved_settings, hasToken=bool(saved_settings.get("vercelApiToken")))
     except Exception as e:
         logger.error(f"Error updating settings: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update settings")
 
 # Deployments endpoints
-@api_router.get("/deployments", response_model=List[Deployment])
-async def get_deployments(status: Optional[str] = None, limit: int = 50):
-    """Get deployments with optional status filter"""
+def _trusted_rows(model, docs: List[dict]) -> List[dict]:
+    """Shape rows this service wrote (projected to the model's fields) like the model, without re-validating them"""
+    defaults = [
+        (field, None if info.default_factory is not None else info.default)
+        for field, info in model.model_fields.items()
+    ]
+    return [{field: doc.get(field, default) for field, default in defaults} for doc in docs]
+
+def _naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC; convert aware query parameters to match"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _split_list(value: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated query parameter"""
+    if not value:
+        return None
+    return list(dict.fromkeys(item.strip() for item in value.split(",") if item.strip())) or None
+
+@api_router.get("/deployments", response_model=DeploymentPage)
+async def get_deployments(
+    status: Optional[str] = None,
+    framework: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=100),
+    match: str = Query("contains", pattern="^(prefix|contains)$"),
+    created_from: Optional[datetime] = Query(None, alias="createdFrom"),
+    created_to: Optional[datetime] = Query(None, alias="createdTo"),
+    limit: int = Query(50, ge=1, le=db.MAX_DEPLOYMENTS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Get a page of deployments, optionally searched by project name or URL and filtered.
+    
+    `status` and `framework` take comma-separated sets, `createdFrom` and
+    `createdTo` bound the creation time (inclusive, exclusive), and `q` matches
+    the project name or Emergent URL by prefix or substring (`match`);
+    substring terms need at least three characters. Pass the same filters
+    along with `cursor` for the following pages.
+    """
     try:
-        deployments = await db.get_deployments(limit=limit, status_filter=status)
-        return [Deployment(**deployment) for deployment in deployments]
+        deployments, next_cursor = await db.get_deployments(
+            limit=limit,
+            statuses=_split_list(status),
+            cursor=cursor,
+            tenant_id=tenant_id,
+            frameworks=_split_list(framework),
+            created_from=_naive_utc(created_from) if created_from else None,
+            created_to=_naive_utc(created_to) if created_to else None,
+            search=q,
+            match=match
+        )
+        return FastJSONResponse({"items": _trusted_rows(Deployment, deployments), "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting deployments: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve deployments")
 
+async def _resolve_vercel_service(tenant_id: str) -> VercelService:
+    """Get the tenant's cached Vercel client or raise a 400"""
+    try:
+        # Get settings with the Vercel API token already decrypted
+        settings = await db.get_decrypted_settings(tenant_id)
+    except DecryptionError as decrypt_error:
+        logger.error(f"Failed to decrypt Vercel token: {str(decrypt_error)}")
+        raise HTTPException(status_code=400, detail="Invalid Vercel API token. Please update your settings with a valid token.")
+    
+    if not settings or not settings.get("vercelApiToken"):
+        raise HTTPException(status_code=400, detail="Vercel API token not configured. Please update your settings.")
+    
+    return vercel_services.get(tenant_id, settings["vercelApiToken"])
+
+async def _launch_deployment(vercel_service: VercelService, deployment: Deployment, tenant_id: str, token_valid: Optional[bool] = None) -> dict:
+    """Create a saved deployment on Vercel and hand it to the status poller.
+    
+    Marks the deployment failed on any Vercel error and returns the activity
+    entry to log for it. Pass `token_valid` when the token was already checked.
+    """
+    try:
+        # Validate API token first
+        if token_valid is None:
+            token_valid = await vercel_service.validate_api_token()
+        if not token_valid:
+            raise Exception("INVALID_API_TOKEN: The provided Vercel API token is invalid or expired")
+        
+        # Create deployment on Vercel
+        vercel_deployment = await vercel_service.create_deployment(
+            deployment.projectName,
+            deployment.emergentUrl,
+            deployment.framework
+        )
+        
+        # Update deployment with Vercel info; it was just saved, so its version is known
+        if await db.update_deployment_status(
+            deployment.id,
+            "building",
+            vercel_url=vercel_deployment.get("url"),
+            vercel_deployment_id=vercel_deployment["id"],
+            current={"status": deployment.status, "version": deployment.version}
+        ):
+            deployment.version += 1
+        deployment.vercelDeploymentId = vercel_deployment["id"]
+        deployment.vercelUrl = vercel_deployment.get("url")
+        
+        # Hand the deployment to the shared status poller
+        await status_poller.track(
+            deployment.id,
+            vercel_deployment["id"],
+            started_at=deployment.createdAt,
+            tenant_id=tenant_id,
+            project_name=deployment.projectName,
+            framework=deployment.framework
+        )
+        
+        return Activity(
+            type="deployment",
+            message=f"Started deployment for {deployment.projectName}",
+            status="info",
+            deploymentId=deployment.id
+        ).dict()
+        
+    except Exception as vercel_error:
+        error_message = str(vercel_error)
+        
+        # Check if it's a known Vercel error
+        if any(code in error_message for code in [
+            'DEPLOYMENT_BLOCKED', 'DEPLOYMENT_NOT_FOUND', 'FUNCTION_INVOCATION_FAILED',
+            'INVALID_API_TOKEN', 'NOT_FOUND', 'DEPLOYMENT_DISABLED'
+        ]):
+            user_friendly_error = error_message
+        else:
+            user_friendly_error = f"Vercel deployment failed: {error_message}"
+        
+        # Update deployment status to failed with specific error
+        await db.update_deployment_status(
+            deployment.id,
+            "failed",
+            error=user_friendly_error
+        )
+        
+        deployment.status = "failed"
+        deployment.error = user_friendly_error
+        
+        return Activity(
+            type="error",
+            message=f"Deployment failed for {deployment.projectName}: {user_friendly_error}",
+            status="error",
+            deploymentId=deployment.id
+        ).dict()
+
 @api_router.post("/deployments", response_model=Deployment)
-async def create_deployment(deployment_data: DeploymentCreate, background_tasks: BackgroundTasks):
+async def create_deployment(deployment_data: DeploymentCreate, tenant_id: str = Depends(get_tenant_id)):
     """Create a new deployment with improved error handling"""
     try:
-        # Get settings for Vercel API token
-        settings = await db.get_settings()
-        if not settings or not settings.get("vercelApiToken"):
-            raise HTTPException(status_code=400, detail="Vercel API token not configured. Please update your settings.")
-        
-        try:
-            # Decrypt Vercel API token
-            vercel_token = crypto_service.decrypt(settings["vercelApiToken"])
-        except Exception as decrypt_error:
-            logger.error(f"Failed to decrypt Vercel token: {str(decrypt_error)}")
-            raise HTTPException(status_code=400, detail="Invalid Vercel API token. Please update your settings with a valid token.")
+        vercel_service = await _resolve_vercel_service(tenant_id)
         
         # Create deployment object
         deployment = Deployment(
@@ -246,80 +344,10 @@ async def create_deployment(deployment_data: DeploymentCreate, background_tasks:
         )
         
         # Save to database first
-        await db.save_deployment(deployment.dict())
+        await db.save_deployment(deployment.dict(), tenant_id)
         
-        try:
-            # Initialize Vercel service
-            vercel_service = VercelService(vercel_token)
-            
-            # Validate API token first
-            token_valid = await vercel_service.validate_api_token()
-            if not token_valid:
-                raise Exception("INVALID_API_TOKEN: The provided Vercel API token is invalid or expired")
-            
-            # Create deployment on Vercel
-            vercel_deployment = await vercel_service.create_deployment(
-                deployment_data.projectName,
-                deployment_data.emergentUrl,
-                deployment_data.framework
-            )
-            
-            # Update deployment with Vercel info
-            deployment.vercelDeploymentId = vercel_deployment["id"]
-            await db.update_deployment_status(
-                deployment.id,
-                "building",
-                vercel_url=vercel_deployment.get("url")
-            )
-            
-            # Start background task to monitor deployment
-            background_tasks.add_task(
-                update_deployment_status_task,
-                deployment.id,
-                vercel_deployment["id"]
-            )
-            
-            # Log activity
-            await db.save_activity({
-                "id": f"act_{int(datetime.now().timestamp())}",
-                "type": "deployment",
-                "message": f"Started deployment for {deployment_data.projectName}",
-                "status": "info",
-                "deploymentId": deployment.id,
-                "timestamp": datetime.utcnow()
-            })
-            
-        except Exception as vercel_error:
-            error_message = str(vercel_error)
-            
-            # Check if it's a known Vercel error
-            if any(code in error_message for code in [
-                'DEPLOYMENT_BLOCKED', 'DEPLOYMENT_NOT_FOUND', 'FUNCTION_INVOCATION_FAILED',
-                'INVALID_API_TOKEN', 'NOT_FOUND', 'DEPLOYMENT_DISABLED'
-            ]):
-                user_friendly_error = error_message
-            else:
-                user_friendly_error = f"Vercel deployment failed: {error_message}"
-            
-            # Update deployment status to failed with specific error
-            await db.update_deployment_status(
-                deployment.id,
-                "failed",
-                error=user_friendly_error
-            )
-            
-            # Log error activity
-            await db.save_activity({
-                "id": f"act_{int(datetime.now().timestamp())}",
-                "type": "error",
-                "message": f"Deployment failed for {deployment_data.projectName}: {user_friendly_error}",
-                "status": "error",
-                "deploymentId": deployment.id,
-                "timestamp": datetime.utcnow()
-            })
-            
-            deployment.status = "failed"
-            deployment.error = user_friendly_error
+        activity = await _launch_deployment(vercel_service, deployment, tenant_id)
+        await db.save_activity(activity, tenant_id)
         
         return deployment
     except HTTPException:
@@ -328,58 +356,300 @@ async def create_deployment(deployment_data: DeploymentCreate, background_tasks:
         logger.error(f"Error creating deployment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create deployment: {str(e)}")
 
+# Batch deployments
+MAX_BATCH_DEPLOYMENTS = int(os.environ.get('MAX_BATCH_DEPLOYMENTS', '100'))
+BATCH_DEPLOY_CONCURRENCY = int(os.environ.get('BATCH_DEPLOY_CONCURRENCY', '10'))
+
+@api_router.post("/deployments/batch", response_model=BatchDeploymentResponse)
+async def create_deployments_batch(deployments_data: List[DeploymentCreate], tenant_id: str = Depends(get_tenant_id)):
+    """Create many deployments sharing one settings read and token validation"""
+    if not deployments_data:
+        raise HTTPException(status_code=400, detail="At least one deployment is required")
+    if len(deployments_data) > MAX_BATCH_DEPLOYMENTS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_DEPLOYMENTS} deployments")
+    
+    try:
+        vercel_service = await _resolve_vercel_service(tenant_id)
+        
+        deployments = [
+            Deployment(
+                projectName=item.projectName,
+                emergentUrl=item.emergentUrl,
+                framework=item.framework,
+                status="building"
+            )
+            for item in deployments_data
+        ]
+        
+        # Write every initial record in one round trip, then validate the token once
+        await db.save_deployments([deployment.dict() for deployment in deployments], tenant_id)
+        try:
+            token_valid = await vercel_service.validate_api_token()
+        except Exception as e:
+            # Nothing was cached; each launch retries the (coalesced) check and fails on its own
+            logger.warning(f"Vercel token validation failed, retrying per deployment: {str(e)}")
+            token_valid = None
+        
+        semaphore = asyncio.Semaphore(BATCH_DEPLOY_CONCURRENCY)
+        
+        async def launch(deployment: Deployment) -> dict:
+            async with semaphore:
+                return await _launch_deployment(vercel_service, deployment, tenant_id, token_valid=token_valid)
+        
+        activities = await asyncio.gather(*(launch(deployment) for deployment in deployments))
+        await db.save_activities(list(activities), tenant_id)
+        
+        results = [
+            BatchDeploymentResult(index=index, success=deployment.status != "failed", deployment=deployment)
+            for index, deployment in enumerate(deployments)
+        ]
+        succeeded = sum(1 for result in results if result.success)
+        return BatchDeploymentResponse(
+            results=results,
+            succeeded=succeeded,
+            failed=len(results) - succeeded
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating deployment batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create deployments: {str(e)}")
+
 # Stats and activity endpoints
 @api_router.get("/stats", response_model=Stats) 
-async def get_stats():
+async def get_stats(tenant_id: str = Depends(get_tenant_id)):
     """Get deployment statistics"""
     try:
-        stats_data = await db.get_deployment_stats()
+        stats_data = await db.get_deployment_stats(tenant_id)
         return Stats(**stats_data)
     except Exception as e:
         logger.error(f"Error getting stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
 
-@api_router.get("/activity", response_model=List[Activity])
-async def get_activity(limit: int = 10):
-    """Get recent activity logs"""
+@api_router.get("/stats/projects", response_model=List[ProjectStats])
+async def get_project_stats(limit: int = Query(50, ge=1, le=500), tenant_id: str = Depends(get_tenant_id)):
+    """Get per-project deployment statistics"""
+    try:
+        projects = await db.get_project_stats(limit=limit, tenant_id=tenant_id)
+        return [ProjectStats(**project) for project in projects]
+    except Exception as e:
+        logger.error(f"Error getting project stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve project statistics")
+
+@api_router.get("/stats/timeseries", response_model=DeploymentTimeSeries)
+async def get_stats_timeseries(
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    group_by: Optional[str] = Query(None, alias="groupBy", pattern="^(project|framework)$"),
+    limit: int = Query(10, ge=1, le=50),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Get deployment counts and durations per hour or day as columnar series (defaults to the last 7 days)"""
+    end = _naive_utc(to) if to else datetime.utcnow()
+    start = _naive_utc(from_) if from_ else end - timedelta(days=7)
+    try:
+        timeseries = await db.get_deployment_timeseries(
+            start, end, granularity=granularity, group_by=group_by, max_groups=limit, tenant_id=tenant_id
+        )
+        return FastJSONResponse(timeseries)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting stats time series: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve statistics time series")
+
+@api_router.get("/activity", response_model=ActivityPage)
+async def get_activity(
+    limit: int = Query(10, ge=1, le=db.MAX_ACTIVITY_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Get a page of recent activity logs"""
     try:
-        activities = await db.get_recent_activity(limit=limit)
-        return [Activity(**activity) for activity in activities]
+        activities, next_cursor = await db.get_recent_activity(limit=limit, cursor=cursor, tenant_id=tenant_id)
+        return FastJSONResponse({"items": _trusted_rows(Activity, activities), "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting activity: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve activity logs")
 
+# Event stream endpoint
+EVENT_STREAM_KEEPALIVE = float(os.environ.get('EVENT_STREAM_KEEPALIVE', '15'))
+
+@api_router.get("/events")
+async def stream_events(request: Request, tenant_id: str = Depends(get_event_stream_tenant_id)):
+    """Stream the tenant's deployment status transitions and new activity as Server-Sent Events.
+    
+    EventSource clients pass their API key as `?apiKey=`.
+    """
+    from fastapi.responses import StreamingResponse
+    
+    subscription = event_broadcaster.subscribe(tenant_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.closed and not await request.is_disconnected():
+                message = await subscription.next_event(EVENT_STREAM_KEEPALIVE)
+                # Comment lines keep idle connections open through proxies
+                yield message if message is not None else ": keep-alive\n\n"
+        finally:
+            event_broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Dashboard endpoint
+DASHBOARD_SECTIONS = ("stats", "deployments", "activity")
+
+@api_router.get("/dashboard", response_model=Dashboard)
+async def get_dashboard(
+    include: str = ",".join(DASHBOARD_SECTIONS),
+    deployments_limit: int = Query(3, ge=1, le=db.MAX_DEPLOYMENTS_PAGE_SIZE),
+    activity_limit: int = Query(5, ge=1, le=db.MAX_ACTIVITY_PAGE_SIZE),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Get stats, recent deployments and recent activity in one round trip"""
+    sections = list(dict.fromkeys(section.strip() for section in include.split(",") if section.strip()))
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+    
+    queries = {
+        "stats": lambda: db.get_deployment_stats(tenant_id),
+        "deployments": lambda: db.get_deployments(limit=deployments_limit, tenant_id=tenant_id),
+        "activity": lambda: db.get_recent_activity(limit=activity_limit, tenant_id=tenant_id)
+    }
+    
+    try:
+        # Run the requested queries concurrently
+        results = dict(zip(sections, await asyncio.gather(*(queries[section]() for section in sections))))
+        
+        dashboard = {"stats": None, "deployments": None, "activity": None}
+        if "stats" in results:
+            dashboard["stats"] = Stats(**results["stats"]).model_dump()
+        if "deployments" in results:
+            dashboard["deployments"] = _trusted_rows(Deployment, results["deployments"][0])
+        if "activity" in results:
+            dashboard["activity"] = _trusted_rows(Activity, results["activity"][0])
+        return FastJSONResponse(dashboard)
+    except Exception as e:
+        logger.error(f"Error getting dashboard: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve dashboard")
+
 # Extension download endpoint
 @api_router.get("/extension/download")
-async def download_extension():
+async def download_extension(if_none_match: Optional[str] = Header(None)):
     """Download Chrome extension as zip file"""
-    import zipfile
-    import tempfile
-    from pathlib import Path
-    from fastapi.responses import FileResponse
+    from fastapi.responses import Response
+    from services.extension_bundle import extension_bundle, etag_matches
     
     try:
-        # Create temporary zip file
-        temp_dir = tempfile.mkdtemp()
-        zip_path = Path(temp_dir) / "emergent-deploy-extension.zip"
-        extension_dir = Path(__file__).parent.parent / "chrome-extension"
+        # Reuse the cached bundle unless the extension files changed
+        bundle = await asyncio.to_thread(extension_bundle.get)
+        headers = {
+            "ETag": bundle.etag,
+            "Cache-Control": "no-cache",
+            "Digest": f"sha-256={bundle.sha256}",
+            "X-Content-Integrity": bundle.integrity
+        }
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add all extension files to zip
-            for file_path in extension_dir.rglob('*'):
-                if file_path.is_file():
-                    arcname = file_path.relative_to(extension_dir)
-                    zip_file.write(file_path, arcname)
+        if etag_matches(if_none_match, bundle.etag):
+            return Response(status_code=304, headers=headers)
         
-        return FileResponse(
-            zip_path, 
-            filename="emergent-deploy-extension.zip",
-            media_type="application/zip"
+        return Response(
+            content=bundle.content,
+            media_type="application/zip",
+            headers={
+                **headers,
+                "Content-Disposition": 'attachment; filename="emergent-deploy-extension.zip"'
+            }
         )
     except Exception as e:
         logger.error(f"Error creating extension zip: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create extension download")
 
+# Vercel webhook endpoint
+@api_router.post("/webhooks/vercel")
+async def receive_vercel_webhook(request: Request, x_vercel_signature: Optional[str] = Header(None)):
+    """Apply a signed Vercel deployment event (created, ready, error, canceled)"""
+    # The signature covers the raw body, so it is read before any parsing
+    body = await request.body()
+    try:
+        return await vercel_webhooks.handle(body, x_vercel_signature)
+    except WebhookError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error handling Vercel webhook: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to process webhook")
+
+# Monitoring endpoints (cross-tenant, so they need the admin API key like /admin)
+@api_router.get("/monitoring/poller", dependencies=[Depends(require_admin)])
+async def get_poller_stats():
+    """Get status poller queue depth and tick latency"""
+    return await status_poller.stats()
+
+@api_router.get("/monitoring/activity-writer", dependencies=[Depends(require_admin)])
+async def get_activity_writer_stats():
+    """Get activity writer buffer depth and flush latency"""
+    return db.activity_writer.stats()
+
+@api_router.get("/monitoring/rate-limits", dependencies=[Depends(require_admin)])
+async def get_rate_limit_stats():
+    """Get Vercel rate limit bucket and retry budget state"""
+    from services.rate_limit import rate_limits
+    return rate_limits.stats()
+
+@api_router.get("/monitoring/vercel-clients", dependencies=[Depends(require_admin)])
+async def get_vercel_client_cache_stats():
+    """Get per-tenant Vercel client cache metrics"""
+    return vercel_services.stats()
+
+@api_router.get("/monitoring/retention", dependencies=[Depends(require_admin)])
+async def get_retention_stats():
+    """Get retention settings and archival sweep results"""
+    return retention_sweeper.stats()
+
+@api_router.get("/monitoring/events", dependencies=[Depends(require_admin)])
+async def get_event_stream_stats():
+    """Get event stream subscriber and backpressure metrics"""
+    return event_broadcaster.stats()
+
+# Admin endpoints
+@api_router.get("/admin/indexes", dependencies=[Depends(require_admin)])
+async def get_index_report():
+    """Report index usage and flag query shapes that fall back to COLLSCAN"""
+    try:
+        return await db.get_index_report()
+    except Exception as e:
+        logger.error(f"Error building index report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to build index report")
+
+@api_router.post("/admin/stats/rebuild", response_model=Stats, dependencies=[Depends(require_admin)])
+async def rebuild_stats(tenant_id: str = Depends(get_tenant_id)):
+    """Recompute the tenant's materialized statistics and time series from live deployments and archived rollups"""
+    try:
+        await db.rebuild_deployment_stats(tenant_id)
+        await db.rebuild_timeseries(tenant_id)
+        return Stats(**await db.get_deployment_stats(tenant_id))
+    except Exception as e:
+        logger.error(f"Error rebuilding stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild statistics")
+
+@api_router.post("/admin/retention/sweep", dependencies=[Depends(require_admin)])
+async def run_retention_sweep():
+    """Archive deployments past their retention window now instead of waiting for the next sweep"""
+    try:
+        return await retention_sweeper.sweep()
+    except Exception as e:
+        logger.error(f"Error running retention sweep: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to run retention sweep")
+
 # Error codes reference endpoint  
 @api_router.get("/error-codes")
 async def get_vercel_error_codes():
@@ -397,6 +667,26 @@ async def get_vercel_error_codes():
 async def root():
     return {"message": "Emergent Deploy API is running", "version": "1.0.0"}
 
+# Readiness probe
+@api_router.get("/ready")
+async def ready():
+    """Report whether this worker can serve traffic, with the MongoDB round-trip latency"""
+    if not _accepting_traffic:
+        return FastJSONResponse({"status": "unavailable", "reason": "not accepting traffic"}, status_code=503)
+    try:
+        latency = await db.ping()
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return FastJSONResponse({"status": "unavailable", "reason": "database unreachable"}, status_code=503)
+    return {"status": "ready", "mongo": {"latencyMs": round(latency * 1000, 3)}}
+
+# Prometheus scrape endpoint, served outside /api so scrapes don't show up in route metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Export request, Mongo, Vercel, monitoring and crypto metrics in the Prometheus text format"""
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -406,8 +696,4 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
-)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    pass
\ No newline at end of file
+)
\ No newline at end of file
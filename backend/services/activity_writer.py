@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityWriter:
+    """Buffered writer that coalesces activity log entries into bulk inserts.
+
+    Entries are appended to an in-memory buffer and flushed with a single
+    insert_many once `max_batch` entries are waiting or `flush_interval`
+    seconds have passed, whichever comes first. In synchronous mode every
+    write is flushed before returning, which keeps tests deterministic.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[dict]], Awaitable[None]],
+        max_batch: int = 100,
+        flush_interval: float = 0.5,
+        max_buffer: int = 10000,
+        synchronous: bool = False,
+    ):
+        self._flush = flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.synchronous = synchronous
+
+        # Bounded so entries are shed instead of growing without limit while Mongo is unavailable
+        self._buffer: Deque[dict] = deque(maxlen=max_buffer)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        # Metrics
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    async def write(self, activity_data: dict):
+        """Queue an activity entry for the next flush"""
+        if self.synchronous:
+            self._buffer.append(activity_data)
+            await self.flush()
+            return
+
+        if len(self._buffer) >= self.max_buffer:
+            # The deque sheds the oldest entry on append
+            self.dropped += 1
+        self._buffer.append(activity_data)
+
+        self.start()
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the background flush loop if it is not already running"""
+        if self.synchronous:
+            return
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every buffered entry, one insert_many per batch"""
+        async with self._lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.max_batch, len(self._buffer)))]
+                started = time.perf_counter()
+                try:
+                    await self._flush(batch)
+                except Exception as e:
+                    # Put the batch back in front so the next flush retries it, shedding
+                    # its oldest entries if newer writes have filled the buffer meanwhile
+                    room = self.max_buffer - len(self._buffer)
+                    requeued = batch[-room:] if room > 0 else []
+                    self.dropped += len(batch) - len(requeued)
+                    self._buffer.extendleft(reversed(requeued))
+                    self.failed_flushes += 1
+                    logger.error(f"Failed to flush {len(batch)} activity entries: {str(e)}")
+                    if self.synchronous:
+                        raise
+                    return
+                latency = time.perf_counter() - started
+                self.flushes += 1
+                self.written += len(batch)
+                self.last_flush_latency = latency
+                self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    async def stop(self):
+        """Stop the flush loop and drain whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "mode": "sync" if self.synchronous else "buffered",
+            "bufferDepth": len(self._buffer),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failedFlushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "lastFlushLatencyMs": round(self.last_flush_latency * 1000, 3),
+            "maxFlushLatencyMs": round(self.max_flush_latency * 1000, 3),
+        }
+
+
+def activity_writer_from_env(flush: Callable[[List[dict]], Awaitable[None]]) -> ActivityWriter:
+    """Build an ActivityWriter configured from ACTIVITY_WRITER_* environment variables"""
+    return ActivityWriter(
+        flush,
+        max_batch=int(os.environ.get('ACTIVITY_WRITER_MAX_BATCH', '100')),
+        flush_interval=float(os.environ.get('ACTIVITY_WRITER_FLUSH_INTERVAL', '0.5')),
+        max_buffer=int(os.environ.get('ACTIVITY_WRITER_MAX_BUFFER', '10000')),
+        synchronous=os.environ.get('ACTIVITY_WRITER_MODE', 'buffered') == 'sync',
+    )
@@ -1,30 +1,51 @@
 import os
-from cryptography.fernet import Fernet
 import base64
 import logging
 
+from services.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+class DecryptionError(Exception):
+    """Raised when stored data cannot be decrypted, e.g. after the encryption key changed"""
+
+crypto_operations = metrics.counter(
+    "crypto_operations_total",
+    "Encrypt and decrypt operations by outcome",
+    ("operation", "outcome")
+)
+
 class CryptoService:
     def __init__(self):
-        # In production, this should be loaded from environment variables
-        encryption_key = os.environ.get('ENCRYPTION_KEY')
-        if not encryption_key:
-            # Generate a key for development (in production, use a persistent key)
-            encryption_key = Fernet.generate_key().decode()
-            logger.warning("Using generated encryption key. In production, set ENCRYPTION_KEY environment variable.")
-        
-        if isinstance(encryption_key, str):
-            encryption_key = encryption_key.encode()
-            
-        self.fernet = Fernet(encryption_key)
+        # The Fernet instance (and the cryptography import) is built on first use
+        self._fernet = None
+
+    @property
+    def fernet(self):
+        if self._fernet is None:
+            from cryptography.fernet import Fernet
+
+            # In production, this should be loaded from environment variables
+            encryption_key = os.environ.get('ENCRYPTION_KEY')
+            if not encryption_key:
+                # Generate a key for development (in production, use a persistent key)
+                encryption_key = Fernet.generate_key().decode()
+                logger.warning("Using generated encryption key. In production, set ENCRYPTION_KEY environment variable.")
+
+            if isinstance(encryption_key, str):
+                encryption_key = encryption_key.encode()
+
+            self._fernet = Fernet(encryption_key)
+        return self._fernet
     
     def encrypt(self, data: str) -> str:
         """Encrypt sensitive data"""
         try:
             encrypted_data = self.fernet.encrypt(data.encode())
+            crypto_operations.labels("encrypt", "success").inc()
             return base64.b64encode(encrypted_data).decode()
         except Exception as e:
+            crypto_operations.labels("encrypt", "error").inc()
             logger.error(f"Encryption error: {str(e)}")
             raise Exception("Failed to encrypt data")
     
@@ -33,10 +54,12 @@ class CryptoService:
         try:
             decoded_data = base64.b64decode(encrypted_data.encode())
             decrypted_data = self.fernet.decrypt(decoded_data)
+            crypto_operations.labels("decrypt", "success").inc()
             return decrypted_data.decode()
         except Exception as e:
+            crypto_operations.labels("decrypt", "error").inc()
             logger.error(f"Decryption error: {str(e)}")
-            raise Exception("Failed to decrypt data")
+            raise DecryptionError("Failed to decrypt data")
 
 # Global crypto service instance
 crypto_service = CryptoService()
\ No newline at end of file
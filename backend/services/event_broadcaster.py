@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class Subscription:
+    """One connected client's bounded event queue"""
+
+    def __init__(self, maxsize: int, tenant_id: Optional[str] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Only events for this tenant are delivered; None receives every tenant's events
+        self.tenant_id = tenant_id
+        self.dropped = 0
+        self.lag = 0
+        self.closed = False
+
+    async def next_event(self, timeout: float) -> Optional[str]:
+        """Wait for the next encoded event, or None on timeout"""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+            self.lag = 0
+            return message
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """In-process fan-out of deployment and activity events to streaming clients.
+
+    Every subscriber has its own bounded queue, so one slow client never blocks
+    publishers or other clients. When a queue is full the oldest event is
+    dropped; a client that loses more than `max_dropped` events without reading
+    is disconnected so it can reconnect and resynchronise from the REST API.
+    """
+
+    def __init__(self, queue_size: int = 100, max_dropped: int = 500):
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self._subscribers: Set[Subscription] = set()
+        self._sequence = 0
+        self.published = 0
+        self.disconnected = 0
+
+    def subscribe(self, tenant_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(self.queue_size, tenant_id)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: dict, tenant_id: Optional[str] = None):
+        """Encode an event once and enqueue it for every subscriber of its tenant without blocking"""
+        self.published += 1
+        if not self._subscribers:
+            return
+
+        self._sequence += 1
+        payload = json.dumps(data, default=_json_default)
+        message = f"id: {self._sequence}\nevent: {event_type}\ndata: {payload}\n\n"
+
+        for subscription in list(self._subscribers):
+            if subscription.tenant_id is not None and subscription.tenant_id != tenant_id:
+                continue
+            if subscription.queue.full():
+                # Backpressure: drop the oldest event for this client only
+                subscription.queue.get_nowait()
+                subscription.dropped += 1
+                subscription.lag += 1
+                if subscription.lag > self.max_dropped:
+                    logger.warning("Disconnecting slow event stream client")
+                    self.disconnected += 1
+                    self.unsubscribe(subscription)
+                    continue
+            subscription.queue.put_nowait(message)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "disconnected": self.disconnected,
+            "maxQueueDepth": max((s.queue.qsize() for s in self._subscribers), default=0),
+            "dropped": sum(s.dropped for s in self._subscribers)
+        }
+
+
+# Global event broadcaster instance
+event_broadcaster = EventBroadcaster(
+    queue_size=int(os.environ.get('EVENT_STREAM_QUEUE_SIZE', '100')),
+    max_dropped=int(os.environ.get('EVENT_STREAM_MAX_DROPPED', '500')),
+)
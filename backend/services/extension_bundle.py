@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+import zipfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fixed timestamp for zip entries so identical sources produce identical bytes
+ZIP_ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class Bundle:
+    """Built extension archive and its identifiers"""
+
+    __slots__ = ("content", "content_hash", "sha256")
+
+    def __init__(self, content: bytes, content_hash: str):
+        self.content = content
+        self.content_hash = content_hash
+        self.sha256 = base64.b64encode(hashlib.sha256(content).digest()).decode()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.content_hash}"'
+
+    @property
+    def integrity(self) -> str:
+        """Subresource-integrity style hash of the archive bytes"""
+        return f"sha256-{self.sha256}"
+
+
+class ExtensionBundle:
+    """Content-addressed, in-memory zip of the Chrome extension directory.
+
+    Each call stats the source files; only when sizes or mtimes change are the
+    files re-hashed, and only when the content hash changes is the archive
+    rebuilt.
+    """
+
+    def __init__(self, source_dir: Path):
+        self.source_dir = source_dir
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[List[Tuple[str, int, int]]] = None
+        self._bundle: Optional[Bundle] = None
+        self.builds = 0
+
+    def _files(self) -> List[Path]:
+        return sorted(path for path in self.source_dir.rglob('*') if path.is_file())
+
+    def _fingerprint_of(self, files: List[Path]) -> List[Tuple[str, int, int]]:
+        fingerprint = []
+        for path in files:
+            stat = path.stat()
+            fingerprint.append((path.relative_to(self.source_dir).as_posix(), stat.st_size, stat.st_mtime_ns))
+        return fingerprint
+
+    def _content_hash(self, files: List[Path]) -> str:
+        digest = hashlib.sha256()
+        for path in files:
+            digest.update(path.relative_to(self.source_dir).as_posix().encode())
+            digest.update(b"\0")
+            digest.update(path.read_bytes())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _build(self, files: List[Path], content_hash: str) -> Bundle:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for path in files:
+                info = zipfile.ZipInfo(path.relative_to(self.source_dir).as_posix(), ZIP_ENTRY_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                zip_file.writestr(info, path.read_bytes())
+        self.builds += 1
+        logger.info(f"Built extension bundle {content_hash[:12]} ({buffer.tell()} bytes)")
+        return Bundle(buffer.getvalue(), content_hash)
+
+    def get(self) -> Bundle:
+        """Return the current bundle, rebuilding it only if the sources changed"""
+        with self._lock:
+            files = self._files()
+            fingerprint = self._fingerprint_of(files)
+            if self._bundle is not None and fingerprint == self._fingerprint:
+                return self._bundle
+
+            content_hash = self._content_hash(files)
+            if self._bundle is None or self._bundle.content_hash != content_hash:
+                self._bundle = self._build(files, content_hash)
+            self._fingerprint = fingerprint
+            return self._bundle
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+# Global extension bundle instance
+extension_bundle = ExtensionBundle(Path(__file__).parent.parent.parent / "chrome-extension")
@@ -0,0 +1,72 @@
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """App-lifetime pooled aiohttp session shared by all outbound API calls"""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        total_timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def start(self):
+        """Open the pooled session"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        # Imported here so processes that never call out don't pay for aiohttp at startup
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.total_timeout, connect=self.connect_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(f"HTTP client pool opened (limit={self.limit}, per_host={self.limit_per_host})")
+
+    async def close(self):
+        """Close the pooled session and its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client pool closed")
+        self._session = None
+
+    async def get_session(self) -> "aiohttp.ClientSession":
+        """Get the shared session, opening it lazily outside the app lifespan"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+
+# Global HTTP client instance
+http_client = HttpClient(
+    limit=int(os.environ.get('HTTP_POOL_LIMIT', '100')),
+    limit_per_host=int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', '20')),
+    keepalive_timeout=float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', '30')),
+    dns_cache_ttl=int(os.environ.get('HTTP_DNS_CACHE_TTL', '300')),
+    total_timeout=float(os.environ.get('HTTP_TOTAL_TIMEOUT', '30')),
+    connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', '10')),
+)
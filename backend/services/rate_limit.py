@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Mapping
+
+from services.token_cache import token_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket that also honours server-reported rate limit headers"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Sync the bucket with X-RateLimit-Remaining / X-RateLimit-Reset"""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset is not None:
+            try:
+                # Reset is a unix timestamp in seconds
+                wait = max(float(reset) - time.time(), 0.0)
+            except ValueError:
+                return
+            self.block_for(wait)
+
+    def block_for(self, seconds: float):
+        """Hold all requests for `seconds` (e.g. after a 429 with Retry-After)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def busy(self, now: float) -> bool:
+        """Whether the bucket is blocked or has a request waiting on it"""
+        return now < self.blocked_until or self._lock.locked()
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent requests so retries can't amplify an outage.
+
+    Every request deposits `ratio` of a retry; every retry withdraws one. A
+    small floor of `min_per_second` retries keeps low-traffic callers working.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 5.0, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self.balance = min_per_second
+        self._updated = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.balance = min(self.max_balance, self.balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self.balance >= 1:
+            self.balance -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimitRegistry:
+    """One token bucket per API token, plus a shared retry budget.
+
+    Buckets are kept in last-use order. Buckets beyond `max_buckets` and
+    buckets idle for longer than `idle_ttl` seconds are evicted; an idle
+    bucket would have refilled anyway, so dropping it loses nothing. A bucket
+    that is still blocked or has requests waiting is kept past its idle TTL.
+    """
+
+    def __init__(self, rate: float, burst: float, retry_budget: RetryBudget, max_buckets: int = 1024, idle_ttl: float = 900.0):
+        self.rate = rate
+        self.burst = burst
+        self.retry_budget = retry_budget
+        self.max_buckets = max_buckets
+        self.idle_ttl = idle_ttl
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    def bucket_for(self, api_token: str) -> TokenBucket:
+        now = time.monotonic()
+        key = token_fingerprint(api_token)
+        entry = self._buckets.get(key)
+        bucket = entry[0] if entry is not None else TokenBucket(self.rate, self.burst)
+        self._buckets[key] = (bucket, now)
+        self._buckets.move_to_end(key)
+        self._evict(now)
+        return bucket
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (bucket, last_used) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_buckets:
+                if now - last_used < self.idle_ttl:
+                    break
+                if bucket.busy(now):
+                    # Still in use: keep its state and check it again after another idle TTL
+                    self._buckets[key] = (bucket, now)
+                    self._buckets.move_to_end(key)
+                    continue
+            del self._buckets[key]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._evict(now)
+        return {
+            "buckets": len(self._buckets),
+            "maxBuckets": self.max_buckets,
+            "blockedBuckets": sum(1 for bucket, _ in self._buckets.values() if bucket.blocked_until > now),
+            "evictions": self.evictions,
+            "retryBudgetBalance": round(self.retry_budget.balance, 3),
+            "retryBudgetExhausted": self.retry_budget.exhausted,
+        }
+
+
+# Global rate limit registry instance
+rate_limits = RateLimitRegistry(
+    rate=float(os.environ.get('VERCEL_RATE_LIMIT_PER_SECOND', '10')),
+    burst=float(os.environ.get('VERCEL_RATE_LIMIT_BURST', '20')),
+    retry_budget=RetryBudget(
+        ratio=float(os.environ.get('VERCEL_RETRY_BUDGET_RATIO', '0.2')),
+        min_per_second=float(os.environ.get('VERCEL_RETRY_BUDGET_MIN_PER_SECOND', '5')),
+    ),
+    max_buckets=int(os.environ.get('VERCEL_RATE_LIMIT_MAX_BUCKETS', '1024')),
+    idle_ttl=float(os.environ.get('VERCEL_RATE_LIMIT_IDLE_TTL', '900')),
+)
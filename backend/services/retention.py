@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionSweeper:
+    """Periodically archives deployments past their retention into daily rollups.
+
+    Activity needs no sweep: Mongo's TTL monitor expires it through the index
+    on `activity.timestamp`. Every worker may run a sweeper; batches are
+    claimed atomically, so concurrent sweeps split the work instead of
+    repeating it. The first sweep runs one interval after startup so it never
+    competes with warmup.
+    """
+
+    def __init__(
+        self,
+        interval: float = 3600.0,
+        retention_days: float = 90.0,
+        batch_size: int = 1000,
+        max_batches: int = 100,
+    ):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.sweeps = 0
+        self.failed_sweeps = 0
+        self.archived = 0
+        self.last_sweep_at: Optional[datetime] = None
+        self.last_result: Optional[dict] = None
+        self.last_sweep_latency = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    def start(self):
+        """Start the sweep loop if retention is enabled and it is not already running"""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the sweep loop; a batch in progress is replayed by the next sweep"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {str(e)}")
+
+    async def sweep(self) -> dict:
+        """Archive every terminal deployment older than the retention window now"""
+        if not self.enabled:
+            return {"enabled": False, "archived": 0, "replayed": 0, "batches": 0}
+
+        # One sweep per worker at a time; the loop and the admin endpoint share it
+        async with self._lock:
+            started = time.perf_counter()
+            cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+            try:
+                result = await db.archive_deployments(cutoff, self.batch_size, self.max_batches)
+            except Exception:
+                self.failed_sweeps += 1
+                raise
+            self.sweeps += 1
+            self.archived += result["archived"] + result["replayed"]
+            self.last_sweep_at = datetime.utcnow()
+            self.last_sweep_latency = time.perf_counter() - started
+            self.last_result = {"enabled": True, "cutoff": cutoff, **result}
+            return self.last_result
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "deploymentRetentionDays": self.retention_days,
+            "activityRetentionDays": db.ACTIVITY_RETENTION_DAYS,
+            "intervalSeconds": self.interval,
+            "sweeps": self.sweeps,
+            "failedSweeps": self.failed_sweeps,
+            "archived": self.archived,
+            "lastSweepAt": self.last_sweep_at,
+            "lastSweepLatencyMs": round(self.last_sweep_latency * 1000, 3),
+            "lastResult": self.last_result,
+        }
+
+
+# Global retention sweeper instance
+retention_sweeper = RetentionSweeper(
+    interval=float(os.environ.get('RETENTION_SWEEP_INTERVAL', '3600')),
+    retention_days=db.DEPLOYMENT_RETENTION_DAYS,
+    batch_size=int(os.environ.get('RETENTION_BATCH_SIZE', '1000')),
+    max_batches=int(os.environ.get('RETENTION_MAX_BATCHES', '100')),
+)
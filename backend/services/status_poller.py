@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import database as db
+from models import Activity
+from services.crypto_service import DecryptionError
+from services.metrics import metrics
+from services.tenancy import DEFAULT_TENANT
+from services.vercel_service import VERCEL_WEBHOOK_SECRET, VercelService, VercelRateLimitError, vercel_services, status_vercel_to_internal, calculate_deploy_time
+
+logger = logging.getLogger(__name__)
+
+monitor_in_flight = metrics.gauge(
+    "monitor_in_flight_jobs",
+    "Monitoring jobs currently claimed and being checked by this worker"
+)
+monitor_checks = metrics.counter(
+    "monitor_checks_total",
+    "Deployment status checks by result",
+    ("result",)
+)
+
+
+class StatusPoller:
+    """Scheduler that polls Vercel for every in-flight deployment.
+
+    Monitoring work lives in the Mongo `monitor_jobs` collection, so it
+    survives restarts and is shared by every worker. Each tick leases a batch
+    of due jobs, resolves each tenant's Vercel client once and checks them concurrently
+    while a heartbeat keeps the leases alive. Deployments that are still
+    building are released with an exponential backoff (fast early, slower
+    later) until the overall deadline; jobs abandoned by a crashed worker are
+    claimed again once their lease expires.
+
+    With `webhook_fallback_delay` set, Vercel webhooks report outcomes and
+    polling is only a slow fallback: every check waits that long, and each
+    webhook event pushes the next check back again.
+    """
+
+    def __init__(
+        self,
+        tick_interval: float = 1.0,
+        initial_delay: float = 2.0,
+        max_delay: float = 30.0,
+        backoff_factor: float = 1.5,
+        deadline: float = 300.0,
+        max_concurrency: int = 20,
+        batch_size: int = 100,
+        lease_seconds: float = 30.0,
+        max_retries: int = 5,
+        drain_timeout: float = 10.0,
+        webhook_fallback_delay: float = 0.0,
+    ):
+        self.tick_interval = tick_interval
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.deadline = deadline
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_retries = max_retries
+        self.drain_timeout = drain_timeout
+        self.webhook_fallback_delay = webhook_fallback_delay
+
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight = 0
+        self._stopping = False
+        self._ticking = False
+
+        # Metrics
+        self._ticks = 0
+        self._checks = 0
+        self._claimed = 0
+        self._last_tick_latency = 0.0
+        self._max_tick_latency = 0.0
+        self._total_tick_latency = 0.0
+
+    def next_delay(self, attempts: int) -> float:
+        """Backoff delay before the next check after `attempts` checks"""
+        if self.webhook_fallback_delay:
+            # Webhooks carry the outcome; polling only catches lost deliveries
+            return self.webhook_fallback_delay
+        return min(self.initial_delay * (self.backoff_factor ** attempts), self.max_delay)
+
+    async def track(self, deployment_id: str, vercel_deployment_id: str, started_at: Optional[datetime] = None, tenant_id: str = DEFAULT_TENANT, project_name: Optional[str] = None, framework: Optional[str] = None):
+        """Queue a deployment for monitoring"""
+        now = datetime.utcnow()
+        await db.enqueue_monitor_job(
+            deployment_id,
+            vercel_deployment_id,
+            started_at or now,
+            now + timedelta(seconds=self.next_delay(0)),
+            tenant_id,
+            project_name,
+            framework
+        )
+        # During shutdown the job stays queued for the remaining workers
+        if not self._stopping:
+            self.start()
+
+    def start(self):
+        """Start the scheduler loop if it is not already running"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, drain_timeout: Optional[float] = None):
+        """Stop the scheduler loop and hand any held leases back to the queue.
+
+        A tick in progress gets up to `drain_timeout` seconds to finish its
+        checks before it is cancelled; its unfinished jobs are released.
+        """
+        if self._task is not None:
+            self._stopping = True
+            timeout = self.drain_timeout if drain_timeout is None else drain_timeout
+            if self._ticking and timeout > 0:
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._task), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Monitoring work still running after {timeout}s, cancelling it")
+                except Exception as e:
+                    logger.error(f"Status poller failed while draining: {str(e)}")
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                released = await db.release_monitor_jobs(self.worker_id)
+                if released:
+                    logger.info(f"Released {released} monitoring jobs on shutdown")
+            except Exception as e:
+                logger.error(f"Failed to release monitoring jobs: {str(e)}")
+
+    async def _run(self):
+        while not self._stopping:
+            await asyncio.sleep(self.tick_interval)
+            if self._stopping:
+                break
+            started = time.perf_counter()
+            self._ticking = True
+            try:
+                checked = await self.tick()
+            except Exception as e:
+                logger.error(f"Status poller tick failed: {str(e)}")
+                checked = 0
+            finally:
+                self._ticking = False
+            if checked:
+                latency = time.perf_counter() - started
+                self._ticks += 1
+                self._last_tick_latency = latency
+                self._total_tick_latency += latency
+                self._max_tick_latency = max(self._max_tick_latency, latency)
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def _heartbeat(self, job_ids: List[str]):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await db.extend_monitor_job_leases(self.worker_id, job_ids, self._lease_until())
+            except Exception as e:
+                logger.error(f"Failed to extend monitoring leases: {str(e)}")
+
+    async def tick(self) -> int:
+        """Claim and check every due job; returns how many were claimed"""
+        jobs = await db.claim_monitor_jobs(self.worker_id, datetime.utcnow(), self._lease_until(), self.batch_size)
+        if not jobs:
+            return 0
+
+        self._claimed += len(jobs)
+        self._in_flight += len(jobs)
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat([job["_id"] for job in jobs]))
+        try:
+            await self._process(jobs)
+        finally:
+            heartbeat.cancel()
+            self._in_flight -= len(jobs)
+        return len(jobs)
+
+    async def _process(self, jobs: List[dict]):
+        # Resolve settings and the Vercel client once per tenant in the batch
+        jobs_by_tenant: Dict[str, List[dict]] = {}
+        for job in jobs:
+            jobs_by_tenant.setdefault(job.get("tenantId", DEFAULT_TENANT), []).append(job)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        outcomes = await asyncio.gather(*(
+            self._process_tenant(tenant_id, tenant_jobs, semaphore)
+            for tenant_id, tenant_jobs in jobs_by_tenant.items()
+        ))
+        # Every deployment that finished during this tick is persisted in one bulk write
+        await self.finish_many([outcome for tenant_outcomes in outcomes for outcome in tenant_outcomes])
+
+    async def _process_tenant(self, tenant_id: str, jobs: List[dict], semaphore: asyncio.Semaphore) -> List[dict]:
+        try:
+            settings = await db.get_decrypted_settings(tenant_id)
+        except DecryptionError as decrypt_error:
+            logger.error(f"Failed to decrypt Vercel token in status poller: {str(decrypt_error)}")
+            return [self._outcome(job, "failed", error="Invalid Vercel API token configuration") for job in jobs]
+        except Exception as e:
+            # Mongo timeouts and failovers say nothing about the deployments; check them again later
+            logger.error(f"Failed to load settings in status poller (tenant {tenant_id}), rescheduling: {str(e)}")
+            return await self._reschedule_all(jobs)
+
+        if not settings:
+            logger.error(f"No settings found for deployment status update (tenant {tenant_id})")
+            outcomes = [await self._reschedule_or_expire(job) for job in jobs]
+            return [outcome for outcome in outcomes if outcome is not None]
+
+        if not settings.get("vercelApiToken"):
+            return [self._outcome(job, "failed", error="Vercel API token not configured") for job in jobs]
+
+        vercel_service = vercel_services.get(tenant_id, settings["vercelApiToken"])
+
+        async def check(job: dict) -> Optional[dict]:
+            async with semaphore:
+                return await self._check(vercel_service, job)
+
+        outcomes = await asyncio.gather(*(check(job) for job in jobs))
+        return [outcome for outcome in outcomes if outcome is not None]
+
+    async def _check(self, vercel_service: VercelService, job: dict) -> Optional[dict]:
+        """Check one job; returns its final outcome, or None once it has been rescheduled"""
+        deployment_id = job["_id"]
+        job["attempts"] = job.get("attempts", 0) + 1
+        self._checks += 1
+        try:
+            deployment_status = await vercel_service.get_deployment_status(job["vercelDeploymentId"])
+            internal_status = status_vercel_to_internal(deployment_status["status"])
+            monitor_checks.labels(internal_status).inc()
+
+            if internal_status == "deployed":
+                return self._outcome(job, "deployed", vercel_url=deployment_status.get("url"))
+
+            if internal_status == "failed":
+                error_info = deployment_status.get("error", {})
+                return self._outcome(job, "failed", error=error_info.get("message", "Deployment failed on Vercel"))
+
+            return await self._reschedule_or_expire(job)
+
+        except VercelRateLimitError as e:
+            # Throttling isn't a deployment failure: back off without spending a retry
+            monitor_checks.labels("throttled").inc()
+            logger.warning(f"Rate limited checking deployment {deployment_id}, rescheduling")
+            if self._expired(job):
+                return await self._reschedule_or_expire(job)
+            await self._reschedule(job, delay=e.retry_after)
+
+        except Exception as e:
+            monitor_checks.labels("error").inc()
+            job["retries"] = job.get("retries", 0) + 1
+            logger.error(f"Error checking deployment status (attempt {job['attempts']}, retry {job['retries']}): {str(e)}")
+            if self._expired(job) or job["retries"] > self.max_retries:
+                return self._outcome(job, "failed", error=f"Failed to check deployment status: {str(e)}")
+            await self._reschedule(job)
+        return None
+
+    def _outcome(self, job: dict, status: str, vercel_url: Optional[str] = None, error: Optional[str] = None, timed_out: bool = False) -> dict:
+        outcome = {
+            "id": job["_id"],
+            "tenantId": job.get("tenantId", DEFAULT_TENANT),
+            "projectName": job.get("projectName"),
+            "createdAt": job["startedAt"],
+            "status": status,
+            "vercelUrl": vercel_url,
+            "error": error,
+            "timedOut": timed_out,
+        }
+        # Jobs queued before frameworks were recorded leave it to be looked up
+        if "framework" in job:
+            outcome["framework"] = job["framework"]
+        return outcome
+
+    def _activity(self, outcome: dict) -> dict:
+        deployment_id = outcome["id"]
+        if outcome["status"] == "deployed":
+            message = f"Deployment {deployment_id} completed successfully in {calculate_deploy_time(outcome['createdAt'])}"
+        elif outcome.get("timedOut"):
+            message = f"Deployment {deployment_id} timed out"
+        else:
+            message = f"Deployment {deployment_id} failed: {outcome['error']}"
+        return Activity(
+            type="deployment" if outcome["status"] == "deployed" else "error",
+            message=message,
+            status="success" if outcome["status"] == "deployed" else "error",
+            deploymentId=deployment_id
+        ).dict()
+
+    async def finish_many(self, outcomes: List[dict]) -> List[dict]:
+        """Persist final statuses in one bulk write, log them and drop their jobs.
+
+        Outcomes that lose the compare-and-set (the deployment was already
+        finished, e.g. by a webhook) are not logged again. Returns the applied ones.
+        """
+        if not outcomes:
+            return []
+        applied = await db.update_deployment_statuses(outcomes)
+        for outcome in applied:
+            await db.save_activity(self._activity(outcome), outcome["tenantId"])
+        await db.complete_monitor_jobs(self.worker_id, [outcome["id"] for outcome in outcomes])
+        return applied
+
+    async def finish(self, deployment_id: str, tenant_id: str, started_at: datetime, status: str, vercel_url: Optional[str] = None, error: Optional[str] = None, current: Optional[dict] = None) -> bool:
+        """Record one deployment's final status and log it; returns False if it was already final"""
+        applied = await db.update_deployment_status(deployment_id, status, vercel_url=vercel_url, error=error, current=current)
+        if applied:
+            await db.save_activity(self._activity({
+                "id": deployment_id,
+                "createdAt": started_at,
+                "status": status,
+                "error": error,
+            }), tenant_id)
+        return applied
+
+    def _expired(self, job: dict) -> bool:
+        return (datetime.utcnow() - job["startedAt"]).total_seconds() >= self.deadline
+
+    async def _reschedule(self, job: dict, delay: Optional[float] = None):
+        if delay is None:
+            delay = self.next_delay(job.get("attempts", 0))
+        await db.reschedule_monitor_job(
+            self.worker_id,
+            job["_id"],
+            datetime.utcnow() + timedelta(seconds=delay),
+            job.get("attempts", 0),
+            job.get("retries", 0)
+        )
+
+    async def _reschedule_all(self, jobs: List[dict]) -> List[dict]:
+        """Reschedule jobs after a transient error; returns the outcomes of those past their deadline"""
+        outcomes = []
+        for job in jobs:
+            try:
+                outcome = await self._reschedule_or_expire(job)
+            except Exception as e:
+                # Still unreachable: the lease runs out and a later tick reclaims the job
+                logger.error(f"Failed to reschedule deployment {job['_id']}: {str(e)}")
+                continue
+            if outcome is not None:
+                outcomes.append(outcome)
+        return outcomes
+
+    async def _reschedule_or_expire(self, job: dict) -> Optional[dict]:
+        if not self._expired(job):
+            await self._reschedule(job)
+            return None
+        return self._outcome(job, "failed", error="Deployment timeout - status check exceeded maximum attempts", timed_out=True)
+
+    async def stats(self) -> dict:
+        """Queue depth and tick latency metrics"""
+        queue_depth, due_now = await db.count_monitor_jobs(datetime.utcnow())
+        return {
+            "workerId": self.worker_id,
+            "running": self._task is not None and not self._task.done(),
+            "stopping": self._stopping,
+            "queueDepth": queue_depth,
+            "dueNow": due_now,
+            "inFlight": self._in_flight,
+            "ticks": self._ticks,
+            "claimed": self._claimed,
+            "checks": self._checks,
+            "lastTickLatencyMs": round(self._last_tick_latency * 1000, 3),
+            "avgTickLatencyMs": round(self._total_tick_latency / self._ticks * 1000, 3) if self._ticks else 0.0,
+            "maxTickLatencyMs": round(self._max_tick_latency * 1000, 3),
+        }
+
+
+# Global status poller instance
+status_poller = StatusPoller(
+    tick_interval=float(os.environ.get('POLLER_TICK_INTERVAL', '1.0')),
+    initial_delay=float(os.environ.get('POLLER_INITIAL_DELAY', '2.0')),
+    max_delay=float(os.environ.get('POLLER_MAX_DELAY', '30.0')),
+    backoff_factor=float(os.environ.get('POLLER_BACKOFF_FACTOR', '1.5')),
+    deadline=float(os.environ.get('POLLER_DEADLINE', '300')),
+    max_concurrency=int(os.environ.get('POLLER_MAX_CONCURRENCY', '20')),
+    batch_size=int(os.environ.get('POLLER_BATCH_SIZE', '100')),
+    lease_seconds=float(os.environ.get('POLLER_LEASE_SECONDS', '30')),
+    max_retries=int(os.environ.get('POLLER_MAX_RETRIES', '5')),
+    drain_timeout=float(os.environ.get('POLLER_DRAIN_TIMEOUT', '10')),
+    webhook_fallback_delay=float(os.environ.get('POLLER_WEBHOOK_FALLBACK_DELAY', '60' if VERCEL_WEBHOOK_SECRET else '0')),
+)
+monitor_in_flight.set_function(lambda: status_poller._in_flight)
@@ -0,0 +1,85 @@
+import hmac
+import logging
+import os
+import re
+from typing import Dict, Optional
+
+from services.token_cache import token_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Tenant used when a request names none; matches the historical Settings.userId
+DEFAULT_TENANT = "default"
+
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class TenantError(Exception):
+    """Raised when a request's tenant cannot be resolved"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TenantResolver:
+    """Maps a request to a tenant from its API key or X-Tenant-ID header.
+
+    API keys are configured up front and looked up by fingerprint in memory,
+    so resolving a tenant never costs a database round trip. An API key wins
+    over the header. The header is unauthenticated, so it is ignored unless
+    `allow_header` is on, e.g. behind a gateway that sets it itself.
+
+    The admin and monitoring endpoints span every tenant and need the
+    separate `admin_api_key`; without one they are disabled.
+    """
+
+    def __init__(self, api_keys: Optional[Dict[str, str]] = None, allow_header: bool = False, admin_api_key: Optional[str] = None):
+        self.allow_header = allow_header
+        self._admin_key_fingerprint = token_fingerprint(admin_api_key) if admin_api_key else None
+        self._tenants_by_key: Dict[str, str] = {}
+        for api_key, tenant_id in (api_keys or {}).items():
+            if not TENANT_ID_PATTERN.match(tenant_id):
+                raise ValueError(f"Invalid tenant id configured for an API key: {tenant_id!r}")
+            self._tenants_by_key[token_fingerprint(api_key)] = tenant_id
+
+    def resolve(self, tenant_header: Optional[str] = None, api_key: Optional[str] = None) -> str:
+        if api_key:
+            tenant_id = self._tenants_by_key.get(token_fingerprint(api_key))
+            if tenant_id is None:
+                raise TenantError("Invalid API key", status_code=401)
+            return tenant_id
+
+        if tenant_header and self.allow_header:
+            if not TENANT_ID_PATTERN.match(tenant_header):
+                raise TenantError("Invalid X-Tenant-ID header")
+            return tenant_header
+
+        return DEFAULT_TENANT
+
+    def authorize_admin(self, admin_key: Optional[str]):
+        """Raise a TenantError unless `admin_key` is the configured admin API key"""
+        if self._admin_key_fingerprint is None:
+            raise TenantError("Admin endpoints are disabled; set ADMIN_API_KEY to enable them", status_code=403)
+        if not admin_key or not hmac.compare_digest(token_fingerprint(admin_key), self._admin_key_fingerprint):
+            raise TenantError("Invalid admin API key", status_code=401)
+
+
+def tenant_resolver_from_env() -> TenantResolver:
+    """Build a TenantResolver from TENANT_API_KEYS ("tenant:key,..."), TENANT_HEADER_ENABLED and ADMIN_API_KEY"""
+    api_keys = {}
+    for entry in os.environ.get('TENANT_API_KEYS', '').split(','):
+        tenant_id, _, api_key = entry.strip().partition(':')
+        if tenant_id and api_key:
+            api_keys[api_key] = tenant_id
+        elif entry.strip():
+            logger.warning("Ignoring malformed TENANT_API_KEYS entry")
+    return TenantResolver(
+        api_keys=api_keys,
+        allow_header=os.environ.get('TENANT_HEADER_ENABLED', 'false').lower() == 'true',
+        admin_api_key=os.environ.get('ADMIN_API_KEY') or None,
+    )
+
+
+# Global tenant resolver instance
+tenant_resolver = tenant_resolver_from_env()
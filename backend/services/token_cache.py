@@ -0,0 +1,63 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def token_fingerprint(token: str) -> str:
+    """Stable, non-reversible key for an API token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenValidationCache:
+    """TTL cache of API token validation results.
+
+    Results are keyed by token fingerprint so plaintext tokens are never held
+    as cache keys. Valid and invalid results use separate TTLs, and concurrent
+    validations of the same token share a single in-flight call.
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._results: Dict[str, Tuple[bool, float]] = {}
+        self._in_flight = SingleFlight()
+
+    async def validate(self, token: str, validator: Callable[[], Awaitable[bool]]) -> bool:
+        """Return the cached result for `token`, calling `validator` on a miss"""
+        key = token_fingerprint(token)
+
+        cached = self._results.get(key)
+        if cached is not None:
+            valid, expires_at = cached
+            if time.monotonic() < expires_at:
+                return valid
+            del self._results[key]
+
+        async def validate_and_cache() -> bool:
+            valid = await validator()
+            ttl = self.ttl if valid else self.negative_ttl
+            self._results[key] = (valid, time.monotonic() + ttl)
+            return valid
+
+        return await self._in_flight.do(key, validate_and_cache)
+
+    def invalidate(self, token: str):
+        """Drop the cached result for a single token"""
+        self._results.pop(token_fingerprint(token), None)
+
+    def clear(self):
+        """Drop every cached result"""
+        self._results.clear()
+
+
+# Global token validation cache instance
+token_validation_cache = TokenValidationCache(
+    ttl=float(os.environ.get('TOKEN_VALIDATION_TTL', '300')),
+    negative_ttl=float(os.environ.get('TOKEN_VALIDATION_NEGATIVE_TTL', '30')),
+)
@@ -1,12 +1,60 @@
-import aiohttp
 import asyncio
-import json
 import logging
-from typing import Optional, Dict, Any, List
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from services.http_client import http_client
+from services.token_cache import token_validation_cache, token_fingerprint
+from services.rate_limit import rate_limits, backoff_delay
+from services.single_flight import SingleFlight
+from services.metrics import metrics, instrument
+
 logger = logging.getLogger(__name__)
 
+# API endpoint and mode: "simulated" answers locally, "live" calls VERCEL_API_BASE_URL
+# (the real API or the local stand-in in tools/fake_vercel.py)
+VERCEL_API_BASE_URL = os.environ.get('VERCEL_API_BASE_URL', 'https://api.vercel.com')
+VERCEL_API_MODE = os.environ.get('VERCEL_API_MODE', 'simulated')
+
+# Shared secret Vercel signs deployment webhooks with; webhooks are disabled when unset
+VERCEL_WEBHOOK_SECRET = os.environ.get('VERCEL_WEBHOOK_SECRET', '')
+
+# Retry policy for 429 and 5xx responses
+VERCEL_MAX_RETRIES = int(os.environ.get('VERCEL_MAX_RETRIES', '3'))
+VERCEL_RETRY_BASE_DELAY = float(os.environ.get('VERCEL_RETRY_BASE_DELAY', '0.5'))
+VERCEL_RETRY_MAX_DELAY = float(os.environ.get('VERCEL_RETRY_MAX_DELAY', '10'))
+
+# Call latency per VercelService method and HTTP status codes per method, exported on /metrics
+vercel_call_duration = metrics.histogram(
+    "vercel_call_duration_seconds",
+    "Latency of VercelService calls",
+    ("method",)
+)
+vercel_call_errors = metrics.counter(
+    "vercel_call_errors_total",
+    "VercelService calls that raised",
+    ("method",)
+)
+vercel_responses = metrics.counter(
+    "vercel_api_responses_total",
+    "Vercel API responses by VercelService method and status code",
+    ("method", "status")
+)
+_timed = instrument(vercel_call_duration, vercel_call_errors)
+
+# Concurrent status checks for the same deployment share one request
+_status_requests = SingleFlight()
+
+class VercelRateLimitError(Exception):
+    """Raised when Vercel keeps answering 429 after retries are exhausted"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("FUNCTION_THROTTLED: Vercel API rate limit exceeded")
+        self.retry_after = retry_after
+
 # Vercel error code mapping
 VERCEL_ERROR_CODES = {
     'BODY_NOT_A_STRING_FROM_FUNCTION': 'Function returned invalid response format',
@@ -46,7 +94,7 @@ VERCEL_ERROR_CODES = {
 class VercelService:
     def __init__(self, api_token: str):
         self.api_token = api_token
-        self.base_url = "https://api.vercel.com"
+        self.base_url = VERCEL_API_BASE_URL
         self.headers = {
             "Authorization": f"Bearer {api_token}",
             "Content-Type": "application/json"
@@ -60,6 +108,32 @@ class VercelService:
             return f"{friendly_message}: {error_message}"
         return friendly_message
     
+    def _error_from_payload(self, status: int, payload: Any) -> str:
+        """Build an error message from a Vercel error response body"""
+        error = (payload or {}).get("error", {}) if isinstance(payload, dict) else {}
+        code = error.get("code", f"HTTP_{status}")
+        return f"{code.upper()}: {error.get('message', 'Vercel API request failed')}"
+    
+    def _deployment_from_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize a Vercel deployment object to the shape used by this service"""
+        url = payload.get("url")
+        if url and not url.startswith("http"):
+            url = f"https://{url}"
+        deployment = {
+            "id": payload["id"],
+            "url": url,
+            "status": payload.get("readyState") or payload.get("status") or "QUEUED",
+            "createdAt": payload.get("createdAt")
+        }
+        if deployment["status"] == "ERROR":
+            code = payload.get("errorCode") or "FUNCTION_INVOCATION_FAILED"
+            deployment["error"] = {
+                "code": code,
+                "message": self._handle_vercel_error(code, payload.get("errorMessage"))
+            }
+        return deployment
+    
+    @_timed
     async def create_deployment(self, project_name: str, emergent_url: str, framework: str = "react") -> Dict[str, Any]:
         """Create a new deployment on Vercel"""
         try:
@@ -80,6 +154,12 @@ class VercelService:
                 }
             }
             
+            if VERCEL_API_MODE == "live":
+                status, payload = await self._request("POST", "/v13/deployments", "create_deployment", json=deployment_data)
+                if status >= 400:
+                    raise Exception(self._error_from_payload(status, payload))
+                return self._deployment_from_payload(payload)
+            
             # Simulate deployment creation with better error handling
             deployment_id = f"dpl_{project_name.lower().replace(' ', '_').replace('-', '_')}_{int(datetime.now().timestamp())}"
             
@@ -113,54 +193,73 @@ class VercelService:
             logger.error(f"Error creating Vercel deployment: {error_message}")
             raise Exception(f"Failed to create deployment: {error_message}")
     
+    @_timed
     async def get_deployment_status(self, deployment_id: str) -> Dict[str, Any]:
-        """Get deployment status from Vercel with proper error handling"""
-        try:
-            # In a real implementation: GET /v13/deployments/{deployment_id}
-            # For now, simulate status checking with error handling
-            
-            # Simulate different statuses based on deployment ID patterns
-            if "fail" in deployment_id or deployment_id.endswith("1"):
-                # Simulate a failed deployment
+        """Get deployment status from Vercel, coalescing concurrent identical checks"""
+        return await _status_requests.do(
+            (token_fingerprint(self.api_token), deployment_id),
+            lambda: self._get_deployment_status(deployment_id)
+        )
+    
+    async def _get_deployment_status(self, deployment_id: str) -> Dict[str, Any]:
+        """Fetch a deployment's status.
+        
+        Only a 404 is reported as a failed, not-found deployment. Throttling,
+        connection errors and other error responses raise, so the poller
+        retries them instead of failing the deployment on a transient outage.
+        """
+        if VERCEL_API_MODE == "live":
+            status, payload = await self._request("GET", f"/v13/deployments/{deployment_id}", "get_deployment_status")
+            if status == 404:
                 return {
                     "id": deployment_id,
                     "status": "ERROR",
                     "url": None,
                     "error": {
-                        "code": "FUNCTION_INVOCATION_FAILED",
-                        "message": self._handle_vercel_error("FUNCTION_INVOCATION_FAILED")
+                        "code": "DEPLOYMENT_NOT_FOUND",
+                        "message": self._handle_vercel_error("DEPLOYMENT_NOT_FOUND")
                     }
                 }
-            elif "building" in deployment_id or deployment_id.endswith("0"):
-                return {
-                    "id": deployment_id,
-                    "status": "BUILDING",
-                    "url": None
-                }
-            else:
-                return {
-                    "id": deployment_id,
-                    "status": "READY",
-                    "url": f"https://deployment-{deployment_id[-8:]}.vercel.app"
-                }
-                
-        except Exception as e:
-            logger.error(f"Error getting deployment status: {str(e)}")
-            # Return error status instead of raising exception
+            if status >= 400:
+                raise Exception(self._error_from_payload(status, payload))
+            return self._deployment_from_payload(payload)
+        
+        # Simulated mode: derive the status from the deployment ID
+        # Simulate different statuses based on deployment ID patterns
+        if "fail" in deployment_id or deployment_id.endswith("1"):
+            # Simulate a failed deployment
             return {
                 "id": deployment_id,
                 "status": "ERROR",
                 "url": None,
                 "error": {
-                    "code": "DEPLOYMENT_NOT_FOUND",
-                    "message": self._handle_vercel_error("DEPLOYMENT_NOT_FOUND")
+                    "code": "FUNCTION_INVOCATION_FAILED",
+                    "message": self._handle_vercel_error("FUNCTION_INVOCATION_FAILED")
                 }
             }
+        elif "building" in deployment_id or deployment_id.endswith("0"):
+            return {
+                "id": deployment_id,
+                "status": "BUILDING",
+                "url": None
+            }
+        else:
+            return {
+                "id": deployment_id,
+                "status": "READY",
+                "url": f"https://deployment-{deployment_id[-8:]}.vercel.app"
+            }
     
+    @_timed
     async def list_deployments(self, limit: int = 20) -> List[Dict[str, Any]]:
         """List deployments from Vercel with error handling"""
         try:
-            # In production: GET /v13/deployments
+            if VERCEL_API_MODE == "live":
+                status, payload = await self._request("GET", "/v6/deployments", "list_deployments", params={"limit": limit})
+                if status >= 400:
+                    raise Exception(self._error_from_payload(status, payload))
+                return [self._deployment_from_payload(deployment) for deployment in payload.get("deployments", [])]
+            
             return [
                 {
                     "id": f"dpl_example_{i}",
@@ -175,18 +274,142 @@ class VercelService:
             logger.error(f"Error listing deployments: {str(e)}")
             return []  # Return empty list instead of raising exception
 
-    async def validate_api_token(self) -> bool:
-        """Validate the Vercel API token"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/v2/user",
-                    headers=self.headers
-                ) as response:
-                    return response.status == 200
-        except Exception as e:
-            logger.error(f"Error validating Vercel API token: {str(e)}")
+    async def _request(self, method: str, path: str, operation: str, **kwargs) -> Tuple[int, Any]:
+        """Call the Vercel API over the shared connection pool, returning (status, payload).
+        
+        Requests pass through the per-token bucket, which follows the
+        X-RateLimit-* headers. 429 and 5xx responses and connection errors are
+        retried with jittered backoff while the shared retry budget allows.
+        Every response is counted under `operation` by status code.
+        """
+        # Imported on first use so `import server` stays cheap; token validation
+        # calls out even in simulated mode, so any worker may end up loading it
+        import aiohttp
+
+        bucket = rate_limits.bucket_for(self.api_token)
+        retry_budget = rate_limits.retry_budget
+        retry_budget.deposit()
+        
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            retry_after = None
+            try:
+                session = await http_client.get_session()
+                async with session.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs) as response:
+                    bucket.update_from_headers(response.headers)
+                    status = response.status
+                    vercel_responses.labels(operation, status).inc()
+                    if status != 429 and status < 500:
+                        payload = None
+                        if response.content_type == "application/json":
+                            payload = await response.json()
+                        return status, payload
+                    
+                    if response.headers.get("Retry-After"):
+                        try:
+                            retry_after = float(response.headers["Retry-After"])
+                        except ValueError:
+                            retry_after = None
+                    if status == 429:
+                        bucket.block_for(retry_after or 0)
+                    error = f"HTTP {status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                vercel_responses.labels(operation, "error").inc()
+                error = str(e) or e.__class__.__name__
+            
+            if attempt >= VERCEL_MAX_RETRIES or not retry_budget.try_withdraw():
+                if status == 429:
+                    raise VercelRateLimitError(retry_after)
+                if status is None:
+                    raise Exception(f"Vercel API request failed: {error}")
+                return status, None
+            
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, VERCEL_RETRY_BASE_DELAY, VERCEL_RETRY_MAX_DELAY)
+            logger.warning(f"Retrying Vercel {method} {path} after {error} (attempt {attempt + 1}, waiting {delay:.2f}s)")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @_timed
+    async def validate_api_token(self, use_cache: bool = True) -> bool:
+        """Validate the Vercel API token, reusing recent results when cached"""
+        if use_cache:
+            return await token_validation_cache.validate(self.api_token, self._validate_api_token_uncached)
+        return await self._validate_api_token_uncached()
+
+    async def _validate_api_token_uncached(self) -> bool:
+        """True for a valid token, False when Vercel rejects it (401/403).
+        
+        Anything else (throttling, 5xx, connection errors) says nothing about
+        the token and raises, so no negative result gets cached for it.
+        """
+        status, payload = await self._request("GET", "/v2/user", "validate_api_token")
+        if status == 200:
+            return True
+        if status in (401, 403):
             return False
+        error = self._error_from_payload(status, payload)
+        logger.error(f"Error validating Vercel API token: {error}")
+        raise Exception(f"Could not validate Vercel API token: {error}")
+
+class VercelServiceCache:
+    """LRU cache of ready-to-use VercelService clients, one per tenant.
+
+    An entry is reused while the tenant's token is unchanged. Entries beyond
+    `max_size` and entries idle for longer than `idle_ttl` seconds are evicted.
+    Entries are kept in last-use order, so eviction only looks at the front.
+    """
+
+    def __init__(self, max_size: int = 256, idle_ttl: float = 900.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, tenant_id: str, api_token: str) -> VercelService:
+        now = time.monotonic()
+        fingerprint = token_fingerprint(api_token)
+        entry = self._entries.get(tenant_id)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            service = entry[1]
+        else:
+            self.misses += 1
+            service = VercelService(api_token)
+        self._entries[tenant_id] = (fingerprint, service, now)
+        self._entries.move_to_end(tenant_id)
+        self._evict(now)
+        return service
+
+    def _evict(self, now: float):
+        while self._entries:
+            tenant_id, (_, _, last_used) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and now - last_used < self.idle_ttl:
+                break
+            del self._entries[tenant_id]
+            self.evictions += 1
+
+    def invalidate(self, tenant_id: str):
+        self._entries.pop(tenant_id, None)
+
+    def stats(self) -> dict:
+        self._evict(time.monotonic())
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# Global per-tenant VercelService cache
+vercel_services = VercelServiceCache(
+    max_size=int(os.environ.get('VERCEL_CLIENT_CACHE_SIZE', '256')),
+    idle_ttl=float(os.environ.get('VERCEL_CLIENT_IDLE_TTL', '900')),
+)
 
 # Utility functions
 def status_vercel_to_internal(vercel_status: str) -> str:
@@ -206,7 +429,11 @@ def calculate_deploy_time(created_at: datetime, completed_at: Optional[datetime]
         completed_at = datetime.utcnow()
     
     diff = completed_at - created_at
-    seconds = int(diff.total_seconds())
+    return format_duration(diff.total_seconds())
+
+def format_duration(total_seconds: float) -> str:
+    """Format a duration in seconds, e.g. 42s or 3m 5s"""
+    seconds = int(total_seconds)
     
     if seconds < 60:
         return f"{seconds}s"
@@ -0,0 +1,143 @@
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import database as db
+from services.metrics import metrics
+from services.status_poller import status_poller
+from services.tenancy import DEFAULT_TENANT
+from services.vercel_service import VERCEL_WEBHOOK_SECRET, status_vercel_to_internal
+
+logger = logging.getLogger(__name__)
+
+vercel_webhook_events = metrics.counter(
+    "vercel_webhook_events_total",
+    "Vercel webhook deliveries by event type and result",
+    ("event", "result")
+)
+
+# Deployment event types and the Vercel state each one reports. Legacy
+# hyphenated names (deployment-ready) are normalized to dotted ones first.
+EVENT_STATES = {
+    "deployment.created": "BUILDING",
+    "deployment.ready": "READY",
+    "deployment.succeeded": "READY",
+    "deployment.error": "ERROR",
+    "deployment.canceled": "CANCELED",
+}
+
+
+class WebhookError(Exception):
+    """Raised when a webhook delivery must be rejected"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sign_payload(secret: str, body: bytes) -> str:
+    """Hex HMAC-SHA1 of the raw request body, as sent in x-vercel-signature"""
+    return hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), signature.strip().lower())
+
+
+def parse_event(body: bytes) -> Tuple[str, Optional[str], dict]:
+    """Return (event type, Vercel deployment id, deployment payload) from a webhook body"""
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise WebhookError("Webhook body is not valid JSON")
+    if not isinstance(event, dict):
+        raise WebhookError("Webhook body must be a JSON object")
+
+    event_type = str(event.get("type", "")).replace("-", ".")
+    payload = event.get("payload") or {}
+    deployment = payload.get("deployment") or {}
+    return event_type, deployment.get("id") or payload.get("deploymentId"), {**payload, **deployment}
+
+
+class VercelWebhookHandler:
+    """Applies signed Vercel deployment events to deployments.
+
+    Events are matched to deployments by their Vercel deployment id (indexed,
+    across tenants). A created event only pushes the fallback poll back;
+    ready, error and canceled events record the final status through the
+    status poller as a compare-and-set on the deployment's version and drop
+    its monitoring job. Deliveries for unknown deployments or already
+    finished ones are acknowledged and ignored, so Vercel's retries are harmless.
+    """
+
+    def __init__(self, secret: str = ""):
+        self.secret = secret
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret)
+
+    async def handle(self, body: bytes, signature: Optional[str]) -> dict:
+        if not self.enabled:
+            raise WebhookError("Vercel webhooks are not configured", status_code=503)
+        if not verify_signature(self.secret, body, signature):
+            vercel_webhook_events.labels("unknown", "rejected").inc()
+            raise WebhookError("Invalid webhook signature", status_code=401)
+
+        event_type, vercel_deployment_id, payload = parse_event(body)
+        result = await self._apply(event_type, vercel_deployment_id, payload)
+        vercel_webhook_events.labels(event_type if event_type in EVENT_STATES else "other", result).inc()
+        return {"status": result}
+
+    async def _apply(self, event_type: str, vercel_deployment_id: Optional[str], payload: dict) -> str:
+        vercel_state = EVENT_STATES.get(event_type)
+        if vercel_state is None or not vercel_deployment_id:
+            return "ignored"
+
+        deployment = await db.get_deployment_by_vercel_id(vercel_deployment_id)
+        if deployment is None:
+            return "ignored"
+
+        deployment_id = deployment["id"]
+        status = status_vercel_to_internal(vercel_state)
+        if status == "building":
+            # The deployment is alive; the fallback poll can wait again
+            if status_poller.webhook_fallback_delay:
+                await db.postpone_monitor_job(
+                    deployment_id,
+                    datetime.utcnow() + timedelta(seconds=status_poller.webhook_fallback_delay)
+                )
+            return "applied"
+
+        vercel_url = payload.get("url")
+        if vercel_url and not vercel_url.startswith("http"):
+            vercel_url = f"https://{vercel_url}"
+        error = None
+        if status == "failed":
+            error = payload.get("errorMessage") or (
+                "Deployment canceled on Vercel" if vercel_state == "CANCELED" else "Deployment failed on Vercel"
+            )
+        applied = await status_poller.finish(
+            deployment_id,
+            deployment.get("tenantId", DEFAULT_TENANT),
+            deployment.get("createdAt") or datetime.utcnow(),
+            status,
+            vercel_url=vercel_url,
+            error=error,
+            current=deployment
+        )
+        if not applied:
+            # Already final (an earlier delivery or a fallback poll got there first)
+            return "duplicate"
+        await db.delete_monitor_job(deployment_id)
+        logger.info(f"Deployment {deployment_id} marked {status} from Vercel webhook")
+        return "applied"
+
+
+# Global webhook handler instance
+vercel_webhooks = VercelWebhookHandler(secret=VERCEL_WEBHOOK_SECRET)
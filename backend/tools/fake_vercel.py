@@ -0,0 +1,281 @@
+"""Local stand-in for the Vercel REST API, for load tests and end-to-end runs.
+
+Serves the endpoints VercelService uses in live mode:
+
+    POST /v13/deployments           create a deployment
+    GET  /v13/deployments/{id}      deployment status
+    GET  /v6/deployments            list deployments
+    GET  /v2/user                   token validation
+
+Deployments move QUEUED -> BUILDING -> READY (or ERROR) over `build_seconds`.
+Latency, error rate and a fixed-window rate limit are configurable, and the
+server answers with X-RateLimit-* headers and 429s like the real API.
+
+With a webhook URL configured, deployment events (deployment.created, then
+deployment.succeeded or deployment.error once the build ends) are POSTed
+there signed with the webhook secret, like Vercel's deployment webhooks.
+WebhookEmitter can also be used on its own to send hand-made events.
+
+Run it standalone and point the backend at it:
+
+    python -m tools.fake_vercel --port 8765 --latency-ms 40 --rate-limit 100
+    VERCEL_API_MODE=live VERCEL_API_BASE_URL=http://127.0.0.1:8765 uvicorn server:app
+
+    python -m tools.fake_vercel --webhook-url http://127.0.0.1:8001/api/webhooks/vercel --webhook-secret s3cret
+    VERCEL_WEBHOOK_SECRET=s3cret VERCEL_API_MODE=live ... uvicorn server:app --port 8001
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+
+
+class FakeVercelConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        build_seconds: float = 5.0,
+        rate_limit: int = 0,
+        rate_window_seconds: float = 60.0,
+        valid_tokens: Optional[set] = None,
+        webhook_url: Optional[str] = None,
+        webhook_secret: str = "",
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        # Share of requests answered with a 500
+        self.error_rate = error_rate
+        # Share of deployments that end in ERROR
+        self.failure_rate = failure_rate
+        self.build_seconds = build_seconds
+        # Requests allowed per token per window; 0 disables rate limiting
+        self.rate_limit = rate_limit
+        self.rate_window_seconds = rate_window_seconds
+        # None accepts any bearer token
+        self.valid_tokens = valid_tokens
+        # Where deployment events are delivered; None sends none
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+
+
+class WebhookEmitter:
+    """Sends Vercel-style deployment webhook events signed with HMAC-SHA1"""
+
+    def __init__(self, url: str, secret: str):
+        self.url = url
+        self.secret = secret
+        self.sent = 0
+        self.failed = 0
+
+    def signed(self, event_type: str, deployment: dict) -> Tuple[bytes, Dict[str, str]]:
+        """Build the body and headers of an event for `deployment` (a Vercel deployment view)"""
+        body = json.dumps({
+            "id": f"evt_{uuid.uuid4().hex[:24]}",
+            "type": event_type,
+            "createdAt": int(time.time() * 1000),
+            "payload": {"deployment": deployment},
+        }).encode()
+        signature = hmac.new(self.secret.encode(), body, hashlib.sha1).hexdigest()
+        return body, {"Content-Type": "application/json", "x-vercel-signature": signature}
+
+    async def emit(self, event_type: str, deployment: dict) -> Optional[int]:
+        """Deliver one event; returns the receiver's status code, or None if unreachable"""
+        body, headers = self.signed(event_type, deployment)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(self.url, data=body, headers=headers) as response:
+                    self.sent += 1
+                    return response.status
+        except aiohttp.ClientError:
+            self.failed += 1
+            return None
+
+
+class FakeVercel:
+    """In-memory Vercel API state plus the aiohttp application serving it"""
+
+    def __init__(self, config: Optional[FakeVercelConfig] = None):
+        self.config = config or FakeVercelConfig()
+        self.deployments: Dict[str, dict] = {}
+        self.requests = 0
+        self.throttled = 0
+        self._windows: Dict[str, list] = {}
+        self.webhooks = (
+            WebhookEmitter(self.config.webhook_url, self.config.webhook_secret)
+            if self.config.webhook_url else None
+        )
+        self._webhook_tasks: Set[asyncio.Task] = set()
+
+    def _token(self, request: web.Request) -> Optional[str]:
+        authorization = request.headers.get("Authorization", "")
+        return authorization[7:] if authorization.startswith("Bearer ") else None
+
+    def _rate_limit_headers(self, token: str) -> Dict[str, str]:
+        if not self.config.rate_limit:
+            return {}
+        now = time.time()
+        window = self._windows.get(token)
+        if window is None or now >= window[0]:
+            window = self._windows[token] = [now + self.config.rate_window_seconds, 0]
+        window[1] += 1
+        remaining = self.config.rate_limit - window[1]
+        return {
+            "X-RateLimit-Limit": str(self.config.rate_limit),
+            "X-RateLimit-Remaining": str(max(remaining, 0)),
+            "X-RateLimit-Reset": str(int(window[0])),
+            **({"Retry-After": str(max(int(window[0] - now), 1))} if remaining < 0 else {}),
+        }
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if self.config.latency_ms or self.config.latency_jitter_ms:
+            delay = self.config.latency_ms + random.uniform(-1, 1) * self.config.latency_jitter_ms
+            await asyncio.sleep(max(delay, 0) / 1000)
+
+        token = self._token(request)
+        if token is None or (self.config.valid_tokens is not None and token not in self.config.valid_tokens):
+            return web.json_response({"error": {"code": "forbidden", "message": "Not authorized"}}, status=403)
+
+        headers = self._rate_limit_headers(token)
+        if headers.get("Retry-After"):
+            self.throttled += 1
+            return web.json_response(
+                {"error": {"code": "rate_limited", "message": "Rate limit exceeded"}},
+                status=429,
+                headers=headers
+            )
+
+        if random.random() < self.config.error_rate:
+            return web.json_response({"error": {"code": "internal_server_error", "message": "Injected error"}}, status=500, headers=headers)
+
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def _view(self, deployment: dict) -> dict:
+        elapsed = time.time() - deployment["createdAtSeconds"]
+        if elapsed < self.config.build_seconds * 0.1:
+            ready_state = "QUEUED"
+        elif elapsed < self.config.build_seconds:
+            ready_state = "BUILDING"
+        else:
+            ready_state = "ERROR" if deployment["fails"] else "READY"
+
+        view = {
+            "id": deployment["id"],
+            "name": deployment["name"],
+            "url": deployment["url"],
+            "readyState": ready_state,
+            "createdAt": int(deployment["createdAtSeconds"] * 1000),
+        }
+        if ready_state == "ERROR":
+            view["errorCode"] = "FUNCTION_INVOCATION_FAILED"
+            view["errorMessage"] = "Build failed"
+        return view
+
+    async def create_deployment(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        name = body.get("name") or "project"
+        deployment_id = f"dpl_{uuid.uuid4().hex[:24]}"
+        deployment = {
+            "id": deployment_id,
+            "name": name,
+            "url": f"{name}-{deployment_id[-8:]}.vercel.app",
+            "createdAtSeconds": time.time(),
+            "fails": random.random() < self.config.failure_rate,
+        }
+        self.deployments[deployment_id] = deployment
+        if self.webhooks is not None:
+            task = asyncio.get_running_loop().create_task(self._emit_lifecycle(deployment))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+        return web.json_response(self._view(deployment))
+
+    async def _emit_lifecycle(self, deployment: dict):
+        # Give the backend a moment to store the deployment id it was just handed
+        await asyncio.sleep(min(self.config.build_seconds * 0.1, 0.5))
+        await self.webhooks.emit("deployment.created", self._view(deployment))
+        await asyncio.sleep(max(deployment["createdAtSeconds"] + self.config.build_seconds - time.time(), 0))
+        view = self._view(deployment)
+        await self.webhooks.emit("deployment.error" if view["readyState"] == "ERROR" else "deployment.succeeded", view)
+
+    async def get_deployment(self, request: web.Request) -> web.Response:
+        deployment = self.deployments.get(request.match_info["deployment_id"])
+        if deployment is None:
+            return web.json_response({"error": {"code": "not_found", "message": "Deployment not found"}}, status=404)
+        return web.json_response(self._view(deployment))
+
+    async def list_deployments(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get("limit", "20"))
+        deployments = sorted(self.deployments.values(), key=lambda d: d["createdAtSeconds"], reverse=True)[:limit]
+        return web.json_response({"deployments": [self._view(d) for d in deployments]})
+
+    async def get_user(self, request: web.Request) -> web.Response:
+        return web.json_response({"user": {"id": "fake_user", "username": "fake"}})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_post("/v13/deployments", self.create_deployment)
+        app.router.add_get("/v13/deployments/{deployment_id}", self.get_deployment)
+        app.router.add_get("/v6/deployments", self.list_deployments)
+        app.router.add_get("/v2/user", self.get_user)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the running event loop; returns the base URL"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        for task in list(self._webhook_tasks):
+            task.cancel()
+        await self._runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Vercel API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--build-seconds", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--rate-window-seconds", type=float, default=60.0)
+    parser.add_argument("--webhook-url", help="deliver signed deployment events here")
+    parser.add_argument("--webhook-secret", default="")
+    args = parser.parse_args()
+
+    fake = FakeVercel(FakeVercelConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        failure_rate=args.failure_rate,
+        build_seconds=args.build_seconds,
+        rate_limit=args.rate_limit,
+        rate_window_seconds=args.rate_window_seconds,
+        webhook_url=args.webhook_url,
+        webhook_secret=args.webhook_secret,
+    ))
+    web.run_app(fake.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Startup budget report for the backend: import time, memory and heavy modules.
+
+Runs `import server` in fresh interpreters (so nothing is already cached in
+sys.modules) and reports:
+
+    import_seconds   wall time of `import server`, best of --runs
+    rss_mb           resident memory after the import
+    startup_rss_mb   resident memory after the app lifespan has started
+                     (with --startup; Mongo may be unreachable, warmup just fails fast)
+    top modules      largest cumulative and self import times from -X importtime
+    heavy modules    optional subsystems that should load lazily but did
+
+Run from the backend directory:
+
+    python -m tools.import_report --top 25
+    python -m tools.import_report --startup --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Packages that must not be imported by `import server`: they are either
+# loaded on first use (aiohttp, Fernet) or are not backend dependencies at all
+LAZY_MODULES = (
+    "aiohttp",
+    "cryptography.fernet",
+    "pandas",
+    "numpy",
+    "boto3",
+    "botocore",
+    "requests",
+    "jose",
+    "passlib",
+)
+
+_PROBE = """
+import asyncio, json, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+started = time.perf_counter()
+import server
+result = {"import_seconds": time.perf_counter() - started, "rss_mb": rss_mb()}
+result["loaded"] = [name for name in LAZY_MODULES if name in sys.modules]
+
+if STARTUP:
+    async def start_and_stop():
+        async with server.lifespan(server.app):
+            result["startup_rss_mb"] = rss_mb()
+    asyncio.run(start_and_stop())
+
+print("__REPORT__" + json.dumps(result))
+"""
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Keep --startup quick and self-contained when no Mongo is reachable
+    env.setdefault("MONGO_SERVER_SELECTION_TIMEOUT_MS", "200")
+    env.setdefault("MONGO_CONNECT_TIMEOUT_MS", "200")
+    return env
+
+
+def probe(startup: bool = False, importtime: bool = False) -> dict:
+    """Import the server in a fresh interpreter and return its measurements"""
+    code = f"LAZY_MODULES = {LAZY_MODULES!r}\nSTARTUP = {startup!r}\n{_PROBE}"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    completed = subprocess.run(
+        command, cwd=BACKEND_DIR, env=_child_env(), capture_output=True, text=True, timeout=120
+    )
+    report = next((line for line in completed.stdout.splitlines() if line.startswith("__REPORT__")), None)
+    if completed.returncode != 0 or report is None:
+        raise RuntimeError(f"Startup probe failed:\n{completed.stderr[-4000:]}")
+
+    result = json.loads(report[len("__REPORT__"):])
+    if importtime:
+        result["modules"] = parse_importtime(completed.stderr)
+    return result
+
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Parse `-X importtime` output into {module, self_ms, cumulative_ms, depth} rows"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return modules
+
+
+def measure(runs: int = 3, startup: bool = False) -> dict:
+    """Best-of-`runs` import time and memory across fresh interpreters"""
+    samples = [probe(startup=startup) for _ in range(max(runs, 1))]
+    best = min(samples, key=lambda sample: sample["import_seconds"])
+    result = {
+        "import_seconds": round(best["import_seconds"], 4),
+        "rss_mb": round(min(sample["rss_mb"] for sample in samples), 1),
+        "loaded_lazy_modules": sorted({name for sample in samples for name in sample["loaded"]}),
+    }
+    if startup:
+        result["startup_rss_mb"] = round(min(sample["startup_rss_mb"] for sample in samples), 1)
+    return result
+
+
+def print_report(result: dict, modules: List[dict], top: int):
+    print(f"import server: {result['import_seconds'] * 1000:.0f} ms, RSS {result['rss_mb']} MiB", end="")
+    if "startup_rss_mb" in result:
+        print(f", RSS after startup {result['startup_rss_mb']} MiB", end="")
+    print(f", {len(modules)} modules imported")
+
+    # Only top-level imports of each package, so nested modules aren't double counted
+    packages: Dict[str, float] = {}
+    for row in modules:
+        root = row["module"].split(".")[0]
+        packages[root] = max(packages.get(root, 0.0), row["cumulative_ms"])
+
+    print(f"\n{'package':<32}{'cumulative ms':>14}")
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<32}{cumulative:>14.1f}")
+
+    print(f"\n{'module':<48}{'self ms':>10}")
+    for row in sorted(modules, key=lambda row: -row["self_ms"])[:top]:
+        print(f"{row['module']:<48}{row['self_ms']:>10.1f}")
+
+    if result["loaded_lazy_modules"]:
+        print(f"\nLoaded at import but expected lazily: {', '.join(result['loaded_lazy_modules'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend import time and memory report")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to take the best timing from")
+    parser.add_argument("--top", type=int, default=20, help="rows per table")
+    parser.add_argument("--startup", action="store_true", help="also run the app lifespan and measure RSS after it")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = measure(runs=args.runs, startup=args.startup)
+    modules = probe(importtime=True)["modules"]
+    if args.json:
+        print(json.dumps({**result, "modules": modules}, indent=2))
+    else:
+        print_report(result, modules, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,8 +12,27 @@ document.addEventListener('DOMContentLoaded', async () => {
 
   // Set up event listeners
   document.getElementById('deploy-btn').addEventListener('click', handleDeploy);
+
+  // Refresh when the backend pushes deployment or activity updates
+  subscribeToEvents();
 });
 
+// Subscribe to server-sent deployment events instead of polling
+function subscribeToEvents() {
+  const events = new EventSource(`${API_BASE}/events`);
+  let refreshTimer = null;
+
+  const scheduleRefresh = () => {
+    // Coalesce bursts of events into a single refresh
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(loadDashboardData, 500);
+  };
+
+  events.addEventListener('deployment', scheduleRefresh);
+  events.addEventListener('activity', scheduleRefresh);
+  window.addEventListener('unload', () => events.close());
+}
+
 // Load dashboard data
 async function loadDashboardData() {
   const loading = document.getElementById('loading');
@@ -25,18 +44,14 @@ async function loadDashboardData() {
     mainContent.style.display = 'none';
     errorDiv.style.display = 'none';
 
-    // Fetch stats and recent deployments
-    const [statsResponse, deploymentsResponse] = await Promise.all([
-      fetch(`${API_BASE}/stats`),
-      fetch(`${API_BASE}/deployments?limit=3`)
-    ]);
+    // Fetch stats and recent deployments in one round trip
+    const response = await fetch(`${API_BASE}/dashboard?include=stats,deployments&deployments_limit=3`);
 
-    if (!statsResponse.ok || !deploymentsResponse.ok) {
+    if (!response.ok) {
       throw new Error('Failed to fetch data');
     }
 
-    const stats = await statsResponse.json();
-    const deployments = await deploymentsResponse.json();
+    const { stats, deployments } = await response.json();
 
     // Update stats
     document.getElementById('total-deployments').textContent = stats.totalDeployments;
@@ -23,15 +23,11 @@ const Dashboard = () => {
   useEffect(() => {
     const loadDashboardData = async () => {
       try {
-        const [statsData, activityData, deploymentsData] = await Promise.all([
-          api.stats.get(),
-          api.activity.get(),
-          api.deployments.list()
-        ]);
+        const dashboard = await api.dashboard.get();
         
-        setStats(statsData);
-        setRecentActivity(activityData.slice(0, 5));
-        setRecentDeployments(deploymentsData.slice(0, 3));
+        setStats(dashboard.stats);
+        setRecentActivity(dashboard.activity);
+        setRecentDeployments(dashboard.deployments);
       } catch (error) {
         console.error('Failed to load dashboard data:', error);
       } finally {
@@ -40,6 +36,18 @@ const Dashboard = () => {
     };
 
     loadDashboardData();
+
+    // Reload when the backend pushes deployment or activity updates
+    let refreshTimer = null;
+    const unsubscribe = api.events.subscribe(() => {
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(loadDashboardData, 500);
+    });
+
+    return () => {
+      clearTimeout(refreshTimer);
+      unsubscribe();
+    };
   }, []);
 
   const getStatusIcon = (status) => {
@@ -28,8 +28,8 @@ const Deployments = () => {
     const loadDeployments = async () => {
       try {
         const data = await api.deployments.list();
-        setDeployments(data);
-        setFilteredDeployments(data);
+        setDeployments(data.items);
+        setFilteredDeployments(data.items);
       } catch (error) {
         console.error('Failed to load deployments:', error);
       } finally {
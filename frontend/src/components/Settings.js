@@ -112,7 +112,7 @@ const Settings = () => {
                 type="password"
                 value={settings?.vercelApiToken || ''}
                 onChange={(e) => updateSetting('vercelApiToken', e.target.value)}
-                placeholder="Enter your Vercel API token"
+                placeholder={settings?.hasToken ? "Token saved; enter a new one to replace it" : "Enter your Vercel API token"}
                 className="mt-2"
               />
               <p className="text-sm text-slate-500 mt-2">
@@ -2,9 +2,12 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Selects the tenant; without it the backend serves the default tenant
+const API_KEY = process.env.REACT_APP_API_KEY;
 
 // Configure axios defaults
 axios.defaults.headers.common['Content-Type'] = 'application/json';
+if (API_KEY) axios.defaults.headers.common['X-API-Key'] = API_KEY;
 
 // API service class
 class ApiService {
@@ -20,9 +23,10 @@ class ApiService {
   }
 
   // Deployments endpoints
-  async getDeployments(status = null, limit = 50) {
+  async getDeployments(status = null, limit = 50, cursor = null) {
     const params = { limit };
     if (status) params.status = status;
+    if (cursor) params.cursor = cursor;
     
     const response = await axios.get(`${API}/deployments`, { params });
     return response.data;
@@ -33,17 +37,44 @@ class ApiService {
     return response.data;
   }
 
+  // Dashboard endpoint
+  async getDashboard(include = ['stats', 'deployments', 'activity'], deploymentsLimit = 3, activityLimit = 5) {
+    const params = {
+      include: include.join(','),
+      deployments_limit: deploymentsLimit,
+      activity_limit: activityLimit
+    };
+
+    const response = await axios.get(`${API}/dashboard`, { params });
+    return response.data;
+  }
+
   // Stats and activity endpoints
   async getStats() {
     const response = await axios.get(`${API}/stats`);
     return response.data;
   }
 
-  async getRecentActivity(limit = 10) {
-    const response = await axios.get(`${API}/activity`, { params: { limit } });
+  async getRecentActivity(limit = 10, cursor = null) {
+    const params = { limit };
+    if (cursor) params.cursor = cursor;
+
+    const response = await axios.get(`${API}/activity`, { params });
     return response.data;
   }
 
+  // Server-sent events for deployment status and activity updates
+  subscribeToEvents(onEvent) {
+    // EventSource cannot send headers, so the API key goes in the query string
+    const url = API_KEY ? `${API}/events?apiKey=${encodeURIComponent(API_KEY)}` : `${API}/events`;
+    const source = new EventSource(url);
+    const handler = (event) => onEvent(event.type, JSON.parse(event.data));
+
+    source.addEventListener('deployment', handler);
+    source.addEventListener('activity', handler);
+    return () => source.close();
+  }
+
   // Health check
   async healthCheck() {
     const response = await axios.get(`${API}/`);
@@ -76,12 +107,18 @@ export const api = {
     list: withErrorHandling(apiService.getDeployments.bind(apiService)),
     create: withErrorHandling(apiService.createDeployment.bind(apiService))
   },
+  dashboard: {
+    get: withErrorHandling(apiService.getDashboard.bind(apiService))
+  },
   stats: {
     get: withErrorHandling(apiService.getStats.bind(apiService))
   },
   activity: {
     get: withErrorHandling(apiService.getRecentActivity.bind(apiService))
   },
+  events: {
+    subscribe: apiService.subscribeToEvents.bind(apiService)
+  },
   health: withErrorHandling(apiService.healthCheck.bind(apiService))
 };
 
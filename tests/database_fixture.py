@@ -0,0 +1,57 @@
+"""Throwaway database for tests that exercise backend/database.py end to end.
+
+Uses the MongoDB server at MONGO_URL when one answers, and mongomock-motor
+otherwise, so the write paths are covered without a server. Explain plans
+cannot be emulated; see test_deployment_query_plans.py for those.
+"""
+import os
+import sys
+import unittest
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+_server_reachable = None
+
+
+def _mongo_server_reachable() -> bool:
+    global _server_reachable
+    if _server_reachable is None:
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+
+        client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500, connectTimeoutMS=500)
+        try:
+            client.admin.command("ping")
+            _server_reachable = True
+        except PyMongoError:
+            _server_reachable = False
+        finally:
+            client.close()
+    return _server_reachable
+
+
+def bind_test_database(db_module):
+    """Bind database.py to a fresh database; returns (client, database) for cleanup"""
+    if _mongo_server_reachable():
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(MONGO_URL)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise unittest.SkipTest(f"MongoDB not reachable at {MONGO_URL} and mongomock-motor not installed")
+        client = AsyncMongoMockClient()
+    database = client[f"test_{uuid.uuid4().hex[:12]}"]
+    db_module.bind_database(database)
+    return client, database
+
+
+async def drop_test_database(client, database):
+    await client.drop_database(database.name)
+    client.close()
@@ -0,0 +1,202 @@
+"""Query-shape and explain-plan tests for the deployment list, search and filter queries.
+
+DeploymentQueryShapeTest needs no server. It checks that every query
+deployment_filter_query builds is anchored on the tenant and, for substring
+search, on the trigram index. It also runs the search semantics against
+MongoDB when one is reachable and against mongomock otherwise.
+
+DeploymentQueryPlanTest needs a real MongoDB server, because explain() cannot
+be emulated. It builds the indexes declared in backend/database.py in a
+throwaway database and loads a few hundred deployments. It then asserts that
+the winning plan of every supported query shape, alone, combined and with a
+pagination cursor, is served by an index rather than a collection scan.
+
+    MONGO_URL   default mongodb://localhost:27017; the plan tests skip if unreachable
+"""
+import importlib.util
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+_MISSING = [name for name in ("fastapi", "motor", "dotenv") if importlib.util.find_spec(name) is None]
+
+FRAMEWORKS = ("react", "vue", "nextjs", "svelte")
+STATUSES = ("building", "deployed", "failed")
+NOW = datetime(2026, 1, 1)
+
+# Every filter combination the deployments endpoint supports
+FILTERS = {
+    "none": {},
+    "status": {"statuses": ["failed"]},
+    "status_set": {"statuses": ["building", "failed"]},
+    "framework": {"frameworks": ["vue"]},
+    "framework_set": {"frameworks": ["vue", "react"]},
+    "created_range": {"created_from": NOW - timedelta(days=3), "created_to": NOW - timedelta(days=1)},
+    "prefix": {"search": "project 01", "match": "prefix"},
+    "prefix_short": {"search": "9", "match": "prefix"},
+    "url_prefix": {"search": "https://app-02", "match": "prefix"},
+    "contains": {"search": "12 re"},
+    "contains_missing": {"search": "no such project"},
+    "combined": {
+        "statuses": ["deployed", "failed"],
+        "frameworks": ["react"],
+        "created_from": NOW - timedelta(days=10),
+        "search": "project",
+    },
+}
+
+
+def _mongo_client():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500, connectTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        return None
+    return client
+
+
+def _load_deployments(db, database):
+    deployments = []
+    for index in range(300):
+        project_name = f"Project {index:03d} {FRAMEWORKS[index % 4]}"
+        emergent_url = f"https://app-{index:03d}.emergent.sh"
+        deployments.append({
+            "id": f"deployment-{index:03d}",
+            "tenantId": "tenant-a" if index % 3 else "tenant-b",
+            "projectName": project_name,
+            "emergentUrl": emergent_url,
+            "framework": FRAMEWORKS[index % 4],
+            "status": STATUSES[index % 3],
+            "createdAt": NOW - timedelta(hours=index),
+            "updatedAt": NOW,
+            **db.search_fields(project_name, emergent_url),
+        })
+    database.deployments.insert_many(deployments)
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class DeploymentQueryShapeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import database as db
+
+        cls.db_module = db
+        cls.client = _mongo_client()
+        if cls.client is None:
+            try:
+                import mongomock
+            except ImportError:
+                raise unittest.SkipTest(f"MongoDB not reachable at {MONGO_URL} and mongomock not installed")
+            cls.client = mongomock.MongoClient()
+        cls.database = cls.client[f"query_shapes_{uuid.uuid4().hex[:12]}"]
+        _load_deployments(db, cls.database)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(cls.database.name)
+        cls.client.close()
+
+    def test_filters_are_anchored_on_an_index(self):
+        db = self.db_module
+        for name, options in FILTERS.items():
+            with self.subTest(filter=name):
+                query = db.deployment_filter_query("tenant-a", **options)
+                self.assertEqual(query["tenantId"], "tenant-a")
+                if options.get("search") and options.get("match", "contains") == "contains":
+                    self.assertIn("searchTrigrams", query)
+
+    def test_declared_deployment_shapes_match_the_filter_query(self):
+        db = self.db_module
+        shapes = {name: query for name, _, query, _ in db.QUERY_SHAPES}
+        for name, options in db.DEPLOYMENT_FILTER_SHAPES.items():
+            with self.subTest(shape=name):
+                self.assertEqual(shapes[f"deployments.{name}"], db.deployment_filter_query(db.DEFAULT_TENANT, **options))
+
+    def test_short_substring_search_is_rejected(self):
+        db = self.db_module
+        for term in ("9", "p-", " ab "):
+            with self.subTest(term=term), self.assertRaises(ValueError):
+                db.deployment_filter_query("tenant-a", search=term)
+        self.assertIn("$and", db.deployment_filter_query("tenant-a", search="9", match="prefix"))
+
+    def test_search_matches_prefix_and_substring(self):
+        db = self.db_module
+
+        def ids(**options):
+            query = db.deployment_filter_query("tenant-a", **options)
+            return {document["id"] for document in self.database.deployments.find(query, {"id": 1})}
+
+        # tenant-a holds the deployments whose number is not a multiple of 3
+        app_01 = {f"deployment-{number:03d}" for number in range(10, 20) if number % 3}
+        self.assertEqual(ids(search="Project 010", match="prefix"), {"deployment-010"})
+        self.assertEqual(ids(search="https://APP-01", match="prefix"), app_01)
+        self.assertEqual(ids(search="p-01", match="prefix"), set())
+        self.assertEqual(ids(search="p-01"), app_01)
+        self.assertEqual(ids(search="010 nextjs"), {"deployment-010"})
+        self.assertEqual(ids(search="010 svelte"), set())
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class DeploymentQueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = _mongo_client()
+        if cls.client is None:
+            raise unittest.SkipTest(f"explain() needs a MongoDB server; none reachable at {MONGO_URL}")
+
+        import database as db
+
+        cls.db_module = db
+        cls.database = cls.client[f"query_plans_{uuid.uuid4().hex[:12]}"]
+        for collection_name, indexes in db.INDEXES.items():
+            cls.database[collection_name].create_indexes(indexes)
+        _load_deployments(db, cls.database)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(cls.database.name)
+        cls.client.close()
+
+    def assert_indexed(self, collection_name, query, sort=None, limit=50):
+        cursor = self.database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.limit(limit).explain()["queryPlanner"]["winningPlan"]
+        stages = self.db_module._plan_stages(plan)
+        self.assertNotIn("COLLSCAN", stages, f"{query} is not served by an index: {stages}")
+        self.assertTrue(
+            any(stage in ("IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "COUNT_SCAN") for stage in stages),
+            f"{query} has no index scan: {stages}"
+        )
+
+    def test_declared_query_shapes_use_indexes(self):
+        for name, collection_name, query, sort in self.db_module.QUERY_SHAPES:
+            with self.subTest(shape=name):
+                self.assert_indexed(collection_name, query, sort)
+
+    def test_deployment_filters_use_indexes(self):
+        db = self.db_module
+        cursor = db.encode_cursor(NOW - timedelta(hours=40), "deployment-040")
+        for name, options in FILTERS.items():
+            for paginated in (False, True):
+                with self.subTest(filter=name, paginated=paginated):
+                    query = db.deployment_filter_query("tenant-a", **options)
+                    if paginated:
+                        query.update(db._after_cursor("createdAt", cursor))
+                    self.assert_indexed("deployments", query, [("createdAt", -1), ("id", -1)], limit=51)
+
+
+if __name__ == "__main__":
+    unittest.main()
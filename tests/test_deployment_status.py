@@ -0,0 +1,107 @@
+"""Tests for the deployment status state machine in backend/database.py.
+
+Covers the compare-and-set single update and the bulk update's partial-match
+path, where some updates lose a race and only the winners may be reported,
+counted and published. Runs against MongoDB or mongomock-motor (see
+database_fixture.py).
+"""
+import importlib.util
+import unittest
+from datetime import datetime, timedelta
+
+from tests.database_fixture import bind_test_database, drop_test_database
+
+_MISSING = [name for name in ("fastapi", "motor", "dotenv") if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class DeploymentStatusTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        import database as db
+
+        self.db = db
+        self.client, self.database = bind_test_database(db)
+        await db.migrate_schema()
+        self.created_at = datetime.utcnow() - timedelta(seconds=90)
+        await db.save_deployments([
+            {
+                "id": f"deployment-{index}",
+                "projectName": "alpha",
+                "emergentUrl": "https://alpha.emergent.sh",
+                "framework": "react",
+                "status": "building",
+                "version": 0,
+                "createdAt": self.created_at,
+                "updatedAt": self.created_at,
+            }
+            for index in range(3)
+        ], "tenant-a")
+
+    async def asyncTearDown(self):
+        await drop_test_database(self.client, self.database)
+
+    async def deployment(self, deployment_id):
+        return await self.db.deployments_collection.find_one({"id": deployment_id}, {"_id": 0})
+
+    async def test_known_version_makes_the_update_a_compare_and_set(self):
+        db = self.db
+        stale = {"status": "building", "version": 4}
+        self.assertFalse(await db.update_deployment_status("deployment-0", "deployed", current=stale))
+        self.assertEqual((await self.deployment("deployment-0"))["status"], "building")
+
+        current = {"status": "building", "version": 0}
+        self.assertTrue(await db.update_deployment_status("deployment-0", "deployed", vercel_url="https://a.vercel.app", current=current))
+        deployment = await self.deployment("deployment-0")
+        self.assertEqual((deployment["status"], deployment["version"]), ("deployed", 1))
+        # createdAt was not passed in, so the duration comes from the document itself
+        self.assertGreaterEqual(deployment["deployDurationSeconds"], 90)
+
+        # A second writer that read the same version loses
+        self.assertFalse(await db.update_deployment_status("deployment-0", "failed", error="late", current=current))
+
+    async def test_terminal_statuses_are_final(self):
+        db = self.db
+        self.assertTrue(await db.update_deployment_status("deployment-1", "failed", error="boom"))
+        self.assertFalse(await db.update_deployment_status("deployment-1", "deployed"))
+        self.assertFalse(await db.update_deployment_status("deployment-1", "building"))
+        deployment = await self.deployment("deployment-1")
+        self.assertEqual((deployment["status"], deployment["version"], deployment["error"]), ("failed", 1, "boom"))
+
+    async def test_bulk_update_reports_only_the_updates_that_applied(self):
+        db = self.db
+        # deployment-0 finishes through another path first, e.g. a webhook
+        self.assertTrue(await db.update_deployment_status("deployment-0", "failed", error="webhook"))
+
+        applied = await db.update_deployment_statuses([
+            {"id": "deployment-0", "status": "deployed"},
+            {"id": "deployment-1", "status": "deployed", "vercelUrl": "https://b.vercel.app"},
+            {"id": "deployment-2", "status": "failed", "error": "poll", "tenantId": "tenant-a", "projectName": "alpha", "createdAt": self.created_at},
+        ])
+
+        self.assertEqual([update["id"] for update in applied], ["deployment-1", "deployment-2"])
+        self.assertEqual((await self.deployment("deployment-0"))["status"], "failed")
+        self.assertEqual((await self.deployment("deployment-1"))["vercelUrl"], "https://b.vercel.app")
+        stats = await db.get_deployment_stats("tenant-a")
+        self.assertEqual((stats["totalDeployments"], stats["successfulDeployments"], stats["failedDeployments"]), (3, 1, 2))
+
+    async def test_bulk_update_without_conflicts_skips_the_lookup(self):
+        db = self.db
+        find = db.deployments_collection.find
+
+        def find_without_transition_lookup(query, *args, **kwargs):
+            self.assertNotIn("transitionId", query)
+            return find(query, *args, **kwargs)
+
+        db.deployments_collection.find = find_without_transition_lookup
+        try:
+            applied = await db.update_deployment_statuses([
+                {"id": f"deployment-{index}", "status": "deployed", "tenantId": "tenant-a", "projectName": "alpha", "framework": "react", "createdAt": self.created_at}
+                for index in range(3)
+            ])
+        finally:
+            db.deployments_collection.find = find
+        self.assertEqual(len(applied), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Startup budget regression test for the backend.
+
+Imports `server` in fresh interpreters (via backend/tools/import_report.py)
+and fails when the import takes longer, or the process holds more resident
+memory after the app lifespan has started, than the budget allows. Budgets
+default to roughly 2x the current figures and can be tuned per machine:
+
+    STARTUP_IMPORT_BUDGET_SECONDS   default 1.5
+    STARTUP_RSS_BUDGET_MB           default 120
+"""
+import importlib.util
+import os
+import sys
+import unittest
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("STARTUP_IMPORT_BUDGET_SECONDS", "1.5"))
+RSS_BUDGET_MB = float(os.environ.get("STARTUP_RSS_BUDGET_MB", "120"))
+
+_MISSING = [name for name in ("fastapi", "motor", "dotenv") if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class StartupBudgetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from tools.import_report import measure
+
+        cls.result = measure(runs=3, startup=True)
+
+    def test_import_time_within_budget(self):
+        self.assertLessEqual(
+            self.result["import_seconds"], IMPORT_BUDGET_SECONDS,
+            f"`import server` took {self.result['import_seconds']:.3f}s; run `python -m tools.import_report` to see why"
+        )
+
+    def test_resident_memory_within_budget(self):
+        self.assertLessEqual(
+            self.result["startup_rss_mb"], RSS_BUDGET_MB,
+            f"RSS after startup is {self.result['startup_rss_mb']} MiB; run `python -m tools.import_report --startup`"
+        )
+
+    def test_optional_subsystems_load_lazily(self):
+        self.assertEqual(self.result["loaded_lazy_modules"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for the Vercel webhook receiver in backend/services/vercel_webhook.py.
+
+Deliveries are built with the fake Vercel server's WebhookEmitter, so the
+body and signature match what Vercel sends, and handed straight to the
+handler. Covers signature rejection, the event to status mapping, duplicate
+deliveries and created events, plus the poller's fallback interval in
+webhook mode. Runs against MongoDB or mongomock-motor (see
+database_fixture.py).
+"""
+import importlib.util
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from tests.database_fixture import bind_test_database, drop_test_database
+
+_MISSING = [name for name in ("fastapi", "motor", "dotenv", "aiohttp") if importlib.util.find_spec(name) is None]
+
+SECRET = "s3cret"
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class VercelWebhookTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        import database as db
+        from services.vercel_webhook import VercelWebhookHandler
+        from tools.fake_vercel import WebhookEmitter
+
+        self.db = db
+        self.client, self.database = bind_test_database(db)
+        await db.migrate_schema()
+        self.handler = VercelWebhookHandler(secret=SECRET)
+        self.emitter = WebhookEmitter("http://127.0.0.1/api/webhooks/vercel", SECRET)
+        self.created_at = datetime.utcnow() - timedelta(seconds=90)
+        await db.save_deployments([
+            {
+                "id": f"deployment-{index}",
+                "vercelDeploymentId": f"dpl_{index}",
+                "projectName": "alpha",
+                "emergentUrl": "https://alpha.emergent.sh",
+                "framework": "react",
+                "status": "building",
+                "version": 0,
+                "createdAt": self.created_at,
+                "updatedAt": self.created_at,
+            }
+            for index in range(4)
+        ], "tenant-a")
+
+    async def asyncTearDown(self):
+        await self.db.activity_writer.stop()
+        await drop_test_database(self.client, self.database)
+
+    async def deliver(self, event_type, deployment, emitter=None):
+        body, headers = (emitter or self.emitter).signed(event_type, deployment)
+        return await self.handler.handle(body, headers["x-vercel-signature"])
+
+    async def deployment(self, deployment_id):
+        return await self.db.deployments_collection.find_one({"id": deployment_id}, {"_id": 0})
+
+    async def test_bad_signatures_are_rejected(self):
+        from services.vercel_webhook import WebhookError
+        from tools.fake_vercel import WebhookEmitter
+
+        body, headers = self.emitter.signed("deployment.ready", {"id": "dpl_0"})
+        forged = WebhookEmitter(self.emitter.url, "not-the-secret")
+        deliveries = {
+            "wrong secret": lambda: self.deliver("deployment.ready", {"id": "dpl_0"}, emitter=forged),
+            "tampered body": lambda: self.handler.handle(body.replace(b"dpl_0", b"dpl_1"), headers["x-vercel-signature"]),
+            "missing signature": lambda: self.handler.handle(body, None),
+        }
+        for name, deliver in deliveries.items():
+            with self.subTest(delivery=name), self.assertRaises(WebhookError) as raised:
+                await deliver()
+            self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual((await self.deployment("deployment-0"))["status"], "building")
+        self.assertEqual((await self.deployment("deployment-1"))["status"], "building")
+
+    async def test_events_map_to_internal_statuses(self):
+        from services.vercel_service import status_vercel_to_internal
+        from services.vercel_webhook import EVENT_STATES
+
+        # deployment-ready is the legacy spelling of deployment.ready
+        events = ["deployment-ready", "deployment.succeeded", "deployment.error", "deployment.canceled"]
+        for index, event_type in enumerate(events):
+            deployment_id = f"deployment-{index}"
+            with self.subTest(event=event_type):
+                result = await self.deliver(event_type, {"id": f"dpl_{index}", "url": f"app-{index}.vercel.app"})
+                self.assertEqual(result, {"status": "applied"})
+                deployment = await self.deployment(deployment_id)
+                expected = status_vercel_to_internal(EVENT_STATES[event_type.replace("-", ".")])
+                self.assertEqual((deployment["status"], deployment["version"]), (expected, 1))
+                if expected == "deployed":
+                    self.assertEqual(deployment["vercelUrl"], f"https://app-{index}.vercel.app")
+                else:
+                    self.assertIn(deployment["error"], ("Deployment failed on Vercel", "Deployment canceled on Vercel"))
+
+    async def test_duplicate_delivery_is_acknowledged_once(self):
+        db = self.db
+        await db.enqueue_monitor_job("deployment-0", "dpl_0", self.created_at, datetime.utcnow(), "tenant-a", "alpha", "react")
+
+        self.assertEqual(await self.deliver("deployment.ready", {"id": "dpl_0"}), {"status": "applied"})
+        self.assertIsNone(await db.monitor_jobs_collection.find_one({"_id": "deployment-0"}))
+        # Vercel retries, or an error event arrives after the ready one
+        self.assertEqual(await self.deliver("deployment.ready", {"id": "dpl_0"}), {"status": "duplicate"})
+        self.assertEqual(await self.deliver("deployment.error", {"id": "dpl_0"}), {"status": "duplicate"})
+
+        deployment = await self.deployment("deployment-0")
+        self.assertEqual((deployment["status"], deployment["version"]), ("deployed", 1))
+        stats = await db.get_deployment_stats("tenant-a")
+        self.assertEqual((stats["successfulDeployments"], stats["failedDeployments"]), (1, 0))
+
+    async def test_unknown_deployments_and_events_are_ignored(self):
+        self.assertEqual(await self.deliver("deployment.ready", {"id": "dpl_unknown"}), {"status": "ignored"})
+        self.assertEqual(await self.deliver("project.created", {"id": "dpl_0"}), {"status": "ignored"})
+        self.assertEqual((await self.deployment("deployment-0"))["status"], "building")
+
+    async def test_created_event_only_postpones_the_fallback_poll(self):
+        from services.status_poller import status_poller
+
+        db = self.db
+        due_at = datetime.utcnow()
+        await db.enqueue_monitor_job("deployment-0", "dpl_0", self.created_at, due_at, "tenant-a", "alpha", "react")
+
+        # Without a fallback delay, and for deployments with no job, nothing is postponed
+        with mock.patch.object(status_poller, "webhook_fallback_delay", 0.0):
+            self.assertEqual(await self.deliver("deployment.created", {"id": "dpl_0"}), {"status": "applied"})
+        job = await db.monitor_jobs_collection.find_one({"_id": "deployment-0"})
+        self.assertEqual(job["dueAt"].replace(microsecond=0), due_at.replace(microsecond=0))
+        with mock.patch.object(status_poller, "webhook_fallback_delay", 600.0):
+            self.assertEqual(await self.deliver("deployment.created", {"id": "dpl_1"}), {"status": "applied"})
+        self.assertIsNone(await db.monitor_jobs_collection.find_one({"_id": "deployment-1"}))
+
+        with mock.patch.object(status_poller, "webhook_fallback_delay", 600.0):
+            self.assertEqual(await self.deliver("deployment.created", {"id": "dpl_0"}), {"status": "applied"})
+        job = await db.monitor_jobs_collection.find_one({"_id": "deployment-0"})
+        self.assertGreater(job["dueAt"], due_at + timedelta(seconds=590))
+        deployment = await self.deployment("deployment-0")
+        self.assertEqual((deployment["status"], deployment["version"]), ("building", 0))
+
+
+@unittest.skipIf(_MISSING, f"backend dependencies not installed: {', '.join(_MISSING)}")
+class WebhookFallbackPollingTest(unittest.TestCase):
+    def test_fallback_polls_stay_at_the_fallback_delay(self):
+        from services.status_poller import StatusPoller
+
+        poller = StatusPoller(initial_delay=2.0, max_delay=30.0, webhook_fallback_delay=120.0)
+        self.assertEqual([poller.next_delay(attempts) for attempts in range(5)], [120.0] * 5)
+
+        polling = StatusPoller(initial_delay=2.0, max_delay=30.0, backoff_factor=2.0)
+        self.assertEqual([polling.next_delay(attempts) for attempts in range(6)], [2.0, 4.0, 8.0, 16.0, 30.0, 30.0])
+
+
+if __name__ == "__main__":
+    unittest.main()